@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 
 
 class Settings(BaseSettings):
@@ -7,17 +8,85 @@ class Settings(BaseSettings):
     
     # Database
     database_url: str = "sqlite:///./slayfashion.db"
+    database_async_url: Optional[str] = None  # Derived from database_url when unset
+    database_pool_size: int = 10
+    database_max_overflow: int = 20
     
     # Shopify
     shopify_store_domain: str
     shopify_admin_api_token: str
     shopify_storefront_access_token: str
     shopify_api_version: str = "2024-10"
+    shopify_api_base_url: Optional[str] = None  # Defaults to https://{shopify_store_domain}; e.g. a local stand-in
+    
+    # Shopify HTTP client (one pooled client per worker)
+    shopify_http_timeout_seconds: float = 30.0
+    shopify_http_max_connections: int = 100
+    shopify_http_max_keepalive_connections: int = 20
+    shopify_http_keepalive_expiry_seconds: float = 30.0
+    shopify_http2_enabled: bool = True
+    
+    # Shopify rate limits (throttled calls are retried until the deadline, then fail with 503)
+    shopify_throttle_deadline_seconds: float = 10.0
+    shopify_retry_backoff_seconds: float = 0.5
+    shopify_retry_backoff_max_seconds: float = 4.0
+    
+    # Shopify circuit breakers (one for Admin, one for Storefront)
+    shopify_breaker_failure_rate: float = 0.5
+    shopify_breaker_min_calls: int = 20
+    shopify_breaker_window_seconds: float = 30
+    shopify_breaker_open_seconds: float = 15
+    shopify_breaker_half_open_calls: int = 3
+    shopify_storefront_timeout_seconds: float = 5.0
+    
+    # Hedged Storefront token minting (second request after the recent p95 latency)
+    shopify_token_hedging_enabled: bool = False
+    shopify_hedge_percentile: float = 0.95
+    shopify_hedge_min_delay_seconds: float = 0.05
+    shopify_hedge_initial_delay_seconds: float = 1.0
+    
+    # Shopify customer access token cache
+    shopify_token_cache_size: int = 10000
+    shopify_token_cache_margin_seconds: int = 86400  # Re-mint a day before expiry
+    shopify_single_flight_max_keys: int = 10000  # Phones provisioned concurrently (coalesced per phone)
+    shopify_optimistic_create: bool = True  # Create first, search Shopify only on conflict
+    shopify_adopt_existing_customers: bool = False  # Reset the password of pre-existing Shopify accounts on OTP login
+    shopify_multipass_secret: Optional[str] = None  # Shopify Plus: log in customers with their own password via Multipass
+    
+    # Customer profile cache (/api/customer/profile and /check)
+    customer_cache_size: int = 50000
+    customer_cache_ttl_seconds: float = 300  # Existing customers only; "not found" is never cached
+    
+    # Bloom filter over customer phones (definite negatives skip the DB)
+    customer_filter_enabled: bool = False  # Needs Redis (redis_url) for the shared insert counter
+    customer_filter_redis_key: str = "slayfashion:customers:inserts"
+    customer_filter_capacity: int = 1000000
+    customer_filter_error_rate: float = 0.01
+    customer_filter_refresh_seconds: float = 5  # Catch up on other workers' inserts (sooner after a stale miss)
+    customer_filter_rebuild_seconds: int = 3600
+    
+    # Batch customer lookup (/api/customer/batch-lookup)
+    customer_batch_max_phones: int = 1000
+    customer_batch_chunk_size: int = 500  # Phones per WHERE phone IN (...) query
+    customer_batch_rate_limit: int = 30  # Batch requests per client address per window
+    customer_batch_rate_limit_window_seconds: int = 600
+    
+    # Internal endpoints (batch lookup): callers send X-API-Key; unset disables them
+    internal_api_key: Optional[str] = None
     
     # Twilio
     twilio_account_sid: str
     twilio_auth_token: str
     twilio_phone_number: str
+    twilio_api_base_url: Optional[str] = None  # Defaults to https://api.twilio.com; e.g. a local stand-in
+    twilio_timeout_seconds: float = 10.0
+    
+    # SMS dispatch queue
+    sms_dispatch_workers: int = 4
+    sms_queue_max_size: int = 1000
+    sms_max_retries: int = 3
+    sms_retry_backoff_seconds: float = 0.5
+    sms_retry_backoff_max_seconds: float = 8.0
     
     # JWT
     jwt_secret_key: str
@@ -27,10 +96,43 @@ class Settings(BaseSettings):
     # OTP
     otp_expiration_minutes: int = 10
     otp_length: int = 6
+    otp_store_backend: str = "sql"  # "sql", "memory" (single worker only) or "redis"
+    otp_memory_store_max_size: int = 100000
+    otp_redis_prefix: str = "slayfashion:otp"
+    
+    # OTP retention (sql store only)
+    otp_retention_enabled: bool = True
+    otp_retention_hours: int = 24  # Keep rows this long for auditing, then purge
+    otp_retention_interval_seconds: int = 3600
+    otp_retention_batch_size: int = 1000
+    otp_retention_batch_pause_seconds: float = 0.1
+    otp_retention_max_batches: int = 500  # Per run
+    otp_partitioning_enabled: bool = False  # Postgres: manage daily partitions once the table is partitioned
+    otp_partition_days_ahead: int = 3
+    otp_partition_interval_seconds: int = 3600  # Partitions are also created at startup, even with retention disabled
+    
+    # Redis (shared state for multi-worker deployments)
+    redis_url: str = "redis://localhost:6379/0"
+    redis_socket_timeout_seconds: float = 0.25
+    
+    # Rate limiting
+    rate_limit_backend: str = "memory"  # "memory" (per worker) or "redis" (shared)
+    rate_limit_redis_prefix: str = "slayfashion:ratelimit"
+    
+    # Request tracing
+    server_timing_enabled: bool = False  # Add a Server-Timing header with per-phase durations
+    trace_sample_rate: float = 0.01  # Share of requests whose phase timings are logged (0 disables)
     
     # Server
     host: str = "0.0.0.0"
     port: int = 8000
+    environment: str = "development"  # "development" or "production"
+    reload: bool = True  # Development only
+    workers: Optional[int] = None  # Production: defaults to CPU count
+    preload_app: bool = False  # Production: import the app once before forking workers
+    keepalive_timeout_seconds: int = 5
+    backlog: int = 2048
+    graceful_shutdown_timeout_seconds: int = 30
     
     class Config:
         env_file = ".env"
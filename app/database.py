@@ -1,11 +1,29 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from typing import AsyncIterator
 from .config import get_settings
+from .utils.metrics import instrument_engine
 
 settings = get_settings()
 
-# Create database engine
+
+def get_async_database_url(url: str) -> str:
+    """Map a sync database URL onto its async driver (aiosqlite / asyncpg)"""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:"):
+        return url.replace("postgresql:", "postgresql+asyncpg:", 1)
+    if url.startswith("postgres:"):
+        return url.replace("postgres:", "postgresql+asyncpg:", 1)
+    if url.startswith("postgresql+psycopg2:"):
+        return url.replace("postgresql+psycopg2:", "postgresql+asyncpg:", 1)
+    # Already has an explicit async driver
+    return url
+
+
+# Create database engine (used for DDL and offline scripts)
 engine = create_engine(
     settings.database_url,
     connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
@@ -14,12 +32,44 @@ engine = create_engine(
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine used by request handlers, so DB round trips don't block the event loop
+async_database_url = settings.database_async_url or get_async_database_url(settings.database_url)
+async_engine = create_async_engine(
+    async_database_url,
+    **(
+        {}
+        if "sqlite" in async_database_url
+        else {
+            "pool_size": settings.database_pool_size,
+            "max_overflow": settings.database_max_overflow,
+            "pool_pre_ping": True,
+        }
+    )
+)
+
+# Statement latency for /metrics
+instrument_engine(async_engine.sync_engine)
+
+# Async session factory - objects stay usable after commit so responses can be built from them
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Base class for models
 Base = declarative_base()
 
 
-def get_db():
-    """Dependency for getting database session"""
+async def get_db() -> AsyncIterator[AsyncSession]:
+    """Dependency for getting an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_sync_db():
+    """Synchronous session generator for scripts and tooling"""
     db = SessionLocal()
     try:
         yield db
@@ -28,6 +78,13 @@ def get_db():
 
 
 def init_db():
-    """Initialize database tables"""
+    """
+    Create tables straight from the models (tests and throwaway databases)
+    Deployments apply schema changes with `alembic upgrade head` instead
+    """
     Base.metadata.create_all(bind=engine)
 
+
+async def close_db():
+    """Dispose pooled async connections on shutdown"""
+    await async_engine.dispose()
@@ -0,0 +1,54 @@
+"""
+FastAPI dependencies for the lifespan-scoped services
+"""
+import hmac
+from typing import Optional
+
+from fastapi import Header, HTTPException, Request, status
+
+from .config import get_settings
+from .services import OTPService, ShopifyService
+from .services.container import ServiceContainer
+from .services.customer_filter import CustomerPhoneFilter
+from .utils.customer_cache import CustomerCache
+
+settings = get_settings()
+
+
+def get_services(request: Request) -> ServiceContainer:
+    """Service container built in the app lifespan"""
+    return request.app.state.services
+
+
+def get_otp_service(request: Request) -> OTPService:
+    """Shared OTP service"""
+    return request.app.state.services.otp_service
+
+
+def get_shopify_service(request: Request) -> ShopifyService:
+    """Shared Shopify service"""
+    return request.app.state.services.shopify_service
+
+
+def get_customer_cache(request: Request) -> CustomerCache:
+    """Per-worker customer profile cache"""
+    return request.app.state.services.customer_cache
+
+
+def get_customer_filter(request: Request) -> CustomerPhoneFilter:
+    """Per-worker Bloom filter over customer phones"""
+    return request.app.state.services.customer_filter
+
+
+def require_internal_api_key(x_api_key: Optional[str] = Header(None)):
+    """Internal callers only: X-API-Key must match settings.internal_api_key"""
+    if not settings.internal_api_key:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Internal API is disabled"
+        )
+    if x_api_key is None or not hmac.compare_digest(x_api_key.encode(), settings.internal_api_key.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid API key"
+        )
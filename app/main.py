@@ -1,8 +1,13 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
-from .database import init_db
+from .database import close_db
+from .middleware import MetricsMiddleware, TracingMiddleware
+from .services import ServiceContainer
+from .utils.rate_limiter import otp_rate_limiter, verify_rate_limiter, batch_lookup_rate_limiter
+from .utils.metrics import registry
 from .routers import auth, customer
 from .config import get_settings
 
@@ -15,14 +20,22 @@ async def lifespan(app: FastAPI):
     # Startup
     print("🚀 Starting SlayFashion Backend API...")
     print(f"📦 Shopify Store: {settings.shopify_store_domain}")
-    print(f"📱 Initializing database...")
-    init_db()
-    print("✅ Database initialized")
+    # Schema is managed by Alembic migrations at deploy time, no DDL here
+    services = ServiceContainer()
+    await services.startup()
+    app.state.services = services
+    services.register_metrics(registry)
+    print("🔗 Services ready (Shopify HTTP client, SMS dispatcher)")
     
     yield
     
     # Shutdown
     print("👋 Shutting down SlayFashion Backend API...")
+    await services.shutdown()
+    await otp_rate_limiter.shutdown()
+    await verify_rate_limiter.shutdown()
+    await batch_lookup_rate_limiter.shutdown()
+    await close_db()
 
 
 # Create FastAPI app
@@ -42,6 +55,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-phase timings (Server-Timing header / sampled trace log)
+app.add_middleware(TracingMiddleware)
+
+# Route latency for /metrics (outermost, so it also times CORS handling)
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(customer.router)
@@ -67,3 +86,21 @@ async def health():
         "shopify_configured": bool(settings.shopify_store_domain and settings.shopify_admin_api_token)
     }
 
+
+@app.get("/stats")
+async def stats():
+    """Runtime statistics for capacity planning"""
+    return {
+        **app.state.services.get_stats(),
+        "rate_limiters": {
+            "otp": otp_rate_limiter.get_stats(),
+            "verify": verify_rate_limiter.get_stats(),
+            "batch_lookup": batch_lookup_rate_limiter.get_stats()
+        }
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
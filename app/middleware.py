@@ -0,0 +1,105 @@
+"""
+ASGI middleware
+
+Written against the raw ASGI interface rather than BaseHTTPMiddleware, which
+wraps every response in an extra task and memory stream.
+"""
+import json
+import random
+import secrets
+import time
+
+from .config import get_settings
+from .utils.metrics import http_request_duration
+from .utils.tracing import start_trace, end_trace
+
+settings = get_settings()
+
+
+class MetricsMiddleware:
+    """
+    Record request latency and status per route template
+
+    The route template (`/api/customer/{phone}`) is used instead of the raw
+    path so the label set stays bounded; unmatched paths share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route on the (shared) scope
+            route = scope.get("route")
+            http_request_duration.labels(
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                status_code
+            ).observe(time.perf_counter() - started)
+
+
+class TracingMiddleware:
+    """
+    Collect per-phase spans for a request and report them
+
+    With SERVER_TIMING_ENABLED every response gets a Server-Timing header;
+    TRACE_SAMPLE_RATE of requests are also logged as one JSON line. Requests
+    that need neither are passed straight through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        sampled = settings.trace_sample_rate > 0 and random.random() < settings.trace_sample_rate
+        if not (sampled or settings.server_timing_enabled):
+            await self.app(scope, receive, send)
+            return
+
+        trace, token = start_trace()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if settings.server_timing_enabled:
+                    # Spans still open at this point (streamed bodies) are not included
+                    message = {
+                        **message,
+                        "headers": [*message.get("headers", []), (b"server-timing", trace.server_timing().encode())]
+                    }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            end_trace(token)
+            if sampled:
+                route = scope.get("route")
+                print("🧭 TRACE " + json.dumps({
+                    "trace_id": secrets.token_hex(8),
+                    "method": scope["method"],
+                    "route": route.path if route is not None else scope["path"],
+                    "status": status_code,
+                    **trace.to_dict(),
+                }))
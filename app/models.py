@@ -1,8 +1,17 @@
-from sqlalchemy import Column, String, DateTime, Boolean, Integer
+from sqlalchemy import Column, String, DateTime, Boolean, Integer, Index, text
 from datetime import datetime
 from .database import Base
 
 
+def postgresql_only(index: Index) -> Index:
+    """
+    Create the index on Postgres only (e.g. it needs INCLUDE)
+    migrations/env.py leaves it out of autogenerate on other databases
+    """
+    index.info["postgresql_only"] = True
+    return index.ddl_if(dialect="postgresql")
+
+
 class Customer(Base):
     """Customer model - stores phone to Shopify customer mapping with hidden credentials"""
     __tablename__ = "customers"
@@ -10,8 +19,9 @@ class Customer(Base):
     id = Column(Integer, primary_key=True, index=True)
     phone = Column(String, unique=True, index=True, nullable=False)
     shopify_customer_id = Column(String, unique=True, index=True, nullable=False)
-    shopify_email = Column(String, unique=True, nullable=False)  # Hidden email for Shopify
-    shopify_password = Column(String, nullable=False)  # Hidden password (hashed)
+    # Hidden credentials for Shopify; NULL for backfilled customers until their first login
+    shopify_email = Column(String, unique=True, nullable=True)  # Hidden email for Shopify
+    shopify_password = Column(String, nullable=True)  # Hidden password (hashed)
     
     # Customer info from Shopify
     first_name = Column(String, nullable=True)
@@ -22,6 +32,19 @@ class Customer(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = Column(Boolean, default=True)
     
+    __table_args__ = (
+        # Covering index: profile lookups by phone read the profile columns from the index
+        # (Postgres only; the hidden password is left out so it isn't copied into the index)
+        postgresql_only(Index(
+            "ix_customers_phone_covering",
+            "phone",
+            postgresql_include=[
+                "id", "shopify_customer_id", "shopify_email",
+                "first_name", "last_name", "created_at", "updated_at", "is_active"
+            ]
+        )),
+    )
+    
     def __repr__(self):
         return f"<Customer(phone={self.phone}, shopify_id={self.shopify_customer_id})>"
 
@@ -31,7 +54,7 @@ class OTPVerification(Base):
     __tablename__ = "otp_verifications"
     
     id = Column(Integer, primary_key=True, index=True)
-    phone = Column(String, index=True, nullable=False)
+    phone = Column(String, nullable=False)
     otp_code = Column(String, nullable=False)
     session_id = Column(String, unique=True, index=True, nullable=False)
     
@@ -40,10 +63,22 @@ class OTPVerification(Base):
     attempts = Column(Integer, default=0)
     
     # Timestamps
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)  # Retention purges by age
     expires_at = Column(DateTime, nullable=False)
     verified_at = Column(DateTime, nullable=True)
     
+    __table_args__ = (
+        # verify-otp: WHERE phone = ? AND session_id = ?
+        Index("ix_otp_verifications_phone_session_id", "phone", "session_id"),
+        # send-otp: invalidate WHERE phone = ? AND is_verified = false
+        Index(
+            "ix_otp_verifications_phone_unverified",
+            "phone",
+            postgresql_where=text("is_verified = false"),
+            sqlite_where=text("is_verified = 0")
+        ),
+    )
+    
     def is_expired(self) -> bool:
         """Check if OTP has expired"""
         return datetime.utcnow() > self.expires_at
@@ -1,16 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
 
-from ..database import get_db
+from ..dependencies import get_otp_service, get_shopify_service
 from ..schemas import (
     SendOTPRequest,
     SendOTPResponse,
     VerifyOTPRequest,
     VerifyOTPResponse,
-    CustomerData,
     ErrorResponse
 )
 from ..services import OTPService, ShopifyService
+from ..services.sms_dispatcher import SMSQueueFullError
+from ..services.shopify_service import ShopifyCustomerNotAdoptable
+from ..services.shopify_throttle import ShopifyThrottledError
+from ..utils.circuit_breaker import CircuitOpenError
 from ..utils.rate_limiter import otp_rate_limiter, verify_rate_limiter
 
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
@@ -19,27 +21,32 @@ router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 @router.post("/send-otp", response_model=SendOTPResponse)
 async def send_otp(
     request: SendOTPRequest,
-    db: Session = Depends(get_db)
+    otp_service: OTPService = Depends(get_otp_service)
 ):
     """
     Send OTP to customer's phone number
     
     This endpoint:
     1. Generates a 6-digit OTP code
-    2. Sends it via SMS (Twilio)
+    2. Queues it for SMS delivery (Twilio) in the background
     3. Returns a session ID for verification
     """
     # Rate limiting - prevent OTP spam
-    allowed, message = otp_rate_limiter.is_allowed(request.phone)
+    allowed, message = await otp_rate_limiter.is_allowed(request.phone)
     if not allowed:
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail=message
         )
     
-    otp_service = OTPService()
-    
-    success, message, session_id = otp_service.send_otp(request.phone, db)
+    try:
+        success, message, session_id = await otp_service.send_otp(request.phone)
+    except SMSQueueFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"}
+        )
     
     if not success:
         raise HTTPException(
@@ -57,7 +64,8 @@ async def send_otp(
 @router.post("/verify-otp", response_model=VerifyOTPResponse)
 async def verify_otp(
     request: VerifyOTPRequest,
-    db: Session = Depends(get_db)
+    otp_service: OTPService = Depends(get_otp_service),
+    shopify_service: ShopifyService = Depends(get_shopify_service)
 ):
     """
     Verify OTP and login customer using the "bridge method"
@@ -72,22 +80,18 @@ async def verify_otp(
     This is the same approach used by GoKwik/KwikPass for OTP-based Shopify login
     """
     # Rate limiting - prevent brute force OTP attempts
-    allowed, message = verify_rate_limiter.is_allowed(request.phone)
+    allowed, message = await verify_rate_limiter.is_allowed(request.phone)
     if not allowed:
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail=message
         )
     
-    otp_service = OTPService()
-    shopify_service = ShopifyService()
-    
     # Step 1: Verify OTP
-    otp_valid, otp_message = otp_service.verify_otp(
+    otp_valid, otp_message = await otp_service.verify_otp(
         request.phone,
         request.otp,
-        request.session_id,
-        db
+        request.session_id
     )
     
     if not otp_valid:
@@ -98,20 +102,7 @@ async def verify_otp(
     
     try:
         # Step 2-5: Find/create customer and get access token (Bridge Method)
-        customer_record, access_token, expires_at = await shopify_service.find_or_create_customer(
-            request.phone,
-            db
-        )
-        
-        # Prepare customer data
-        customer_data = CustomerData(
-            id=str(customer_record.id),
-            phone=customer_record.phone,
-            email=customer_record.shopify_email,
-            first_name=customer_record.first_name,
-            last_name=customer_record.last_name,
-            shopify_customer_id=customer_record.shopify_customer_id
-        )
+        customer_data, access_token, expires_at = await shopify_service.find_or_create_customer(request.phone)
         
         return VerifyOTPResponse(
             success=True,
@@ -121,6 +112,27 @@ async def verify_otp(
             token_expires_at=expires_at
         )
     
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, round(e.retry_after)))}
+        )
+    
+    except ShopifyCustomerNotAdoptable as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    
+    except ShopifyThrottledError as e:
+        print(f"⏳ Shopify throttled verify_otp: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, round(e.retry_after)))}
+        )
+    
     except Exception as e:
         print(f"❌ Error in verify_otp: {e}")
         raise HTTPException(
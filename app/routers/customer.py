@@ -1,52 +1,208 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
-from typing import Optional
+import json
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import load_only
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, List, Dict, AsyncIterator
 
-from ..database import get_db
+from ..config import get_settings
+from ..database import get_db, AsyncSessionLocal
+from ..dependencies import get_customer_cache, get_customer_filter, require_internal_api_key
 from ..models import Customer
-from ..schemas import CustomerData
+from ..schemas import CustomerData, CustomerBatchLookupRequest, CustomerBatchLookupResponse, CustomerLookupResult
+from ..services.customer_filter import CustomerPhoneFilter
+from ..utils.customer_cache import CustomerCache
+from ..utils.rate_limiter import batch_lookup_rate_limiter
+from ..utils.security import normalize_phone
+
+settings = get_settings()
 
 router = APIRouter(prefix="/api/customer", tags=["Customer"])
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Profile lookups read only these columns, which the covering phone index INCLUDEs (Postgres)
+PROFILE_COLUMNS = load_only(
+    Customer.id,
+    Customer.phone,
+    Customer.shopify_customer_id,
+    Customer.shopify_email,
+    Customer.first_name,
+    Customer.last_name
+)
+
+
+def to_customer_data(customer: Customer) -> CustomerData:
+    """Public profile of a customer row"""
+    return CustomerData(
+        id=str(customer.id),
+        phone=customer.phone,
+        email=customer.shopify_email,
+        first_name=customer.first_name,
+        last_name=customer.last_name,
+        shopify_customer_id=customer.shopify_customer_id
+    )
+
+
+async def load_customer(
+    phone: str,
+    db: AsyncSession,
+    cache: CustomerCache,
+    phone_filter: Optional[CustomerPhoneFilter] = None
+) -> Optional[CustomerData]:
+    """
+    Read-through lookup of a customer profile by normalized phone
+    Returns None if there is no customer with that phone
+    """
+    customer_data = cache.get(phone)
+    if customer_data is not None:
+        return customer_data
+
+    # Definite negative from the Bloom filter - no query needed
+    if phone_filter is not None and not await phone_filter.might_contain(phone):
+        return None
+
+    result = await db.execute(select(Customer).options(PROFILE_COLUMNS).where(Customer.phone == phone))
+    customer = result.scalars().first()
+    if customer is None:
+        return None
+
+    customer_data = to_customer_data(customer)
+    cache.put(phone, customer_data)
+    return customer_data
+
 
 @router.get("/profile", response_model=CustomerData)
 async def get_customer_profile(
     phone: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    cache: CustomerCache = Depends(get_customer_cache),
+    phone_filter: CustomerPhoneFilter = Depends(get_customer_filter)
 ):
     """
     Get customer profile by phone number
     """
-    customer = db.query(Customer).filter(Customer.phone == phone).first()
-    
-    if not customer:
+    customer_data = await load_customer(normalize_phone(phone), db, cache, phone_filter)
+
+    if not customer_data:
         raise HTTPException(
             status_code=404,
             detail="Customer not found"
         )
-    
-    return CustomerData(
-        id=str(customer.id),
-        phone=customer.phone,
-        email=customer.shopify_email,
-        first_name=customer.first_name,
-        last_name=customer.last_name,
-        shopify_customer_id=customer.shopify_customer_id
-    )
+
+    return customer_data
 
 
 @router.get("/check")
 async def check_customer_exists(
     phone: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    cache: CustomerCache = Depends(get_customer_cache),
+    phone_filter: CustomerPhoneFilter = Depends(get_customer_filter)
 ):
     """
     Check if customer exists in database
     """
-    customer = db.query(Customer).filter(Customer.phone == phone).first()
-    
+    customer_data = await load_customer(normalize_phone(phone), db, cache, phone_filter)
+
     return {
-        "exists": customer is not None,
+        "exists": customer_data is not None,
         "phone": phone
     }
 
+
+async def lookup_customers(
+    phones: List[str],
+    include_profile: bool,
+    phone_filter: Optional[CustomerPhoneFilter] = None
+) -> AsyncIterator[Dict[str, CustomerLookupResult]]:
+    """
+    Look up phones with one WHERE phone IN (...) query per chunk
+    Yields: {phone as sent: result} for each chunk
+
+    Opens its own session so it can outlive the request dependencies
+    while a streaming response is being sent. Batch lookups bypass the
+    profile cache so CRM scans don't evict the interactive entries.
+    """
+    normalized = {phone: normalize_phone(phone) for phone in phones}
+    chunk_size = settings.customer_batch_chunk_size
+
+    async with AsyncSessionLocal() as db:
+        for start in range(0, len(phones), chunk_size):
+            chunk = phones[start:start + chunk_size]
+
+            # Definite negatives from the Bloom filter never reach the query
+            candidates = {normalized[phone] for phone in chunk}
+            if phone_filter is not None:
+                candidates = await phone_filter.might_contain_many(candidates)
+
+            found: Dict[str, Customer] = {}
+            if candidates:
+                result = await db.execute(select(Customer).options(PROFILE_COLUMNS).where(Customer.phone.in_(candidates)))
+                found = {customer.phone: customer for customer in result.scalars()}
+
+            results = {}
+            for phone in chunk:
+                customer = found.get(normalized[phone])
+                results[phone] = CustomerLookupResult(
+                    phone=normalized[phone],
+                    exists=customer is not None,
+                    customer=to_customer_data(customer) if customer and include_profile else None
+                )
+            yield results
+
+
+@router.post(
+    "/batch-lookup",
+    response_model=CustomerBatchLookupResponse,
+    dependencies=[Depends(require_internal_api_key)]
+)
+async def batch_lookup_customers(
+    request: CustomerBatchLookupRequest,
+    http_request: Request,
+    accept: Optional[str] = Header(None),
+    phone_filter: CustomerPhoneFilter = Depends(get_customer_filter)
+):
+    """
+    Look up many customers by phone in one request
+
+    Send `Accept: application/x-ndjson` to stream one JSON object per
+    phone as each chunk is read (recommended for large batches);
+    otherwise all results are returned as a single phone -> result map.
+
+    Internal only: requires the X-API-Key header and is rate limited per
+    client address, since it returns profiles in bulk.
+    """
+    client = http_request.client.host if http_request.client else "unknown"
+    allowed, message = await batch_lookup_rate_limiter.is_allowed(client)
+    if not allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=message
+        )
+
+    # Keep the order of first appearance, drop repeats
+    phones = list(dict.fromkeys(request.phones))
+
+    if accept and NDJSON_MEDIA_TYPE in accept:
+        async def stream_results():
+            async for results in lookup_customers(phones, request.include_profile, phone_filter):
+                lines = [
+                    json.dumps({"query": phone, **result.model_dump()})
+                    for phone, result in results.items()
+                ]
+                yield "\n".join(lines) + "\n"
+
+        return StreamingResponse(stream_results(), media_type=NDJSON_MEDIA_TYPE)
+
+    all_results: Dict[str, CustomerLookupResult] = {}
+    async for results in lookup_customers(phones, request.include_profile, phone_filter):
+        all_results.update(results)
+
+    found = sum(1 for result in all_results.values() if result.exists)
+    return CustomerBatchLookupResponse(
+        results=all_results,
+        found=found,
+        not_found=len(all_results) - found
+    )
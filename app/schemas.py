@@ -1,8 +1,12 @@
 from pydantic import BaseModel, Field, field_validator
-from typing import Optional
+from typing import Optional, List, Dict
 from datetime import datetime
 import re
 
+from .config import get_settings
+
+settings = get_settings()
+
 
 class SendOTPRequest(BaseModel):
     """Request to send OTP to phone number"""
@@ -50,6 +54,31 @@ class CustomerData(BaseModel):
     shopify_customer_id: str
 
 
+class CustomerBatchLookupRequest(BaseModel):
+    """Request to look up many customers by phone at once"""
+    phones: List[str] = Field(
+        ...,
+        min_length=1,
+        max_length=settings.customer_batch_max_phones,
+        description="Phone numbers (normalized like /check)"
+    )
+    include_profile: bool = Field(True, description="Return full profiles, not just existence")
+
+
+class CustomerLookupResult(BaseModel):
+    """Lookup result for one phone"""
+    phone: str  # Normalized phone that was looked up
+    exists: bool
+    customer: Optional[CustomerData] = None
+
+
+class CustomerBatchLookupResponse(BaseModel):
+    """Results keyed by phone exactly as sent"""
+    results: Dict[str, CustomerLookupResult]
+    found: int
+    not_found: int
+
+
 class VerifyOTPResponse(BaseModel):
     """Response after OTP verification"""
     success: bool
@@ -1,5 +1,5 @@
 from .otp_service import OTPService
 from .shopify_service import ShopifyService
+from .container import ServiceContainer
 
-__all__ = ["OTPService", "ShopifyService"]
-
+__all__ = ["OTPService", "ShopifyService", "ServiceContainer"]
@@ -0,0 +1,107 @@
+"""
+Service container
+
+Services are built once per worker in the app lifespan and stored on
+app.state, so clients, connection pools and caches live across requests.
+"""
+from typing import Dict, Any
+
+from .otp_service import OTPService
+from .shopify_service import ShopifyService
+from .retention import OTPRetentionService
+from .customer_filter import CustomerPhoneFilter
+from ..config import get_settings
+from .http_client import get_pool_stats
+from ..database import async_engine
+from ..utils.customer_cache import CustomerCache
+from ..utils.metrics import MetricsRegistry, GaugeCallback
+
+settings = get_settings()
+
+# Gauge value per circuit breaker state
+BREAKER_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class ServiceContainer:
+    """Holds the long-lived service singletons and their lifecycle"""
+
+    def __init__(self):
+        self.customer_cache = CustomerCache(
+            max_size=settings.customer_cache_size,
+            ttl_seconds=settings.customer_cache_ttl_seconds
+        )
+        self.customer_filter = CustomerPhoneFilter()
+        self.otp_service = OTPService()
+        self.shopify_service = ShopifyService(
+            customer_cache=self.customer_cache,
+            customer_filter=self.customer_filter
+        )
+        self.retention_service = OTPRetentionService()
+
+    async def startup(self):
+        """Open each service's resources"""
+        await self.shopify_service.startup()
+        await self.otp_service.startup()
+        await self.retention_service.startup()
+        await self.customer_filter.startup()
+
+    async def shutdown(self):
+        """Release resources in reverse order of startup"""
+        await self.customer_filter.shutdown()
+        await self.retention_service.shutdown()
+        await self.otp_service.shutdown()
+        await self.shopify_service.shutdown()
+
+    def register_metrics(self, registry: MetricsRegistry):
+        """Expose pool, queue and breaker state as gauges read at scrape time"""
+        def http_pool():
+            stats = get_pool_stats(self.shopify_service.http_client)
+            return {
+                ("active",): stats["active_connections"],
+                ("idle",): stats["idle_connections"],
+                ("queued_requests",): stats["queued_requests"],
+            }
+
+        def db_pool():
+            pool = async_engine.pool
+            if not hasattr(pool, "checkedout"):
+                return {}  # NullPool (SQLite) keeps no connections to report
+            return {
+                ("checked_out",): pool.checkedout(),
+                ("idle",): pool.checkedin(),
+                ("overflow",): max(0, pool.overflow()),
+            }
+
+        def breakers():
+            return {
+                (breaker.name,): BREAKER_STATE_VALUES[breaker.state]
+                for breaker in (self.shopify_service.admin_breaker, self.shopify_service.storefront_breaker)
+            }
+
+        registry.register(GaugeCallback(
+            "http_pool_connections", "Shopify HTTP client pool usage", ["state"], http_pool
+        ))
+        registry.register(GaugeCallback(
+            "db_pool_connections", "Database connection pool usage", ["state"], db_pool
+        ))
+        registry.register(GaugeCallback(
+            "sms_queue_depth", "Messages waiting for an SMS worker", [],
+            lambda: {(): self.otp_service.sms_dispatcher.get_stats()["queue_depth"]}
+        ))
+        registry.register(GaugeCallback(
+            "circuit_breaker_state", "Circuit state (0 closed, 1 half-open, 2 open)", ["breaker"], breakers
+        ))
+        registry.register(GaugeCallback(
+            "customer_cache_entries", "Entries in the customer lookup cache", [],
+            lambda: {(): self.customer_cache.get_stats()["size"]}
+        ))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Combined runtime statistics of all services"""
+        return {
+            **self.shopify_service.get_stats(),
+            **self.otp_service.get_stats(),
+            "customer_cache": self.customer_cache.get_stats(),
+            "customer_filter": self.customer_filter.get_stats(),
+            "otp_retention": self.retention_service.get_stats()
+        }
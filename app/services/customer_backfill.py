@@ -0,0 +1,245 @@
+"""
+One-time import of existing Shopify customers into `customers`
+
+Customers who already exist in Shopify have no row here, so their first OTP
+login used to create a duplicate Shopify customer. CustomerBackfill exports
+every customer with a Shopify bulk operation, streams the resulting JSONL
+line by line and inserts the phone -> Shopify customer mappings in batches.
+On their first OTP login, imported customers with a real email log in
+through Multipass when SHOPIFY_MULTIPASS_SECRET is set; everyone else is
+given hidden credentials (ShopifyService.ensure_customer_credentials).
+
+Progress is checkpointed to a JSON file after every committed batch (bulk
+operation id, result URL and byte offset), so an interrupted run resumes
+where it stopped. Rows that already exist are left untouched, which makes
+replaying a batch harmless.
+"""
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any, List, AsyncIterator, Tuple
+import httpx
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from ..models import Customer
+from ..utils.security import normalize_phone
+from .customer_filter import CustomerPhoneFilter
+from .shopify_service import ShopifyService
+
+# Bulk operation states that will never produce a result URL
+FAILED_STATUSES = {"FAILED", "CANCELED", "CANCELING", "EXPIRED"}
+
+
+class BackfillCheckpoint:
+    """Resume state, rewritten atomically after every batch"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.state: Dict[str, Any] = {}
+
+    def load(self) -> Dict[str, Any]:
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.state = json.load(f)
+        return self.state
+
+    def save(self, **changes):
+        self.state.update(changes, updated_at=datetime.utcnow().isoformat())
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def reset(self):
+        self.state = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class CustomerBackfill:
+    """
+    Resumable bulk import of Shopify customers
+
+    Usage:
+        backfill = CustomerBackfill(ShopifyService(), AsyncSessionLocal, BackfillCheckpoint("backfill.json"))
+        result = await backfill.run()                          # via a bulk operation
+        result = await backfill.run(jsonl_url="http://...")    # from an existing JSONL export
+    """
+
+    def __init__(
+        self,
+        shopify_service: ShopifyService,
+        session_factory: async_sessionmaker,
+        checkpoint: BackfillCheckpoint,
+        batch_size: int = 1000,
+        poll_interval_seconds: float = 5.0,
+        phone_filter: Optional[CustomerPhoneFilter] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.shopify_service = shopify_service
+        self.session_factory = session_factory
+        self.checkpoint = checkpoint
+        # Running workers' phone filters must learn about the imported rows
+        self.phone_filter = phone_filter
+        self.batch_size = batch_size
+        self.poll_interval_seconds = poll_interval_seconds
+        # Custom transport for downloading the JSONL (e.g. httpx.MockTransport in tests)
+        self.transport = transport
+
+    async def resolve_jsonl_url(self) -> str:
+        """Start (or resume waiting for) the bulk export and return its result URL"""
+        operation_id = self.checkpoint.state.get("operation_id")
+        if not operation_id:
+            operation = await self.shopify_service.start_bulk_customer_export()
+            operation_id = operation["id"]
+            self.checkpoint.save(operation_id=operation_id, offset=0)
+            print(f"📦 Started bulk operation {operation_id}")
+
+        # Polled even when resuming: result URLs are signed and expire
+        while True:
+            operation = await self.shopify_service.get_bulk_operation(operation_id)
+            status = operation["status"]
+            if status == "COMPLETED":
+                break
+            if status in FAILED_STATUSES:
+                raise Exception(f"Bulk operation {operation_id} ended as {status} ({operation.get('errorCode')})")
+            print(f"⏳ Bulk operation {status.lower()}, {operation.get('objectCount') or 0} customers so far")
+            await asyncio.sleep(self.poll_interval_seconds)
+
+        if not operation.get("url"):
+            # Completed with no results: the store has no customers
+            return ""
+        return operation["url"]
+
+    async def stream_jsonl(self, url: str, offset: int = 0) -> AsyncIterator[Tuple[int, bytes]]:
+        """
+        Stream a JSONL file line by line, starting at a byte offset
+        Yields: (byte offset just past the line, line)
+        """
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        timeout = httpx.Timeout(60.0, connect=10.0)
+
+        async with httpx.AsyncClient(timeout=timeout, follow_redirects=True, transport=self.transport) as client:
+            async with client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 416:
+                    return  # Offset is already at the end
+                response.raise_for_status()
+
+                # Servers that ignore Range send the whole file; skip what was already imported
+                position = offset if response.status_code == 206 else 0
+                buffer = bytearray()
+
+                async for chunk in response.aiter_bytes():
+                    buffer.extend(chunk)
+                    start = 0
+                    while True:
+                        end = buffer.find(b"\n", start)
+                        if end == -1:
+                            break
+                        line = bytes(buffer[start:end])
+                        position += end - start + 1
+                        start = end + 1
+                        if position > offset and line.strip():
+                            yield position, line
+                    del buffer[:start]
+
+                if buffer.strip():
+                    position += len(buffer)
+                    if position > offset:
+                        yield position, bytes(buffer)
+
+    @staticmethod
+    def to_row(node: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """customers row for one exported customer, or None if it has no phone"""
+        if "__parentId" in node or not node.get("phone"):
+            return None
+        now = datetime.utcnow()
+        return {
+            "phone": normalize_phone(node["phone"]),
+            "shopify_customer_id": node["id"],
+            "shopify_email": node.get("email") or None,
+            "shopify_password": None,
+            "first_name": node.get("firstName"),
+            "last_name": node.get("lastName"),
+            "created_at": now,
+            "updated_at": now,
+            "is_active": True,
+        }
+
+    async def insert_batch(self, rows: List[Dict[str, Any]]) -> int:
+        """Insert rows, leaving existing customers alone; returns rows inserted"""
+        async with self.session_factory() as db:
+            dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+            # Core insert on the table (not the ORM entity) so rows go out as multi-row VALUES
+            table = Customer.__table__
+            stmt = dialect.insert(table).on_conflict_do_nothing().returning(table.c.id)
+            result = await db.execute(stmt, rows)
+            inserted = len(result.all())
+            await db.commit()
+        return inserted
+
+    async def _commit_batch(self, batch: List[Dict[str, Any]], lines: int, offset: int, result: Dict[str, Any]):
+        """Insert a batch, then checkpoint the offset just past its last line"""
+        inserted = await self.insert_batch(batch) if batch else 0
+        if inserted and self.phone_filter is not None:
+            await self.phone_filter.record_inserts()
+        result["inserted"] += inserted
+        result["skipped"] += len(batch) - inserted
+
+        state = self.checkpoint.state
+        self.checkpoint.save(
+            offset=offset,
+            lines=state.get("lines", 0) + lines,
+            inserted=state.get("inserted", 0) + inserted
+        )
+        print(f"💾 {result['lines']} lines read, {result['inserted']} customers inserted")
+
+    async def run(self, jsonl_url: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Import (or resume importing) all customers
+        Returns: {"lines", "inserted", "skipped", "duration_seconds"} for this run
+        """
+        started = time.monotonic()
+        state = self.checkpoint.load()
+
+        if state.get("completed"):
+            print("✅ Backfill already completed (use a new checkpoint to run it again)")
+            return {"lines": 0, "inserted": 0, "skipped": 0, "duration_seconds": 0.0}
+
+        # An offset only means something for the file it was recorded against
+        source = jsonl_url or "bulk_operation"
+        if state.get("source") != source:
+            self.checkpoint.save(source=source, offset=0)
+
+        url = jsonl_url or await self.resolve_jsonl_url()
+
+        offset = self.checkpoint.state.get("offset", 0)
+        if offset:
+            print(f"↩️  Resuming at byte {offset}")
+
+        result = {"lines": 0, "inserted": 0, "skipped": 0}
+        batch: List[Dict[str, Any]] = []
+        batch_lines = 0
+        position = offset
+
+        if url:
+            async for position, line in self.stream_jsonl(url, offset):
+                result["lines"] += 1
+                batch_lines += 1
+                row = self.to_row(json.loads(line))
+                if row is None:
+                    result["skipped"] += 1
+                else:
+                    batch.append(row)
+                if len(batch) >= self.batch_size:
+                    await self._commit_batch(batch, batch_lines, position, result)
+                    batch, batch_lines = [], 0
+
+        await self._commit_batch(batch, batch_lines, position, result)
+        self.checkpoint.save(completed=True)
+
+        result["duration_seconds"] = round(time.monotonic() - started, 3)
+        return result
@@ -0,0 +1,280 @@
+"""
+Bloom filter over customers.phone
+
+/api/customer/check is mostly called for phones that are not customers
+yet (the signup funnel). A per-worker Bloom filter of every customer phone
+answers those definite negatives without a database round trip; only
+possible positives fall through to the query.
+
+The filter is built by a streamed scan in the background at startup and
+rebuilt periodically. Inserts made by this worker are added immediately;
+inserts made by other workers are picked up by a cheap catch-up scan of
+the newest ids. Until the first build finishes every phone is treated as
+a possible positive.
+
+A Bloom filter must never report a customer as absent, but another
+worker's insert is only in this worker's filter after the next scan. So
+every insert also increments a shared counter in Redis, and each worker
+remembers the counter value its last scan covered. A filter miss is only
+a definite negative while the two still match; otherwise the phone falls
+through to the database and a catch-up scan is started. If Redis is
+unreachable, misses fall through too.
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any, Iterable, Set
+from redis.exceptions import RedisError
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from ..models import Customer
+from ..config import get_settings
+from ..utils.bloom_filter import BloomFilter
+
+settings = get_settings()
+
+# Ids are not committed in order under concurrent inserts, so each catch-up
+# scan re-reads this many ids below the highest one already seen
+CATCH_UP_OVERLAP_IDS = 1000
+SCAN_BATCH_SIZE = 5000
+
+
+class CustomerPhoneFilter:
+    """
+    Definite-negative fast path for customer existence checks
+
+    Usage:
+        phone_filter = CustomerPhoneFilter()
+        await phone_filter.startup()    # background build + refresh loop
+        if not await phone_filter.might_contain(phone):
+            ...  # definitely not a customer
+        await phone_filter.add(phone)   # after inserting a customer
+        await phone_filter.shutdown()
+    """
+
+    def __init__(self, engine: AsyncEngine = None, redis_client=None):
+        """
+        Args:
+            engine: Database the phones are scanned from
+            redis_client: asyncio Redis client holding the shared insert
+                counter (default: one for settings.redis_url when enabled)
+        """
+        if engine is None:
+            from ..database import async_engine
+            engine = async_engine
+        self.engine = engine
+        self.redis = redis_client
+        self._owns_redis = False
+        self.version_key = settings.customer_filter_redis_key
+
+        self.bloom: Optional[BloomFilter] = None
+        self._building: Optional[BloomFilter] = None
+        self._max_id = 0
+        # Shared insert counter value that every phone in the filter is known to include
+        self._version: Optional[int] = None
+        self._refresh_requested = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.checks = 0
+        self.definite_negatives = 0
+        self.unconfirmed_negatives = 0
+        self.redis_errors = 0
+        self.rebuilds = 0
+        self.last_rebuild: Optional[Dict[str, Any]] = None
+
+    @property
+    def enabled(self) -> bool:
+        return settings.customer_filter_enabled
+
+    @property
+    def ready(self) -> bool:
+        """True once the first build has finished"""
+        return self.bloom is not None
+
+    def _redis(self):
+        """Client for the shared insert counter, created on first use"""
+        if self.redis is None and self.enabled:
+            import redis.asyncio
+
+            self.redis = redis.asyncio.Redis.from_url(
+                settings.redis_url,
+                socket_timeout=settings.redis_socket_timeout_seconds,
+                socket_connect_timeout=settings.redis_socket_timeout_seconds
+            )
+            self._owns_redis = True
+        return self.redis
+
+    async def startup(self):
+        """Start the background build/refresh loop"""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run_forever(), name="customer-phone-filter")
+
+    async def shutdown(self):
+        """Stop the background loop and close the Redis client it opened"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._owns_redis:
+            await self.redis.aclose()
+            self.redis = None
+            self._owns_redis = False
+
+    async def _run_forever(self):
+        last_rebuild = 0.0
+        while True:
+            try:
+                if self.bloom is None or time.monotonic() - last_rebuild >= settings.customer_filter_rebuild_seconds:
+                    await self.rebuild()
+                    last_rebuild = time.monotonic()
+                else:
+                    await self.refresh()
+            except Exception as e:
+                print(f"❌ Customer phone filter update failed: {e}")
+            # Catch up early when a miss found the filter behind other workers' inserts
+            try:
+                await asyncio.wait_for(self._refresh_requested.wait(), settings.customer_filter_refresh_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._refresh_requested.clear()
+
+    async def _shared_version(self) -> Optional[int]:
+        """Current shared insert counter, or None if Redis can't be read"""
+        client = self._redis()
+        if client is None:
+            return None
+        try:
+            value = await client.get(self.version_key)
+        except RedisError as e:
+            self.redis_errors += 1
+            print(f"⚠️ Customer filter insert counter unavailable: {e}")
+            return None
+        return int(value or 0)
+
+    async def might_contain_many(self, phones: Iterable[str]) -> Set[str]:
+        """Phones that may be customers; the rest are definitely not"""
+        phones = set(phones)
+        if self.bloom is None:
+            return phones
+        self.checks += len(phones)
+        possible = {phone for phone in phones if self.bloom.might_contain(phone)}
+        misses = len(phones) - len(possible)
+        if not misses:
+            return possible
+
+        version = await self._shared_version()
+        if version is None or version != self._version:
+            # Inserts this filter hasn't scanned yet (or an unknown state): let the database answer
+            self.unconfirmed_negatives += misses
+            self._refresh_requested.set()
+            return phones
+
+        self.definite_negatives += misses
+        return possible
+
+    async def might_contain(self, phone: str) -> bool:
+        """False means the phone is definitely not a customer"""
+        return phone in await self.might_contain_many([phone])
+
+    async def add(self, phone: str):
+        """Record a customer phone inserted by this process (after its commit)"""
+        for bloom in (self.bloom, self._building):
+            # Skipping phones already reported present keeps `count` close to the distinct total
+            if bloom is not None and not bloom.might_contain(phone):
+                bloom.add(phone)
+        version = await self.record_inserts()
+        if version is not None and self._version is not None and version == self._version + 1:
+            # Ours was the only insert since the last scan, so the filter is still complete
+            self._version = version
+
+    async def record_inserts(self) -> Optional[int]:
+        """
+        Tell every worker's filter that customers were inserted (after the commit)
+        Returns: the new shared counter value, or None if Redis is unavailable
+        """
+        client = self._redis()
+        if client is None:
+            return None
+        try:
+            return await client.incr(self.version_key)
+        except RedisError as e:
+            self.redis_errors += 1
+            print(f"⚠️ Customer filter insert counter unavailable: {e}")
+            return None
+
+    async def _scan(self, bloom: BloomFilter, min_id: int = 0) -> int:
+        """Stream (id, phone) rows above min_id into the filter; returns rows read"""
+        rows = 0
+        query = (
+            select(Customer.id, Customer.phone)
+            .where(Customer.id > min_id)
+            .execution_options(yield_per=SCAN_BATCH_SIZE)
+        )
+        async with self.engine.connect() as conn:
+            result = await conn.stream(query)
+            async for customer_id, phone in result:
+                if not bloom.might_contain(phone):
+                    bloom.add(phone)
+                if customer_id > self._max_id:
+                    self._max_id = customer_id
+                rows += 1
+        return rows
+
+    async def rebuild(self) -> Dict[str, Any]:
+        """Build a fresh filter from a full scan and swap it in"""
+        started = time.monotonic()
+        async with self.engine.connect() as conn:
+            total = (await conn.execute(select(func.count()).select_from(Customer))).scalar() or 0
+
+        capacity = settings.customer_filter_capacity
+        if total * 2 > capacity:
+            capacity = total * 2
+            print(
+                f"⚠️ Customer phone filter sized for {capacity} phones "
+                f"(CUSTOMER_FILTER_CAPACITY={settings.customer_filter_capacity} is too small for {total})"
+            )
+
+        # Read before the scan: every insert counted so far was committed before it started
+        version = await self._shared_version()
+
+        # Inserts during the scan go to both filters via add()
+        self._building = BloomFilter(capacity=capacity, error_rate=settings.customer_filter_error_rate)
+        try:
+            rows = await self._scan(self._building)
+            self.bloom = self._building
+            self._version = version
+        finally:
+            self._building = None
+
+        self.rebuilds += 1
+        self.last_rebuild = {
+            "rows": rows,
+            "duration_seconds": round(time.monotonic() - started, 3),
+            "finished_at": datetime.utcnow().isoformat(),
+        }
+        return self.last_rebuild
+
+    async def refresh(self) -> int:
+        """Pick up customers inserted by other workers since the last scan"""
+        if self.bloom is None:
+            return 0
+        version = await self._shared_version()
+        rows = await self._scan(self.bloom, min_id=max(0, self._max_id - CATCH_UP_OVERLAP_IDS))
+        self._version = version
+        return rows
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Filter sizing, error rate and how often it answered without the database"""
+        return {
+            "enabled": self.enabled,
+            "ready": self.ready,
+            "filter": self.bloom.get_stats() if self.bloom is not None else None,
+            "checks": self.checks,
+            "definite_negatives": self.definite_negatives,
+            "unconfirmed_negatives": self.unconfirmed_negatives,
+            "redis_errors": self.redis_errors,
+            "rebuilds": self.rebuilds,
+            "last_rebuild": self.last_rebuild,
+        }
@@ -0,0 +1,85 @@
+"""
+Pooled HTTP client for upstream APIs
+
+One pooled httpx.AsyncClient is kept per worker so that Shopify calls reuse
+keep-alive (and HTTP/2) connections instead of paying DNS + TCP + TLS
+handshakes on every request. ShopifyService opens and closes it from its
+startup/shutdown hooks.
+"""
+from typing import Optional, Dict, Any
+import httpx
+
+from ..config import get_settings
+
+settings = get_settings()
+
+_requests_sent = 0  # Across all pooled clients in this worker
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional h2 package (httpx[http2])"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+async def _count_request(request: httpx.Request):
+    global _requests_sent
+    _requests_sent += 1
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Build a pooled client from settings"""
+    http2 = settings.shopify_http2_enabled
+    if http2 and not _http2_available():
+        print("⚠️ HTTP/2 requested but h2 is not installed, falling back to HTTP/1.1")
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=settings.shopify_http_max_connections,
+        max_keepalive_connections=settings.shopify_http_max_keepalive_connections,
+        keepalive_expiry=settings.shopify_http_keepalive_expiry_seconds
+    )
+    return httpx.AsyncClient(
+        timeout=settings.shopify_http_timeout_seconds,
+        limits=limits,
+        http2=http2,
+        event_hooks={"request": [_count_request]}
+    )
+
+
+def get_pool_stats(client: Optional[httpx.AsyncClient]) -> Dict[str, Any]:
+    """Connection pool usage, for sizing the limits above"""
+    stats = {
+        "open": client is not None and not client.is_closed,
+        "http2_enabled": settings.shopify_http2_enabled,
+        "max_connections": settings.shopify_http_max_connections,
+        "max_keepalive_connections": settings.shopify_http_max_keepalive_connections,
+        "keepalive_expiry_seconds": settings.shopify_http_keepalive_expiry_seconds,
+        "requests_sent": _requests_sent,
+        "connections": 0,
+        "active_connections": 0,
+        "idle_connections": 0,
+        "active_requests": 0,
+        "queued_requests": 0,
+    }
+    if not stats["open"]:
+        return stats
+
+    # httpx does not expose pool state publicly; read it from the httpcore pool
+    pool = getattr(client._transport, "_pool", None)
+    if pool is None:
+        return stats
+
+    connections = list(pool.connections)
+    idle = sum(1 for connection in connections if connection.is_idle())
+    stats["connections"] = len(connections)
+    stats["idle_connections"] = idle
+    stats["active_connections"] = len(connections) - idle
+
+    queued = [request.is_queued() for request in list(getattr(pool, "_requests", []))]
+    stats["queued_requests"] = queued.count(True)
+    stats["active_requests"] = queued.count(False)
+    return stats
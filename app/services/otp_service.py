@@ -1,12 +1,10 @@
 import random
 import string
-from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from twilio.rest import Client
-from twilio.base.exceptions import TwilioRestException
 
-from ..models import OTPVerification
 from ..config import get_settings
+from .otp_store import OTPStore, create_otp_store
+from .sms_dispatcher import SMSDispatcher
+from ..utils.tracing import span
 
 settings = get_settings()
 
@@ -14,12 +12,26 @@ settings = get_settings()
 class OTPService:
     """Service for handling OTP generation and verification"""
     
-    def __init__(self):
-        self.twilio_client = Client(
-            settings.twilio_account_sid,
-            settings.twilio_auth_token
-        )
-        self.from_number = settings.twilio_phone_number
+    def __init__(self, dispatcher: SMSDispatcher = None, store: OTPStore = None):
+        self.sms_dispatcher = dispatcher or SMSDispatcher()
+        self.store = store or create_otp_store()
+    
+    async def startup(self):
+        """Open the OTP store and start SMS delivery workers (called once from the app lifespan)"""
+        await self.store.startup()
+        await self.sms_dispatcher.start()
+    
+    async def shutdown(self):
+        """Drain and stop SMS delivery workers, then close the OTP store"""
+        await self.sms_dispatcher.stop()
+        await self.store.shutdown()
+    
+    def get_stats(self) -> dict:
+        """Runtime statistics for this service"""
+        return {
+            "sms_queue": self.sms_dispatcher.get_stats(),
+            "otp_store": self.store.get_stats()
+        }
     
     @staticmethod
     def generate_otp(length: int = None) -> str:
@@ -32,96 +44,45 @@ class OTPService:
         """Generate unique session ID"""
         return ''.join(random.choices(string.ascii_letters + string.digits, k=32))
     
-    def send_otp(self, phone: str, db: Session) -> tuple[bool, str, str]:
+    async def send_otp(self, phone: str) -> tuple[bool, str, str]:
         """
         Send OTP to phone number via SMS
+        The SMS is queued for background delivery, so this returns before Twilio responds.
         Returns: (success, message, session_id)
+        Raises SMSQueueFullError when the SMS queue is at capacity
         """
-        try:
-            # Generate OTP and session
-            otp_code = self.generate_otp()
-            session_id = self.generate_session_id()
-            expires_at = datetime.utcnow() + timedelta(minutes=settings.otp_expiration_minutes)
-            
-            # Invalidate previous OTPs for this phone (optional, for security)
-            db.query(OTPVerification).filter(
-                OTPVerification.phone == phone,
-                OTPVerification.is_verified == False
-            ).update({"is_verified": True})  # Mark old OTPs as used
-            
-            # Store OTP in database
-            otp_record = OTPVerification(
-                phone=phone,
-                otp_code=otp_code,
-                session_id=session_id,
-                expires_at=expires_at
-            )
-            db.add(otp_record)
-            db.commit()
-            
-            # Send SMS via Twilio
-            message_body = f"Your SlayFashion verification code is: {otp_code}\nValid for {settings.otp_expiration_minutes} minutes."
-            
+        # Hold an SMS queue slot before writing anything: if delivery is backed up,
+        # shed load here rather than after the phone's previous OTPs are invalidated
+        with self.sms_dispatcher.reserve() as sms_slot:
             try:
-                message = self.twilio_client.messages.create(
-                    body=message_body,
-                    from_=self.from_number,
-                    to=phone
-                )
+                # Generate OTP and session
+                otp_code = self.generate_otp()
+                session_id = self.generate_session_id()
                 
-                print(f"✅ OTP sent to {phone}: {otp_code} (Message SID: {message.sid})")
-                return True, "OTP sent successfully", session_id
+                # Store OTP (previous unverified OTPs for this phone are invalidated)
+                with span("otp_store"):
+                    await self.store.create(
+                        phone,
+                        otp_code,
+                        session_id,
+                        ttl_seconds=settings.otp_expiration_minutes * 60
+                    )
+                
+                # Queue SMS for delivery via Twilio (the held slot can't be full)
+                message_body = f"Your SlayFashion verification code is: {otp_code}\nValid for {settings.otp_expiration_minutes} minutes."
+                sms_slot.send(phone, message_body)
                 
-            except TwilioRestException as e:
-                print(f"❌ Twilio error: {e}")
-                # For development: still return success with session_id so you can test
-                # In production, you should return failure here
-                print(f"⚠️ DEV MODE: OTP not sent but proceeding. OTP is: {otp_code}")
-                return True, f"OTP would be sent (DEV MODE - OTP: {otp_code})", session_id
-        
-        except Exception as e:
-            print(f"❌ Error sending OTP: {e}")
-            return False, f"Failed to send OTP: {str(e)}", ""
+                print(f"📨 OTP queued for {phone}: {otp_code}")
+                return True, "OTP sent successfully", session_id
+            
+            except Exception as e:
+                print(f"❌ Error sending OTP: {e}")
+                return False, f"Failed to send OTP: {str(e)}", ""
     
-    @staticmethod
-    def verify_otp(phone: str, otp_code: str, session_id: str, db: Session) -> tuple[bool, str]:
+    async def verify_otp(self, phone: str, otp_code: str, session_id: str) -> tuple[bool, str]:
         """
         Verify OTP code
         Returns: (success, message)
         """
-        # Find OTP record
-        otp_record = db.query(OTPVerification).filter(
-            OTPVerification.phone == phone,
-            OTPVerification.session_id == session_id
-        ).first()
-        
-        if not otp_record:
-            return False, "Invalid session or phone number"
-        
-        # Check if already verified
-        if otp_record.is_verified:
-            return False, "OTP already used"
-        
-        # Check if expired
-        if otp_record.is_expired():
-            return False, "OTP has expired"
-        
-        # Check attempts (prevent brute force)
-        if otp_record.attempts >= 5:
-            return False, "Too many attempts. Please request a new OTP"
-        
-        # Increment attempts
-        otp_record.attempts += 1
-        db.commit()
-        
-        # Verify OTP
-        if otp_record.otp_code != otp_code:
-            return False, f"Invalid OTP code. {5 - otp_record.attempts} attempts remaining"
-        
-        # Mark as verified
-        otp_record.is_verified = True
-        otp_record.verified_at = datetime.utcnow()
-        db.commit()
-        
-        return True, "OTP verified successfully"
-
+        with span("otp_verify"):
+            return await self.store.verify(phone, session_id, otp_code)
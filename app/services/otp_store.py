@@ -0,0 +1,351 @@
+"""
+OTP storage backends
+
+OTP rows only live for a few minutes, so they don't have to sit in the
+primary database. OTPService talks to an OTPStore:
+
+- SQLOTPStore: the otp_verifications table (default)
+- MemoryOTPStore: in-process dict with TTL, for single-node, single-worker deployments
+- RedisOTPStore: shared across workers, native key expiry and atomic attempt counting
+"""
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+from sqlalchemy import select, update, case
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from ..models import OTPVerification
+from ..config import get_settings
+from ..utils.tracing import span
+
+settings = get_settings()
+
+MAX_ATTEMPTS = 5
+
+
+class OTPStore:
+    """Storage interface for OTP codes"""
+
+    backend = "base"
+
+    async def startup(self):
+        """Open backend resources"""
+
+    async def shutdown(self):
+        """Release backend resources"""
+
+    async def create(self, phone: str, otp_code: str, session_id: str, ttl_seconds: int):
+        """Store a new OTP and invalidate the phone's previous unverified OTPs"""
+        raise NotImplementedError
+
+    async def verify(self, phone: str, session_id: str, otp_code: str) -> tuple[bool, str]:
+        """
+        Check an OTP, counting the attempt
+        Returns: (success, message)
+        """
+        raise NotImplementedError
+
+    async def peek(self, session_id: str) -> Optional[str]:
+        """
+        OTP code of a session without counting an attempt
+        For load tests and tooling only; never expose it through the API
+        """
+        raise NotImplementedError
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Backend statistics"""
+        return {"backend": self.backend}
+
+
+class SQLOTPStore(OTPStore):
+    """OTPs in the otp_verifications table"""
+
+    backend = "sql"
+
+    def __init__(self, session_factory: async_sessionmaker = None):
+        if session_factory is None:
+            from ..database import AsyncSessionLocal
+            session_factory = AsyncSessionLocal
+        self.session_factory = session_factory
+
+    async def create(self, phone: str, otp_code: str, session_id: str, ttl_seconds: int):
+        async with self.session_factory() as db:
+            # Invalidate previous OTPs for this phone (optional, for security)
+            await db.execute(
+                update(OTPVerification)
+                .where(
+                    OTPVerification.phone == phone,
+                    OTPVerification.is_verified == False
+                )
+                .values(is_verified=True)  # Mark old OTPs as used
+            )
+
+            db.add(OTPVerification(
+                phone=phone,
+                otp_code=otp_code,
+                session_id=session_id,
+                expires_at=datetime.utcnow() + timedelta(seconds=ttl_seconds)
+            ))
+            await db.commit()
+
+    async def peek(self, session_id: str) -> Optional[str]:
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(OTPVerification.otp_code).where(OTPVerification.session_id == session_id)
+            )
+            return result.scalar()
+
+    async def verify(self, phone: str, session_id: str, otp_code: str) -> tuple[bool, str]:
+        """
+        One conditional UPDATE ... RETURNING counts the attempt, checks expiry
+        and the code, and marks the row verified atomically, so concurrent
+        verifies can't both slip under the attempt limit.
+        """
+        now = datetime.utcnow()
+        code_matches = OTPVerification.otp_code == otp_code
+
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(OTPVerification)
+                .where(
+                    OTPVerification.phone == phone,
+                    OTPVerification.session_id == session_id,
+                    OTPVerification.is_verified == False,
+                    OTPVerification.expires_at >= now,
+                    OTPVerification.attempts < MAX_ATTEMPTS
+                )
+                .values(
+                    attempts=OTPVerification.attempts + 1,
+                    is_verified=code_matches,
+                    verified_at=case((code_matches, now), else_=None)
+                )
+                .returning(OTPVerification.attempts, OTPVerification.is_verified)
+                .execution_options(synchronize_session=False)
+            )
+            row = result.first()
+            with span("db_commit"):
+                await db.commit()
+
+            if row is not None:
+                attempts, verified = row
+                if verified:
+                    return True, "OTP verified successfully"
+                return False, f"Invalid OTP code. {MAX_ATTEMPTS - attempts} attempts remaining"
+
+            # Nothing updated: read the row once to explain why (cold path)
+            result = await db.execute(
+                select(OTPVerification).where(
+                    OTPVerification.phone == phone,
+                    OTPVerification.session_id == session_id
+                )
+            )
+            otp_record = result.scalars().first()
+
+        if not otp_record:
+            return False, "Invalid session or phone number"
+        if otp_record.is_verified:
+            return False, "OTP already used"
+        if otp_record.is_expired():
+            return False, "OTP has expired"
+        return False, "Too many attempts. Please request a new OTP"
+
+
+class _MemoryOTP:
+    __slots__ = ("phone", "otp_code", "expires_at", "purge_at", "attempts", "is_verified")
+
+    def __init__(self, phone: str, otp_code: str, expires_at: float, purge_at: float):
+        self.phone = phone
+        self.otp_code = otp_code
+        self.expires_at = expires_at
+        self.purge_at = purge_at
+        self.attempts = 0
+        self.is_verified = False
+
+
+class MemoryOTPStore(OTPStore):
+    """
+    In-process OTPs with TTL
+
+    Only valid when one process serves both send-otp and verify-otp.
+    Records are kept for one extra TTL after expiry so late verifies still
+    get "OTP has expired" rather than "Invalid session".
+    """
+
+    backend = "memory"
+
+    def __init__(self, max_size: int = 100000):
+        self.max_size = max_size
+        # Store: session_id -> record, in creation order (= purge order, TTL is constant)
+        self._records: "OrderedDict[str, _MemoryOTP]" = OrderedDict()
+        # Store: phone -> latest unverified session_id
+        self._latest: Dict[str, str] = {}
+
+    def _purge(self, now: float):
+        while self._records:
+            session_id, record = next(iter(self._records.items()))
+            if record.purge_at > now and len(self._records) <= self.max_size:
+                break
+            self._records.popitem(last=False)
+            if self._latest.get(record.phone) == session_id:
+                del self._latest[record.phone]
+
+    async def create(self, phone: str, otp_code: str, session_id: str, ttl_seconds: int):
+        now = time.time()
+        self._purge(now)
+
+        previous = self._latest.get(phone)
+        if previous in self._records:
+            self._records[previous].is_verified = True  # Mark old OTP as used
+
+        self._records[session_id] = _MemoryOTP(phone, otp_code, now + ttl_seconds, now + 2 * ttl_seconds)
+        self._latest[phone] = session_id
+
+    async def verify(self, phone: str, session_id: str, otp_code: str) -> tuple[bool, str]:
+        record = self._records.get(session_id)
+        if record is None or record.phone != phone:
+            return False, "Invalid session or phone number"
+        if record.is_verified:
+            return False, "OTP already used"
+        if time.time() > record.expires_at:
+            return False, "OTP has expired"
+        if record.attempts >= MAX_ATTEMPTS:
+            return False, "Too many attempts. Please request a new OTP"
+
+        record.attempts += 1
+        if record.otp_code != otp_code:
+            return False, f"Invalid OTP code. {MAX_ATTEMPTS - record.attempts} attempts remaining"
+
+        record.is_verified = True
+        if self._latest.get(phone) == session_id:
+            del self._latest[phone]
+        return True, "OTP verified successfully"
+
+    async def peek(self, session_id: str) -> Optional[str]:
+        record = self._records.get(session_id)
+        return record.otp_code if record is not None else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "records": len(self._records),
+            "max_size": self.max_size,
+        }
+
+
+# KEYS[1] = otp hash, KEYS[2] = phone -> latest session pointer
+# ARGV = phone, otp code, ttl seconds, session key prefix, session id
+_CREATE_SCRIPT = """
+local previous = redis.call('GET', KEYS[2])
+if previous then
+    local previous_key = ARGV[4] .. previous
+    if redis.call('EXISTS', previous_key) == 1 then
+        redis.call('HSET', previous_key, 'verified', 1)
+    end
+end
+local ttl = math.max(tonumber(ARGV[3]), 1)
+local t = redis.call('TIME')
+local expires_at = tonumber(t[1]) + tonumber(ARGV[3])
+redis.call('HSET', KEYS[1], 'phone', ARGV[1], 'code', ARGV[2], 'expires_at', expires_at, 'attempts', 0, 'verified', 0)
+redis.call('EXPIRE', KEYS[1], ttl * 2)
+redis.call('SET', KEYS[2], ARGV[5], 'EX', ttl)
+return 1
+"""
+
+# KEYS[1] = otp hash; ARGV = phone, otp code, max attempts
+# Returns {status, attempts}: 0 ok, 1 invalid session, 2 already used, 3 expired, 4 too many, 5 wrong code
+_VERIFY_SCRIPT = """
+local record = redis.call('HMGET', KEYS[1], 'phone', 'code', 'expires_at', 'attempts', 'verified')
+if not record[1] or record[1] ~= ARGV[1] then
+    return {1, 0}
+end
+if record[5] == '1' then
+    return {2, 0}
+end
+local t = redis.call('TIME')
+if tonumber(t[1]) > tonumber(record[3]) then
+    return {3, 0}
+end
+if tonumber(record[4]) >= tonumber(ARGV[3]) then
+    return {4, tonumber(record[4])}
+end
+local attempts = redis.call('HINCRBY', KEYS[1], 'attempts', 1)
+if record[2] ~= ARGV[2] then
+    return {5, attempts}
+end
+redis.call('HSET', KEYS[1], 'verified', 1)
+return {0, attempts}
+"""
+
+
+class RedisOTPStore(OTPStore):
+    """
+    OTPs in Redis with native expiry
+
+    Usage:
+        store = RedisOTPStore(redis.asyncio.Redis.from_url(url))
+
+    Any asyncio client exposing register_script works (e.g. fakeredis in tests).
+    """
+
+    backend = "redis"
+
+    def __init__(self, client, prefix: str = "otp"):
+        self.client = client
+        self.prefix = prefix
+        self._create = client.register_script(_CREATE_SCRIPT)
+        self._verify = client.register_script(_VERIFY_SCRIPT)
+
+    def _session_key(self, session_id: str) -> str:
+        return f"{self.prefix}:session:{session_id}"
+
+    def _phone_key(self, phone: str) -> str:
+        return f"{self.prefix}:phone:{phone}"
+
+    async def shutdown(self):
+        await self.client.aclose()
+
+    async def create(self, phone: str, otp_code: str, session_id: str, ttl_seconds: int):
+        await self._create(
+            keys=[self._session_key(session_id), self._phone_key(phone)],
+            args=[phone, otp_code, ttl_seconds, f"{self.prefix}:session:", session_id]
+        )
+
+    async def verify(self, phone: str, session_id: str, otp_code: str) -> tuple[bool, str]:
+        status, attempts = await self._verify(
+            keys=[self._session_key(session_id)],
+            args=[phone, otp_code, MAX_ATTEMPTS]
+        )
+        status, attempts = int(status), int(attempts)
+
+        if status == 0:
+            return True, "OTP verified successfully"
+        if status == 1:
+            return False, "Invalid session or phone number"
+        if status == 2:
+            return False, "OTP already used"
+        if status == 3:
+            return False, "OTP has expired"
+        if status == 4:
+            return False, "Too many attempts. Please request a new OTP"
+        return False, f"Invalid OTP code. {MAX_ATTEMPTS - attempts} attempts remaining"
+
+    async def peek(self, session_id: str) -> Optional[str]:
+        code = await self.client.hget(self._session_key(session_id), "code")
+        return code.decode() if isinstance(code, bytes) else code
+
+
+def create_otp_store() -> OTPStore:
+    """Build the store selected by settings.otp_store_backend"""
+    if settings.otp_store_backend == "memory":
+        return MemoryOTPStore(max_size=settings.otp_memory_store_max_size)
+    if settings.otp_store_backend == "redis":
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(
+            settings.redis_url,
+            socket_timeout=settings.redis_socket_timeout_seconds,
+            socket_connect_timeout=settings.redis_socket_timeout_seconds
+        )
+        return RedisOTPStore(client, prefix=settings.otp_redis_prefix)
+    return SQLOTPStore()
@@ -0,0 +1,396 @@
+"""
+Retention for otp_verifications
+
+OTP rows are useless a few minutes after they are created, but nothing
+removed them, so the table and its indexes grew with every OTP ever sent.
+OTPRetentionService runs in the background and either:
+
+- deletes expired/used rows older than the retention window in small,
+  paced batches (any database), or
+- on Postgres, when otp_verifications is range-partitioned by day on
+  created_at, drops old daily partitions instead of deleting rows.
+
+Upcoming partitions are created at startup and on their own schedule,
+independent of retention, so inserts keep landing in a partition even
+when retention is disabled or a purge keeps failing.
+"""
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, date
+from typing import Optional, Dict, Any, List
+from sqlalchemy import delete, select, or_, text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from ..models import OTPVerification
+from ..config import get_settings
+
+settings = get_settings()
+
+TABLE_NAME = OTPVerification.__tablename__
+LEGACY_TABLE_NAME = f"{TABLE_NAME}_legacy"
+PARTITION_PREFIX = f"{TABLE_NAME}_p"
+# Indexes that keep their names when the plain table is renamed (the plain
+# phone index was dropped by migration 0002 but may still exist on older databases)
+PLAIN_TABLE_INDEXES = (
+    f"{TABLE_NAME}_pkey",
+    "ix_otp_verifications_id",
+    "ix_otp_verifications_phone",
+    "ix_otp_verifications_session_id",
+    "ix_otp_verifications_created_at",
+    "ix_otp_verifications_phone_session_id",
+    "ix_otp_verifications_phone_unverified",
+)
+OTP_COLUMNS = "id, phone, otp_code, session_id, is_verified, attempts, created_at, expires_at, verified_at"
+# Arbitrary constant so only one worker across the deployment runs a purge at a time
+ADVISORY_LOCK_KEY = 7_310_421
+
+
+class OTPPartitionManager:
+    """Daily range partitions on otp_verifications.created_at (Postgres only)"""
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+
+    async def is_partitioned(self) -> bool:
+        """True if otp_verifications is a partitioned table"""
+        async with self.engine.connect() as conn:
+            result = await conn.execute(text(
+                "SELECT 1 FROM pg_partitioned_table pt "
+                "JOIN pg_class c ON c.oid = pt.partrelid "
+                "WHERE c.relname = :table"
+            ), {"table": TABLE_NAME})
+            return result.first() is not None
+
+    @staticmethod
+    def partition_name(day: date) -> str:
+        return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+    async def list_partitions(self) -> List[str]:
+        """Names of the daily partitions currently attached"""
+        async with self.engine.connect() as conn:
+            result = await conn.execute(text(
+                "SELECT child.relname FROM pg_inherits i "
+                "JOIN pg_class parent ON parent.oid = i.inhparent "
+                "JOIN pg_class child ON child.oid = i.inhrelid "
+                "WHERE parent.relname = :table ORDER BY child.relname"
+            ), {"table": TABLE_NAME})
+            return [row[0] for row in result]
+
+    async def ensure_partitions(self, days_ahead: int = None) -> int:
+        """Create partitions for today and the next few days; returns how many were created"""
+        days_ahead = settings.otp_partition_days_ahead if days_ahead is None else days_ahead
+        existing = set(await self.list_partitions())
+        today = datetime.utcnow().date()
+
+        async with self.engine.begin() as conn:
+            return await self._create_partitions(conn, today, today + timedelta(days=days_ahead), existing)
+
+    async def _create_partitions(self, conn, first_day: date, last_day: date, existing: set = frozenset()) -> int:
+        """Create the daily partitions from first_day to last_day inclusive; returns how many were created"""
+        created = 0
+        day = first_day
+        while day <= last_day:
+            name = self.partition_name(day)
+            if name not in existing:
+                await conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {TABLE_NAME} "
+                    f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+                ))
+                created += 1
+            day += timedelta(days=1)
+        return created
+
+    async def drop_expired_partitions(self, cutoff: datetime) -> int:
+        """Drop partitions whose whole day is older than the cutoff; returns how many were dropped"""
+        dropped = 0
+        for name in await self.list_partitions():
+            try:
+                day = datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d").date()
+            except ValueError:
+                continue  # Not one of ours
+            if datetime.combine(day + timedelta(days=1), datetime.min.time()) > cutoff:
+                continue
+            async with self.engine.begin() as conn:
+                await conn.execute(text(f"ALTER TABLE {TABLE_NAME} DETACH PARTITION {name}"))
+                await conn.execute(text(f"DROP TABLE {name}"))
+            dropped += 1
+        return dropped
+
+    async def convert_to_partitioned(self) -> int:
+        """
+        One-off: replace a plain otp_verifications table with a partitioned one
+        Returns: number of unexpired OTPs carried over
+
+        Runs in one transaction. The old table and its indexes get a _legacy
+        suffix. OTPs that can still be verified are copied across with their
+        ids, so logins in progress are unaffected and the legacy table can be
+        dropped straight away. The new table gets the indexes from migration
+        0002. Postgres requires unique keys to include the partition key, so
+        the primary key becomes (id, created_at) and session_id is unique per
+        day rather than globally. Session ids are 32 random characters, so
+        collisions are not a practical concern.
+        """
+        if await self.is_partitioned():
+            return 0
+
+        now = datetime.utcnow()
+        async with self.engine.begin() as conn:
+            await conn.execute(text(f"ALTER TABLE {TABLE_NAME} RENAME TO {LEGACY_TABLE_NAME}"))
+            await conn.execute(text(f"ALTER SEQUENCE IF EXISTS {TABLE_NAME}_id_seq RENAME TO {LEGACY_TABLE_NAME}_id_seq"))
+            for index in PLAIN_TABLE_INDEXES:
+                await conn.execute(text(f"ALTER INDEX IF EXISTS {index} RENAME TO {index}_legacy"))
+            await conn.execute(text(
+                f"CREATE TABLE {TABLE_NAME} ("
+                "id SERIAL NOT NULL, "
+                "phone VARCHAR NOT NULL, "
+                "otp_code VARCHAR NOT NULL, "
+                "session_id VARCHAR NOT NULL, "
+                "is_verified BOOLEAN, "
+                "attempts INTEGER, "
+                "created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL, "
+                "expires_at TIMESTAMP WITHOUT TIME ZONE NOT NULL, "
+                "verified_at TIMESTAMP WITHOUT TIME ZONE, "
+                "PRIMARY KEY (id, created_at), "
+                "UNIQUE (session_id, created_at)"
+                f") PARTITION BY RANGE (created_at)"
+            ))
+            # Same index set as migration 0002; the (session_id, created_at) unique index serves session_id lookups
+            await conn.execute(text(
+                f"CREATE INDEX ix_otp_verifications_phone_session_id ON {TABLE_NAME} (phone, session_id)"
+            ))
+            await conn.execute(text(
+                f"CREATE INDEX ix_otp_verifications_phone_unverified ON {TABLE_NAME} (phone) WHERE is_verified = false"
+            ))
+
+            # Partitions for the live OTPs (possibly from yesterday) through the usual days ahead
+            oldest = (await conn.execute(
+                text(f"SELECT MIN(COALESCE(created_at, :now)) FROM {LEGACY_TABLE_NAME} WHERE expires_at >= :now"),
+                {"now": now}
+            )).scalar()
+            today = now.date()
+            first_day = min(oldest.date(), today) if oldest is not None else today
+            await self._create_partitions(conn, first_day, today + timedelta(days=settings.otp_partition_days_ahead))
+
+            copied = await conn.execute(
+                text(
+                    f"INSERT INTO {TABLE_NAME} ({OTP_COLUMNS}) "
+                    "SELECT id, phone, otp_code, session_id, is_verified, attempts, "
+                    "COALESCE(created_at, :now), expires_at, verified_at "
+                    f"FROM {LEGACY_TABLE_NAME} WHERE expires_at >= :now"
+                ),
+                {"now": now}
+            )
+            # New ids continue after the legacy ones
+            await conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{TABLE_NAME}', 'id'), "
+                f"(SELECT COALESCE(MAX(id), 0) + 1 FROM {LEGACY_TABLE_NAME}), false)"
+            ))
+        return copied.rowcount or 0
+
+
+class OTPRetentionService:
+    """
+    Periodic purge of old OTP rows
+
+    Usage:
+        retention = OTPRetentionService()
+        await retention.startup()   # partitions for the coming days, background loops
+        result = await retention.purge_once()
+        await retention.shutdown()
+    """
+
+    def __init__(self, engine: AsyncEngine = None, session_factory: async_sessionmaker = None):
+        if engine is None or session_factory is None:
+            from ..database import async_engine, AsyncSessionLocal
+            engine = engine or async_engine
+            session_factory = session_factory or AsyncSessionLocal
+        self.engine = engine
+        self.session_factory = session_factory
+        self.is_postgres = engine.dialect.name == "postgresql"
+        self.partitions = OTPPartitionManager(engine) if self.is_postgres else None
+
+        self._task: Optional[asyncio.Task] = None
+        self._partition_task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.runs = 0
+        self.total_rows_purged = 0
+        self.total_partitions_created = 0
+        self.total_partitions_dropped = 0
+        self.last_run: Optional[Dict[str, Any]] = None
+        self.last_partition_check: Optional[Dict[str, Any]] = None
+
+    @property
+    def enabled(self) -> bool:
+        """Only meaningful when OTPs live in the database"""
+        return settings.otp_retention_enabled and settings.otp_store_backend == "sql"
+
+    @property
+    def partitioning_enabled(self) -> bool:
+        """Partition upkeep runs whether or not retention is enabled"""
+        return (
+            self.partitions is not None
+            and settings.otp_partitioning_enabled
+            and settings.otp_store_backend == "sql"
+        )
+
+    async def startup(self):
+        """Create upcoming partitions, then start the background loops"""
+        if self.partitioning_enabled and self._partition_task is None:
+            try:
+                await self.maintain_partitions()
+            except Exception as e:
+                print(f"❌ OTP partition check failed at startup: {e}")
+            self._partition_task = asyncio.create_task(self._maintain_partitions_forever(), name="otp-partitions")
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run_forever(), name="otp-retention")
+
+    async def shutdown(self):
+        """Stop the background loops"""
+        for task in (self._task, self._partition_task):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._task = None
+        self._partition_task = None
+
+    async def _run_forever(self):
+        # Spread workers out so they don't all wake at once
+        await asyncio.sleep(random.uniform(0, settings.otp_retention_interval_seconds))
+        while True:
+            try:
+                await self.purge_once()
+            except Exception as e:
+                print(f"❌ OTP retention run failed: {e}")
+            await asyncio.sleep(settings.otp_retention_interval_seconds)
+
+    async def _maintain_partitions_forever(self):
+        while True:
+            await asyncio.sleep(settings.otp_partition_interval_seconds)
+            try:
+                await self.maintain_partitions()
+            except Exception as e:
+                print(f"❌ OTP partition check failed: {e}")
+
+    async def _run_locked(self, work) -> bool:
+        """
+        Run work() while holding the deployment-wide advisory lock (Postgres)
+        Returns: False if another worker holds the lock and work() was skipped
+        """
+        if not self.is_postgres:
+            await work()
+            return True
+
+        async with self.engine.connect() as lock_conn:
+            locked = (await lock_conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY}
+            )).scalar()
+            if not locked:
+                return False
+            try:
+                await work()
+            finally:
+                await lock_conn.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY}
+                )
+                await lock_conn.commit()
+        return True
+
+    async def maintain_partitions(self) -> Dict[str, Any]:
+        """
+        Create partitions for today and the next few days
+        Returns: {"partitions_created", "skipped"}
+        """
+        result = {"partitions_created": 0, "skipped": False}
+
+        async def create():
+            if await self.partitions.is_partitioned():
+                result["partitions_created"] = await self.partitions.ensure_partitions()
+
+        # Skipped means another worker holds the lock and is doing the same upkeep
+        result["skipped"] = not await self._run_locked(create)
+        self.total_partitions_created += result["partitions_created"]
+        self.last_partition_check = {**result, "finished_at": datetime.utcnow().isoformat()}
+
+        if result["partitions_created"]:
+            print(f"🗓️  OTP retention: created {result['partitions_created']} partitions")
+        return result
+
+    def _cutoff(self) -> datetime:
+        return datetime.utcnow() - timedelta(hours=settings.otp_retention_hours)
+
+    async def purge_once(self) -> Dict[str, Any]:
+        """
+        Run one retention pass
+        Returns: {"rows_purged", "partitions_dropped", "batches", "duration_seconds", "skipped"}
+        """
+        started = time.monotonic()
+        result = {"rows_purged": 0, "partitions_dropped": 0, "partitions_created": 0, "batches": 0, "skipped": False}
+
+        # Skipped means another worker is already purging
+        result["skipped"] = not await self._run_locked(lambda: self._purge(result))
+
+        result["duration_seconds"] = round(time.monotonic() - started, 3)
+        self.runs += 1
+        self.total_rows_purged += result["rows_purged"]
+        self.total_partitions_created += result["partitions_created"]
+        self.total_partitions_dropped += result["partitions_dropped"]
+        self.last_run = {**result, "finished_at": datetime.utcnow().isoformat()}
+
+        if result["rows_purged"] or result["partitions_dropped"]:
+            print(
+                f"🧹 OTP retention: purged {result['rows_purged']} rows, "
+                f"dropped {result['partitions_dropped']} partitions in {result['duration_seconds']}s"
+            )
+        return result
+
+    async def _purge(self, result: Dict[str, Any]):
+        cutoff = self._cutoff()
+
+        if self.partitions is not None and settings.otp_partitioning_enabled and await self.partitions.is_partitioned():
+            result["partitions_created"] = await self.partitions.ensure_partitions()
+            result["partitions_dropped"] = await self.partitions.drop_expired_partitions(cutoff)
+            return
+
+        await self._delete_in_batches(cutoff, result)
+
+    async def _delete_in_batches(self, cutoff: datetime, result: Dict[str, Any]):
+        """Short transactions so the send/verify hot path never waits on a big delete"""
+        now = datetime.utcnow()
+        for _ in range(settings.otp_retention_max_batches):
+            batch = (
+                select(OTPVerification.id)
+                .where(
+                    OTPVerification.created_at < cutoff,
+                    or_(OTPVerification.is_verified == True, OTPVerification.expires_at < now)
+                )
+                .limit(settings.otp_retention_batch_size)
+                .scalar_subquery()
+            )
+            async with self.session_factory() as db:
+                deleted = await db.execute(
+                    delete(OTPVerification)
+                    .where(OTPVerification.id.in_(batch))
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+
+            result["batches"] += 1
+            result["rows_purged"] += deleted.rowcount or 0
+            if (deleted.rowcount or 0) < settings.otp_retention_batch_size:
+                return
+            await asyncio.sleep(settings.otp_retention_batch_pause_seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Totals and the result of the last run"""
+        return {
+            "enabled": self.enabled,
+            "partitioning_enabled": self.partitioning_enabled,
+            "runs": self.runs,
+            "total_rows_purged": self.total_rows_purged,
+            "total_partitions_created": self.total_partitions_created,
+            "total_partitions_dropped": self.total_partitions_dropped,
+            "last_run": self.last_run,
+            "last_partition_check": self.last_partition_check,
+        }
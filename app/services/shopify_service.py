@@ -1,26 +1,155 @@
+import asyncio
 import httpx
+import random
 import secrets
 import string
+import time
 from typing import Optional, Dict, Any
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from ..models import Customer
+from ..schemas import CustomerData
 from ..config import get_settings
+from .http_client import create_http_client, get_pool_stats
+from ..utils.token_cache import CustomerTokenCache
+from ..utils.customer_cache import CustomerCache
+from ..utils.security import Multipass, normalize_phone
+from ..utils.single_flight import SingleFlight
+from ..utils.circuit_breaker import CircuitBreaker
+from ..utils.hedging import HedgePolicy
+from ..utils.metrics import record_upstream, response_outcome
+from ..utils.tracing import span
+from .customer_filter import CustomerPhoneFilter
+from .shopify_throttle import CostBucket, ShopifyThrottledError, backoff_delay, parse_retry_after
 
 settings = get_settings()
 
+# Retries of the Admin customer search when reconciling a create conflict
+RECONCILE_SEARCH_ATTEMPTS = 3
+RECONCILE_SEARCH_DELAY_SECONDS = 0.5
+
+# Domain of the hidden emails this backend gives the customers it provisions
+HIDDEN_EMAIL_DOMAIN = "slayfashion.internal"
+
+
+class ShopifyCustomerConflict(Exception):
+    """Raised when Shopify rejects a new customer because its hidden email is already taken"""
+    
+    def __init__(self, errors: Dict[str, Any]):
+        super().__init__(f"Shopify customer email has already been taken: {errors}")
+        self.errors = errors
+
+
+class ShopifyCustomerNotAdoptable(Exception):
+    """Raised when OTP login would reset the password of a Shopify account this backend didn't create"""
+
+
+def email_taken(errors: Any) -> bool:
+    """True if a REST 422 error says the email is already taken"""
+    if not isinstance(errors, dict):
+        return False
+    return any("taken" in str(message) for message in errors.get("email") or [])
+
 
 class ShopifyService:
     """Service for interacting with Shopify Admin and Storefront APIs"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        customer_cache: Optional[CustomerCache] = None,
+        customer_filter: Optional[CustomerPhoneFilter] = None,
+        session_factory: Optional[async_sessionmaker] = None
+    ):
         self.store_domain = settings.shopify_store_domain
         self.admin_token = settings.shopify_admin_api_token
         self.storefront_token = settings.shopify_storefront_access_token
         self.api_version = settings.shopify_api_version
         
-        self.admin_url = f"https://{self.store_domain}/admin/api/{self.api_version}/graphql.json"
-        self.storefront_url = f"https://{self.store_domain}/api/{self.api_version}/graphql.json"
+        self.base_url = (settings.shopify_api_base_url or f"https://{self.store_domain}").rstrip("/")
+        
+        self.admin_url = f"{self.base_url}/admin/api/{self.api_version}/graphql.json"
+        self.storefront_url = f"{self.base_url}/api/{self.api_version}/graphql.json"
+        self.customers_rest_url = f"{self.base_url}/admin/api/{self.api_version}/customers.json"
+        
+        # Customers with their own email/password log in through Multipass when the store has it
+        self.multipass = Multipass(settings.shopify_multipass_secret) if settings.shopify_multipass_secret else None
+        
+        self.http_client: Optional[httpx.AsyncClient] = None
+        self.token_cache = CustomerTokenCache(
+            max_size=settings.shopify_token_cache_size,
+            safety_margin_seconds=settings.shopify_token_cache_margin_seconds
+        )
+        # Profile cache shared with the customer routes; invalidated on insert
+        self.customer_cache = customer_cache
+        self.customer_filter = customer_filter
+        
+        # Provisioning opens its own sessions: it can outlive the request that started it
+        if session_factory is None:
+            from ..database import AsyncSessionLocal
+            session_factory = AsyncSessionLocal
+        self.session_factory = session_factory
+        
+        # Concurrent logins for the same phone share one provisioning call
+        self.provisioning = SingleFlight(max_in_flight=settings.shopify_single_flight_max_keys)
+        
+        # Fail fast while Shopify is erroring instead of queueing requests behind timeouts
+        self.admin_breaker = self._create_breaker("shopify_admin")
+        self.storefront_breaker = self._create_breaker("shopify_storefront")
+        self.token_hedge = HedgePolicy(
+            percentile=settings.shopify_hedge_percentile,
+            min_delay_seconds=settings.shopify_hedge_min_delay_seconds,
+            initial_delay_seconds=settings.shopify_hedge_initial_delay_seconds
+        )
+        
+        # Client-side mirrors of Shopify's rate-limit buckets (synced from every response)
+        self.admin_bucket = CostBucket("admin_graphql", maximum_available=1000, restore_rate=50, default_cost=10)
+        self.rest_bucket = CostBucket("admin_rest", maximum_available=40, restore_rate=2, default_cost=1)
+        self.throttled_responses = 0
+        self.throttle_retries = 0
+        self.throttle_gave_up = 0
+    
+    async def startup(self):
+        """Open the pooled HTTP client (called once from the app lifespan)"""
+        if self.http_client is None or self.http_client.is_closed:
+            self.http_client = create_http_client()
+    
+    async def shutdown(self):
+        """Close the pooled HTTP client and its keep-alive connections"""
+        if self.http_client is not None:
+            await self.http_client.aclose()
+            self.http_client = None
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Pooled HTTP client, opened lazily when used outside the app lifespan"""
+        if self.http_client is None or self.http_client.is_closed:
+            self.http_client = create_http_client()
+        return self.http_client
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Runtime statistics for this service"""
+        return {
+            "http_pool": get_pool_stats(self.http_client),
+            "token_cache": self.token_cache.get_stats(),
+            "provisioning_single_flight": self.provisioning.get_stats(),
+            "circuit_breakers": {
+                "shopify_admin": self.admin_breaker.get_stats(),
+                "shopify_storefront": self.storefront_breaker.get_stats()
+            },
+            "token_hedging": {
+                "enabled": settings.shopify_token_hedging_enabled,
+                **self.token_hedge.get_stats()
+            },
+            "shopify_throttle": {
+                "admin_graphql": self.admin_bucket.get_stats(),
+                "admin_rest": self.rest_bucket.get_stats(),
+                "throttled_responses": self.throttled_responses,
+                "retries": self.throttle_retries,
+                "gave_up": self.throttle_gave_up
+            }
+        }
     
     @staticmethod
     def generate_random_password(length: int = 16) -> str:
@@ -34,48 +163,196 @@ class ShopifyService:
         # Remove + and other special chars from phone
         clean_phone = phone.replace("+", "").replace("-", "").replace(" ", "")
         # Create unique email that won't conflict
-        return f"customer.{clean_phone}@slayfashion.internal"
+        return f"customer.{clean_phone}@{HIDDEN_EMAIL_DOMAIN}"
     
-    async def admin_api_request(self, query: str, variables: Optional[Dict] = None) -> Dict[str, Any]:
-        """Make request to Shopify Admin API"""
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                self.admin_url,
+    @staticmethod
+    def has_own_credentials(email: Optional[str]) -> bool:
+        """
+        True if a Shopify customer with this email may have a password we
+        didn't set (a real email, not one of our hidden ones). Customers
+        without an email can't sign in with a password.
+        """
+        return bool(email) and not email.endswith(f"@{HIDDEN_EMAIL_DOMAIN}")
+    
+    def uses_multipass(self, email: Optional[str]) -> bool:
+        """True if a customer with this email gets tokens via Multipass instead of a hidden password"""
+        return self.multipass is not None and self.has_own_credentials(email)
+    
+    def check_adoptable(self, email: Optional[str], phone: str):
+        """Raise ShopifyCustomerNotAdoptable unless linking this account can't lock anyone out"""
+        if not self.has_own_credentials(email) or self.multipass is not None:
+            return
+        if not settings.shopify_adopt_existing_customers:
+            raise ShopifyCustomerNotAdoptable(
+                "This phone number belongs to an existing account. Please sign in with your email and password."
+            )
+        print(f"⚠️ Taking over existing Shopify account (password reset): {phone}")
+    
+    @staticmethod
+    def _create_breaker(name: str) -> CircuitBreaker:
+        return CircuitBreaker(
+            name,
+            failure_rate_threshold=settings.shopify_breaker_failure_rate,
+            minimum_calls=settings.shopify_breaker_min_calls,
+            window_seconds=settings.shopify_breaker_window_seconds,
+            open_seconds=settings.shopify_breaker_open_seconds,
+            half_open_max_calls=settings.shopify_breaker_half_open_calls
+        )
+    
+    async def _send(self, breaker: CircuitBreaker, upstream: str, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        One HTTP attempt through a circuit breaker, timed under `upstream`
+        Timeouts, connection errors and 5xx responses count as failures
+        """
+        breaker.before_call()
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            breaker.record_failure()
+            record_upstream(
+                upstream,
+                time.perf_counter() - started,
+                "timeout" if isinstance(e, httpx.TimeoutException) else "transport_error"
+            )
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        
+        record_upstream(upstream, time.perf_counter() - started, response_outcome(response.status_code))
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+    
+    async def _wait_to_retry(self, delay: float, deadline: float, what: str):
+        """Sleep before retrying a throttled call, or give up if the deadline would pass"""
+        self.throttled_responses += 1
+        if time.monotonic() + delay > deadline:
+            self.throttle_gave_up += 1
+            raise ShopifyThrottledError(f"Shopify {what} is throttling requests", retry_after=delay)
+        self.throttle_retries += 1
+        with span("shopify_throttle_wait"):
+            await asyncio.sleep(delay)
+    
+    async def _graphql_request(
+        self,
+        url: str,
+        headers: Dict[str, str],
+        query: str,
+        variables: Optional[Dict],
+        bucket: Optional[CostBucket],
+        breaker: CircuitBreaker,
+        upstream: str,
+        what: str,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        POST a GraphQL query, pacing it against the cost bucket and retrying
+        429s / THROTTLED errors with jittered backoff until the deadline
+        """
+        deadline = time.monotonic() + settings.shopify_throttle_deadline_seconds
+        attempt = 0
+        while True:
+            if bucket is not None:
+                await bucket.acquire(query, deadline)
+            
+            response = await self._send(
+                breaker,
+                upstream,
+                "POST",
+                url,
                 json={"query": query, "variables": variables or {}},
-                headers={
-                    "Content-Type": "application/json",
-                    "X-Shopify-Access-Token": self.admin_token
-                }
+                headers=headers,
+                timeout=timeout or settings.shopify_http_timeout_seconds
             )
+            
+            if response.status_code == 429:
+                delay = parse_retry_after(response.headers.get("Retry-After"))
+                await self._wait_to_retry(delay if delay is not None else backoff_delay(attempt), deadline, what)
+                attempt += 1
+                continue
+            
             response.raise_for_status()
             data = response.json()
             
-            if "errors" in data:
-                raise Exception(f"Shopify Admin API error: {data['errors']}")
+            if bucket is not None:
+                bucket.record(query, data.get("extensions", {}).get("cost"))
             
-            return data
-    
-    async def storefront_api_request(self, query: str, variables: Optional[Dict] = None) -> Dict[str, Any]:
-        """Make request to Shopify Storefront API"""
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                self.storefront_url,
-                json={"query": query, "variables": variables or {}},
-                headers={
-                    "Content-Type": "application/json",
-                    "X-Shopify-Storefront-Access-Token": self.storefront_token
-                }
+            errors = data.get("errors")
+            throttled = isinstance(errors, list) and any(
+                (error.get("extensions") or {}).get("code") == "THROTTLED" for error in errors
             )
-            response.raise_for_status()
-            data = response.json()
+            if throttled:
+                # Wait until the bucket refills enough for this query; jitter spreads out concurrent retries
+                delay = bucket.delay_for(bucket.expected_cost(query)) if bucket is not None else 0.0
+                delay = delay * random.uniform(1.0, 1.2) if delay > 0 else backoff_delay(attempt)
+                await self._wait_to_retry(delay, deadline, what)
+                attempt += 1
+                continue
             
-            if "errors" in data:
-                raise Exception(f"Shopify Storefront API error: {data['errors']}")
+            if errors:
+                raise Exception(f"Shopify {what} error: {errors}")
             
             return data
     
-    async def find_customer_by_phone(self, phone: str) -> Optional[Dict[str, Any]]:
-        """Find customer in Shopify by phone number using Admin API"""
+    async def _rest_request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Admin REST call paced against the REST bucket; 429s are retried after
+        Retry-After (or jittered backoff) until the deadline
+        """
+        deadline = time.monotonic() + settings.shopify_throttle_deadline_seconds
+        attempt = 0
+        while True:
+            await self.rest_bucket.acquire(None, deadline)
+            response = await self._send(self.admin_breaker, "shopify_admin_rest", method, url, **kwargs)
+            self.rest_bucket.record_call_limit(response.headers.get("X-Shopify-Shop-Api-Call-Limit"))
+            
+            if response.status_code != 429:
+                return response
+            
+            delay = parse_retry_after(response.headers.get("Retry-After"))
+            await self._wait_to_retry(delay if delay is not None else backoff_delay(attempt), deadline, "Admin REST API")
+            attempt += 1
+    
+    async def admin_api_request(self, query: str, variables: Optional[Dict] = None) -> Dict[str, Any]:
+        """Make request to Shopify Admin API"""
+        return await self._graphql_request(
+            self.admin_url,
+            {
+                "Content-Type": "application/json",
+                "X-Shopify-Access-Token": self.admin_token
+            },
+            query,
+            variables,
+            self.admin_bucket,
+            self.admin_breaker,
+            "shopify_admin_graphql",
+            "Admin API"
+        )
+    
+    async def storefront_api_request(self, query: str, variables: Optional[Dict] = None) -> Dict[str, Any]:
+        """Make request to Shopify Storefront API"""
+        # The Storefront API has no cost bucket; throttled calls are still retried
+        return await self._graphql_request(
+            self.storefront_url,
+            {
+                "Content-Type": "application/json",
+                "X-Shopify-Storefront-Access-Token": self.storefront_token
+            },
+            query,
+            variables,
+            None,
+            self.storefront_breaker,
+            "shopify_storefront",
+            "Storefront API",
+            timeout=settings.shopify_storefront_timeout_seconds
+        )
+    
+    async def search_customer(self, search: str) -> Optional[Dict[str, Any]]:
+        """First Shopify customer matching an Admin API search query (e.g. "phone:+91...")"""
         query = """
         query($query: String!) {
             customers(first: 1, query: $query) {
@@ -94,13 +371,21 @@ class ShopifyService:
         }
         """
         
-        result = await self.admin_api_request(query, {"query": f"phone:{phone}"})
+        result = await self.admin_api_request(query, {"query": search})
         
         edges = result.get("data", {}).get("customers", {}).get("edges", [])
         if edges:
             return edges[0]["node"]
         return None
     
+    async def find_customer_by_phone(self, phone: str) -> Optional[Dict[str, Any]]:
+        """Find customer in Shopify by phone number using Admin API"""
+        return await self.search_customer(f"phone:{phone}")
+    
+    async def find_customer_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        """Find customer in Shopify by email using Admin API"""
+        return await self.search_customer(f'email:"{email}"')
+    
     async def create_customer_in_shopify(self, phone: str, email: str, password: str) -> Dict[str, Any]:
         """
         Create customer in Shopify using REST Admin API with email and password
@@ -110,7 +395,7 @@ class ShopifyService:
         - REST Admin API DOES support password & password_confirmation fields
         - This is how GoKwik/KwikPass implement OTP login for Shopify
         """
-        rest_url = f"https://{self.store_domain}/admin/api/{self.api_version}/customers.json"
+        rest_url = self.customers_rest_url
         
         # Prepare customer data - phone is optional as it can cause validation issues
         customer_data = {
@@ -127,49 +412,156 @@ class ShopifyService:
         if phone:
             customer_data["customer"]["phone"] = phone
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                rest_url,
-                json=customer_data,
-                headers={
-                    "Content-Type": "application/json",
-                    "X-Shopify-Access-Token": self.admin_token
+        response = await self._rest_request(
+            "POST",
+            rest_url,
+            json=customer_data,
+            headers={
+                "Content-Type": "application/json",
+                "X-Shopify-Access-Token": self.admin_token
+            }
+        )
+        
+        # Hidden email already belongs to a Shopify customer - let the caller reconcile
+        if response.status_code == 422:
+            errors = response.json().get("errors", {})
+            if email_taken(errors):
+                raise ShopifyCustomerConflict(errors)
+        
+        # If phone validation fails (invalid or taken), retry without phone
+        if response.status_code == 422 and phone:
+            error_data = response.json()
+            if "phone" in error_data.get("errors", {}):
+                print(f"⚠️ Phone format rejected by Shopify, retrying without phone...")
+                del customer_data["customer"]["phone"]
+                response = await self._rest_request(
+                    "POST",
+                    rest_url,
+                    json=customer_data,
+                    headers={
+                        "Content-Type": "application/json",
+                        "X-Shopify-Access-Token": self.admin_token
+                    }
+                )
+        
+        if response.status_code not in [200, 201]:
+            error_data = response.json()
+            if response.status_code == 422 and email_taken(error_data.get("errors")):
+                raise ShopifyCustomerConflict(error_data["errors"])
+            raise Exception(f"Failed to create customer: {error_data}")
+        
+        result = response.json()
+        customer = result.get("customer")
+        
+        if not customer:
+            raise Exception("No customer returned from REST API")
+        
+        # Convert REST API response to match GraphQL format for consistency
+        return {
+            "id": customer.get("admin_graphql_api_id") or f"gid://shopify/Customer/{customer['id']}",
+            "email": customer["email"],
+            "phone": customer.get("phone"),
+            "firstName": customer.get("first_name"),
+            "lastName": customer.get("last_name")
+        }
+    
+    async def update_customer_credentials(self, shopify_customer_id: str, email: str, password: str) -> Dict[str, Any]:
+        """
+        Set the email and password of an existing Shopify customer (REST Admin API)
+        Used to give customers imported by the backfill hidden credentials
+        """
+        numeric_id = shopify_customer_id.rsplit("/", 1)[-1]
+        rest_url = f"{self.base_url}/admin/api/{self.api_version}/customers/{numeric_id}.json"
+        
+        response = await self._rest_request(
+            "PUT",
+            rest_url,
+            json={
+                "customer": {
+                    "id": int(numeric_id),
+                    "email": email,
+                    "password": password,
+                    "password_confirmation": password
+                }
+            },
+            headers={
+                "Content-Type": "application/json",
+                "X-Shopify-Access-Token": self.admin_token
+            }
+        )
+        
+        if response.status_code != 200:
+            raise Exception(f"Failed to update customer credentials: {response.text}")
+        
+        return response.json().get("customer", {})
+    
+    async def start_bulk_customer_export(self) -> Dict[str, Any]:
+        """
+        Start a bulk operation exporting every customer as JSONL
+        Returns: bulk operation {"id", "status"}
+        """
+        export_query = """
+        {
+            customers {
+                edges {
+                    node {
+                        id
+                        email
+                        phone
+                        firstName
+                        lastName
+                    }
+                }
+            }
+        }
+        """
+        
+        mutation = """
+        mutation($query: String!) {
+            bulkOperationRunQuery(query: $query) {
+                bulkOperation {
+                    id
+                    status
+                }
+                userErrors {
+                    field
+                    message
+                }
+            }
+        }
+        """
+        
+        result = await self.admin_api_request(mutation, {"query": export_query})
+        
+        payload = result["data"]["bulkOperationRunQuery"]
+        if payload.get("userErrors"):
+            raise Exception(f"Failed to start bulk operation: {payload['userErrors']}")
+        return payload["bulkOperation"]
+    
+    async def get_bulk_operation(self, operation_id: str) -> Dict[str, Any]:
+        """
+        Poll a bulk operation
+        Returns: {"id", "status", "errorCode", "objectCount", "url"} (url is set once COMPLETED)
+        """
+        query = """
+        query($id: ID!) {
+            node(id: $id) {
+                ... on BulkOperation {
+                    id
+                    status
+                    errorCode
+                    objectCount
+                    url
                 }
-            )
-            
-            # If phone validation fails, retry without phone
-            if response.status_code == 422 and phone:
-                error_data = response.json()
-                if "phone" in error_data.get("errors", {}):
-                    print(f"⚠️ Phone format rejected by Shopify, retrying without phone...")
-                    del customer_data["customer"]["phone"]
-                    response = await client.post(
-                        rest_url,
-                        json=customer_data,
-                        headers={
-                            "Content-Type": "application/json",
-                            "X-Shopify-Access-Token": self.admin_token
-                        }
-                    )
-            
-            if response.status_code not in [200, 201]:
-                error_data = response.json()
-                raise Exception(f"Failed to create customer: {error_data}")
-            
-            result = response.json()
-            customer = result.get("customer")
-            
-            if not customer:
-                raise Exception("No customer returned from REST API")
-            
-            # Convert REST API response to match GraphQL format for consistency
-            return {
-                "id": customer.get("admin_graphql_api_id") or f"gid://shopify/Customer/{customer['id']}",
-                "email": customer["email"],
-                "phone": customer.get("phone"),
-                "firstName": customer.get("first_name"),
-                "lastName": customer.get("last_name")
             }
+        }
+        """
+        
+        result = await self.admin_api_request(query, {"id": operation_id})
+        operation = result.get("data", {}).get("node")
+        if not operation:
+            raise Exception(f"Bulk operation not found: {operation_id}")
+        return operation
     
     async def create_customer_access_token(self, email: str, password: str) -> tuple[str, str]:
         """
@@ -200,7 +592,11 @@ class ShopifyService:
             }
         }
         
-        result = await self.storefront_api_request(mutation, variables)
+        if settings.shopify_token_hedging_enabled:
+            # Minting a token has no side effects we care about, so a slow call can be raced by a second one
+            result = await self.token_hedge.run(lambda: self.storefront_api_request(mutation, variables))
+        else:
+            result = await self.storefront_api_request(mutation, variables)
         
         errors = result.get("data", {}).get("customerAccessTokenCreate", {}).get("customerUserErrors", [])
         if errors:
@@ -209,45 +605,214 @@ class ShopifyService:
         token_data = result["data"]["customerAccessTokenCreate"]["customerAccessToken"]
         return token_data["accessToken"], token_data["expiresAt"]
     
-    async def find_or_create_customer(self, phone: str, db: Session) -> tuple[Customer, str, str]:
+    async def create_customer_access_token_with_multipass(self, email: str) -> tuple[str, str]:
         """
-        Find or create customer using the "bridge method"
-        Returns: (customer_record, access_token, expires_at)
+        Create customer access token using a Multipass token for the email
+        Leaves the customer's own password untouched
+        Returns: (access_token, expires_at)
+        """
+        mutation = """
+        mutation($multipassToken: String!) {
+            customerAccessTokenCreateWithMultipass(multipassToken: $multipassToken) {
+                customerAccessToken {
+                    accessToken
+                    expiresAt
+                }
+                customerUserErrors {
+                    code
+                    field
+                    message
+                }
+            }
+        }
         """
-        # Check if we already have this customer in our database
-        customer_record = db.query(Customer).filter(Customer.phone == phone).first()
         
-        if customer_record:
-            # Customer exists, get new access token using stored credentials
-            print(f"✅ Customer found in database: {phone}")
-            access_token, expires_at = await self.create_customer_access_token(
-                customer_record.shopify_email,
-                customer_record.shopify_password
-            )
-            return customer_record, access_token, expires_at
+        # Multipass tokens are single use, so every attempt (including a hedge) signs a fresh one
+        def mint():
+            token = self.multipass.generate_token({"email": email})
+            return self.storefront_api_request(mutation, {"multipassToken": token})
         
-        # Customer not in our database, check Shopify
-        shopify_customer = await self.find_customer_by_phone(phone)
+        if settings.shopify_token_hedging_enabled:
+            result = await self.token_hedge.run(mint)
+        else:
+            result = await mint()
         
-        if shopify_customer:
-            # Customer exists in Shopify but not in our DB
-            # This is a problem - we don't have their password
-            # We need to create a new customer with hidden credentials
-            print(f"⚠️ Customer exists in Shopify but not in our DB: {phone}")
-            # For now, we'll create a new entry (you might want to handle this differently)
+        payload = result.get("data", {}).get("customerAccessTokenCreateWithMultipass", {})
+        errors = payload.get("customerUserErrors", [])
+        if errors:
+            raise Exception(f"Failed to create access token with Multipass: {errors}")
         
-        # Create new customer with hidden credentials
+        token_data = payload["customerAccessToken"]
+        return token_data["accessToken"], token_data["expiresAt"]
+    
+    async def get_customer_access_token(self, customer_record: Customer) -> tuple[str, str]:
+        """
+        Get a customer access token, reusing a cached one until it nears expiry
+        Returns: (access_token, expires_at)
+        """
+        cached = self.token_cache.get(customer_record.shopify_customer_id)
+        if cached:
+            return cached
+        
+        with span("token_mint"):
+            if customer_record.shopify_password is None and self.uses_multipass(customer_record.shopify_email):
+                access_token, expires_at = await self.create_customer_access_token_with_multipass(
+                    customer_record.shopify_email
+                )
+            else:
+                access_token, expires_at = await self.create_customer_access_token(
+                    customer_record.shopify_email,
+                    customer_record.shopify_password
+                )
+        self.token_cache.put(customer_record.shopify_customer_id, access_token, expires_at)
+        return access_token, expires_at
+    
+    async def ensure_customer_credentials(self, customer_record: Customer, db: AsyncSession):
+        """
+        Give a backfilled customer hidden credentials on their first login
+        
+        Customers imported from Shopify have no password we know. With
+        SHOPIFY_MULTIPASS_SECRET, customers with a real email log in through
+        Multipass and keep their password. Otherwise a new random password is
+        set through the REST Admin API: running the backfill is what opts
+        these customers into OTP login, and they can still reset their
+        password by email. Customers without an email get the usual hidden email.
+        """
+        if customer_record.shopify_password or self.uses_multipass(customer_record.shopify_email):
+            return
+        
+        if self.has_own_credentials(customer_record.shopify_email):
+            print(f"⚠️ Replacing the password of imported customer: {customer_record.phone}")
+        print(f"🔑 Setting credentials for imported customer: {customer_record.phone}")
+        email = customer_record.shopify_email or self.generate_hidden_email(customer_record.phone)
+        password = self.generate_random_password()
+        
+        with span("shopify_set_credentials"):
+            await self.update_customer_credentials(customer_record.shopify_customer_id, email, password)
+        
+        customer_record.shopify_email = email
+        customer_record.shopify_password = password
+        with span("db_commit"):
+            await db.commit()
+        
+        if self.customer_cache is not None:
+            self.customer_cache.invalidate(normalize_phone(customer_record.phone))
+    
+    async def create_new_customer(self, phone: str) -> tuple[Dict[str, Any], str, str]:
+        """
+        Create a Shopify customer with hidden credentials
+        Returns: (shopify_customer, email, password)
+        """
         print(f"🆕 Creating new customer: {phone}")
         
         hidden_email = self.generate_hidden_email(phone)
         hidden_password = self.generate_random_password()
         
-        # Create in Shopify
         shopify_customer = await self.create_customer_in_shopify(
             phone=phone,
             email=hidden_email,
             password=hidden_password
         )
+        return shopify_customer, hidden_email, hidden_password
+    
+    async def adopt_shopify_customer(self, shopify_customer: Dict[str, Any], phone: str) -> tuple[Dict[str, Any], str, Optional[str]]:
+        """
+        Take over an existing Shopify customer by giving it hidden credentials
+        Returns: (shopify_customer, email, password); password is None when
+        the customer logs in through Multipass
+        
+        Raises ShopifyCustomerNotAdoptable for accounts with their own
+        email/password login unless Multipass is configured or
+        SHOPIFY_ADOPT_EXISTING_CUSTOMERS is set.
+        """
+        self.check_adoptable(shopify_customer.get("email"), phone)
+        if self.uses_multipass(shopify_customer.get("email")):
+            return shopify_customer, shopify_customer["email"], None
+        email = shopify_customer.get("email") or self.generate_hidden_email(phone)
+        password = self.generate_random_password()
+        await self.update_customer_credentials(shopify_customer["id"], email, password)
+        return shopify_customer, email, password
+    
+    async def create_or_reconcile_customer(self, phone: str) -> tuple[Dict[str, Any], str, str]:
+        """
+        Create the customer without searching Shopify first; if its hidden email
+        is already taken, find that customer and adopt it instead
+        Returns: (shopify_customer, email, password)
+        """
+        try:
+            return await self.create_new_customer(phone)
+        except ShopifyCustomerConflict as conflict:
+            print(f"⚠️ Customer email already taken in Shopify, reconciling: {phone}")
+            # Customer search is eventually consistent; a just-created customer may take a moment to appear
+            for attempt in range(RECONCILE_SEARCH_ATTEMPTS):
+                existing_customer = await self.find_customer_by_email(self.generate_hidden_email(phone))
+                if existing_customer:
+                    return await self.adopt_shopify_customer(existing_customer, phone)
+                await asyncio.sleep(RECONCILE_SEARCH_DELAY_SECONDS * (attempt + 1))
+            
+            raise Exception("Shopify reported a conflicting customer email but search found none") from conflict
+    
+    async def find_or_create_customer(self, phone: str) -> tuple[CustomerData, str, str]:
+        """
+        Find or create customer using the "bridge method"
+        Returns: (customer, access_token, expires_at)
+        
+        Concurrent calls for the same phone (double-tapped verify, two
+        devices) share a single run and its result. The run uses its own
+        session and returns plain data, since it keeps going if the request
+        that started it is cancelled and its result goes to other requests.
+        """
+        with span("find_or_create_customer"):
+            return await self.provisioning.do(
+                normalize_phone(phone),
+                lambda: self._provision_customer(phone)
+            )
+    
+    async def _provision_customer(self, phone: str) -> tuple[CustomerData, str, str]:
+        async with self.session_factory() as db:
+            customer_record, access_token, expires_at = await self._find_or_create_customer(phone, db)
+            customer = CustomerData(
+                id=str(customer_record.id),
+                phone=customer_record.phone,
+                email=customer_record.shopify_email,
+                first_name=customer_record.first_name,
+                last_name=customer_record.last_name,
+                shopify_customer_id=customer_record.shopify_customer_id
+            )
+        return customer, access_token, expires_at
+    
+    async def _customer_stored(self, phone: str):
+        """Drop the cached profile for this phone and mark it as a customer in every worker's filter"""
+        normalized_phone = normalize_phone(phone)
+        if self.customer_cache is not None:
+            self.customer_cache.invalidate(normalized_phone)
+        if self.customer_filter is not None:
+            await self.customer_filter.add(normalized_phone)
+    
+    async def _find_or_create_customer(self, phone: str, db: AsyncSession) -> tuple[Customer, str, str]:
+        # Check if we already have this customer in our database
+        result = await db.execute(select(Customer).where(Customer.phone == phone))
+        customer_record = result.scalars().first()
+        
+        if customer_record:
+            # Customer exists, get new access token using stored credentials
+            print(f"✅ Customer found in database: {phone}")
+            await self.ensure_customer_credentials(customer_record, db)
+            access_token, expires_at = await self.get_customer_access_token(customer_record)
+            return customer_record, access_token, expires_at
+        
+        with span("shopify_provision"):
+            if settings.shopify_optimistic_create:
+                # Optimistic: create straight away, reconcile only if Shopify reports a conflict
+                shopify_customer, hidden_email, hidden_password = await self.create_or_reconcile_customer(phone)
+            else:
+                # Customer not in our database, check Shopify
+                existing_customer = await self.find_customer_by_phone(phone)
+                if existing_customer:
+                    print(f"⚠️ Customer exists in Shopify but not in our DB: {phone}")
+                    shopify_customer, hidden_email, hidden_password = await self.adopt_shopify_customer(existing_customer, phone)
+                else:
+                    shopify_customer, hidden_email, hidden_password = await self.create_or_reconcile_customer(phone)
         
         # Store in our database
         customer_record = Customer(
@@ -259,14 +824,33 @@ class ShopifyService:
             last_name=shopify_customer.get("lastName")
         )
         db.add(customer_record)
-        db.commit()
-        db.refresh(customer_record)
+        try:
+            with span("db_commit"):
+                await db.commit()
+        except IntegrityError:
+            # Another worker stored this phone first; use its row
+            await db.rollback()
+            result = await db.execute(select(Customer).where(Customer.phone == phone))
+            existing_record = result.scalars().first()
+            if existing_record is None:
+                raise
+            print(f"⚠️ Customer was created concurrently, using existing record: {phone}")
+            if (existing_record.shopify_customer_id == shopify_customer["id"]
+                    and existing_record.shopify_password != hidden_password):
+                # We adopted the same Shopify customer after the other worker did, so our password is the live one
+                existing_record.shopify_email = hidden_email
+                existing_record.shopify_password = hidden_password
+                await db.commit()
+                self.token_cache.invalidate(existing_record.shopify_customer_id)
+            await self._customer_stored(phone)
+            await self.ensure_customer_credentials(existing_record, db)
+            access_token, expires_at = await self.get_customer_access_token(existing_record)
+            return existing_record, access_token, expires_at
+        await db.refresh(customer_record)
+        await self._customer_stored(phone)
         
         # Get access token
-        access_token, expires_at = await self.create_customer_access_token(
-            hidden_email,
-            hidden_password
-        )
+        access_token, expires_at = await self.get_customer_access_token(customer_record)
         
         return customer_record, access_token, expires_at
 
@@ -0,0 +1,179 @@
+"""
+Client-side throttling for Shopify API calls
+
+Shopify rate-limits the Admin API with leaky buckets: GraphQL calls are
+charged by query cost (reported in `extensions.cost.throttleStatus`) and REST
+calls by count (`X-Shopify-Shop-Api-Call-Limit: used/max`). Running the bucket
+dry gets THROTTLED errors / HTTP 429s, which used to surface as 500s.
+
+CostBucket mirrors a bucket from the values Shopify returns and reserves the
+expected cost before each call, delaying the call instead of letting it be
+throttled. Throttled responses that still happen are retried with jittered
+backoff until a deadline, after which ShopifyThrottledError is raised.
+"""
+import asyncio
+import random
+import time
+from typing import Optional, Dict, Any
+
+from ..config import get_settings
+from ..utils.tracing import span
+
+settings = get_settings()
+
+# Remember per-query costs for at most this many distinct queries
+MAX_TRACKED_QUERIES = 64
+
+
+class ShopifyThrottledError(Exception):
+    """Raised when Shopify keeps throttling a call past the retry deadline"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter"""
+    ceiling = min(settings.shopify_retry_backoff_max_seconds, settings.shopify_retry_backoff_seconds * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header (Shopify sends a float)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+class CostBucket:
+    """
+    Local mirror of one Shopify leaky bucket
+
+    Usage:
+        bucket = CostBucket("admin_graphql", maximum_available=1000, restore_rate=50)
+        await bucket.acquire(query, deadline)       # waits if the bucket would run dry
+        bucket.record(query, data["extensions"]["cost"])
+    """
+
+    def __init__(self, name: str, maximum_available: float, restore_rate: float, default_cost: float = 1.0):
+        """
+        Args:
+            name: Label used in stats
+            maximum_available: Bucket size until Shopify reports the real one
+            restore_rate: Units restored per second until Shopify reports the real rate
+            default_cost: Expected cost of a call whose cost hasn't been seen yet
+        """
+        self.name = name
+        self.maximum_available = float(maximum_available)
+        self.restore_rate = float(restore_rate)
+        self.default_cost = float(default_cost)
+
+        self._available = self.maximum_available
+        self._updated_at = time.monotonic()
+        self._expected_costs: Dict[str, float] = {}
+
+        # Metrics
+        self.calls = 0
+        self.cost_requested = 0.0
+        self.cost_consumed = 0.0
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    def available(self) -> float:
+        """Estimated units available now"""
+        now = time.monotonic()
+        self._available = min(
+            self.maximum_available,
+            self._available + (now - self._updated_at) * self.restore_rate
+        )
+        self._updated_at = now
+        return self._available
+
+    def expected_cost(self, key: Optional[str] = None) -> float:
+        """Last requested cost seen for this call"""
+        return self._expected_costs.get(key, self.default_cost) if key else self.default_cost
+
+    def delay_for(self, cost: float) -> float:
+        """Seconds until `cost` units will be available"""
+        shortfall = cost - self.available()
+        return shortfall / self.restore_rate if shortfall > 0 else 0.0
+
+    async def acquire(self, key: Optional[str], deadline: float):
+        """
+        Reserve the expected cost of a call, sleeping until the bucket can cover it
+        Raises ShopifyThrottledError if that would take past the deadline
+        """
+        cost = self.expected_cost(key)
+        # Reserve before sleeping so concurrent callers queue up behind this one
+        self.available()
+        self._available -= cost
+        self.calls += 1
+
+        if self._available >= 0:
+            return
+
+        delay = -self._available / self.restore_rate
+        if time.monotonic() + delay > deadline:
+            self._available += cost
+            raise ShopifyThrottledError(
+                f"Shopify {self.name} rate limit: call would wait {delay:.1f}s",
+                retry_after=delay
+            )
+
+        self.waits += 1
+        self.wait_seconds += delay
+        with span("shopify_throttle_wait"):
+            await asyncio.sleep(delay)
+
+    def record(self, key: Optional[str], cost: Optional[Dict[str, Any]]):
+        """Update from a GraphQL `extensions.cost` block"""
+        if not cost:
+            return
+        requested = cost.get("requestedQueryCost")
+        if requested is not None:
+            self.cost_requested += requested
+            if key and (key in self._expected_costs or len(self._expected_costs) < MAX_TRACKED_QUERIES):
+                self._expected_costs[key] = float(requested)
+        actual = cost.get("actualQueryCost")
+        if actual is not None:
+            self.cost_consumed += actual
+
+        status = cost.get("throttleStatus") or {}
+        self._sync(status.get("currentlyAvailable"), status.get("maximumAvailable"), status.get("restoreRate"))
+
+    def record_call_limit(self, header: Optional[str]):
+        """Update from a REST `X-Shopify-Shop-Api-Call-Limit: used/max` header"""
+        if not header or "/" not in header:
+            return
+        try:
+            used, maximum = (float(part) for part in header.split("/", 1))
+        except ValueError:
+            return
+        self.cost_consumed += 1
+        self._sync(maximum - used, maximum, None)
+
+    def _sync(self, available: Optional[float], maximum: Optional[float], restore_rate: Optional[float]):
+        if maximum:
+            self.maximum_available = float(maximum)
+        if restore_rate:
+            self.restore_rate = float(restore_rate)
+        if available is not None:
+            self._available = float(available)
+            self._updated_at = time.monotonic()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Bucket state and throttling counters"""
+        return {
+            "maximum_available": self.maximum_available,
+            "currently_available": round(self.available(), 1),
+            "restore_rate": self.restore_rate,
+            "calls": self.calls,
+            "cost_requested": self.cost_requested,
+            "cost_consumed": self.cost_consumed,
+            "throttle_waits": self.waits,
+            "throttle_wait_seconds": round(self.wait_seconds, 3),
+        }
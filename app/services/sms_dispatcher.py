@@ -0,0 +1,242 @@
+"""
+Background SMS dispatch queue
+
+send-otp only commits the OTP row and enqueues the message; a small pool of
+asyncio workers delivers it through Twilio. The Twilio SDK is blocking, so
+each delivery runs in a worker thread and never stalls the event loop.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Optional, Dict, Any
+from twilio.rest import Client
+from twilio.http.http_client import TwilioHttpClient
+from twilio.base.exceptions import TwilioRestException
+
+from ..config import get_settings
+from ..utils.metrics import record_upstream, response_outcome
+
+settings = get_settings()
+
+
+class SMSQueueFullError(Exception):
+    """Raised when the dispatch queue is at capacity (backpressure)"""
+
+
+class SMSReservation:
+    """
+    A queue slot held by SMSDispatcher.reserve()
+
+    send() uses the slot and cannot fail on a full queue; leaving the
+    `with` block without sending gives the slot back.
+    """
+
+    def __init__(self, dispatcher: "SMSDispatcher"):
+        self.dispatcher = dispatcher
+        self._held = True
+
+    def send(self, phone: str, body: str):
+        """Queue the SMS in the held slot"""
+        if not self._held:
+            raise RuntimeError("SMS queue slot already used or released")
+        self.release()
+        self.dispatcher._put(phone, body)
+
+    def release(self):
+        """Give the slot back without sending"""
+        if self._held:
+            self._held = False
+            self.dispatcher._reserved -= 1
+
+    def __enter__(self) -> "SMSReservation":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class SMSDispatcher:
+    """
+    Bounded in-process SMS queue with a fixed worker pool
+
+    Usage:
+        dispatcher = SMSDispatcher()
+        await dispatcher.start()
+        dispatcher.enqueue("+911234567890", "Your code is 123456")
+
+        # Hold a slot while doing work a full queue must not leave half done
+        with dispatcher.reserve() as slot:
+            ...
+            slot.send("+911234567890", "Your code is 123456")
+        await dispatcher.stop()
+    """
+
+    def __init__(
+        self,
+        workers: int = None,
+        max_queue_size: int = None,
+        max_retries: int = None,
+        backoff_seconds: float = None,
+        backoff_max_seconds: float = None
+    ):
+        self.worker_count = workers or settings.sms_dispatch_workers
+        self.max_queue_size = max_queue_size or settings.sms_queue_max_size
+        self.max_retries = settings.sms_max_retries if max_retries is None else max_retries
+        self.backoff_seconds = backoff_seconds or settings.sms_retry_backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds or settings.sms_retry_backoff_max_seconds
+        self.from_number = settings.twilio_phone_number
+
+        self.twilio_client: Optional[Client] = None
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._reserved = 0  # Slots held by reserve(); queued + reserved never exceeds max_queue_size
+        self._workers: list[asyncio.Task] = []
+
+        # Metrics
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.rejected = 0
+        self._latencies: deque = deque(maxlen=1000)  # enqueue -> delivered, seconds
+
+    async def start(self):
+        """Create the Twilio client and spawn the workers"""
+        if self._workers:
+            return
+        if self.twilio_client is None:
+            self.twilio_client = Client(
+                settings.twilio_account_sid,
+                settings.twilio_auth_token,
+                http_client=TwilioHttpClient(timeout=settings.twilio_timeout_seconds)
+            )
+            if settings.twilio_api_base_url:
+                self.twilio_client.api.base_url = settings.twilio_api_base_url.rstrip("/")
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"sms-dispatch-{i}")
+            for i in range(self.worker_count)
+        ]
+
+    async def stop(self, drain_timeout: float = 5.0):
+        """Give queued messages a chance to go out, then stop the workers"""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ SMS queue not drained on shutdown ({self._queue.qsize()} messages dropped)")
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def _check_capacity(self):
+        """Raise SMSQueueFullError if there is no free slot (queued or reserved)"""
+        if self._queue.qsize() + self._reserved >= self.max_queue_size:
+            self.rejected += 1
+            raise SMSQueueFullError("SMS queue is full, please try again shortly")
+
+    def reserve(self) -> SMSReservation:
+        """
+        Hold a queue slot for an SMS that will be sent shortly
+        Raises SMSQueueFullError when the queue is at capacity
+        """
+        self._check_capacity()
+        self._reserved += 1
+        return SMSReservation(self)
+
+    def enqueue(self, phone: str, body: str):
+        """
+        Queue an SMS for delivery
+        Raises SMSQueueFullError when the queue is at capacity
+        """
+        self._check_capacity()
+        self._put(phone, body)
+
+    def _put(self, phone: str, body: str):
+        # Never full here: callers checked capacity or hold a reserved slot
+        self._queue.put_nowait((phone, body, time.monotonic()))
+        self.enqueued += 1
+
+    def _send(self, phone: str, body: str) -> str:
+        """Blocking Twilio call (runs in a worker thread)"""
+        message = self.twilio_client.messages.create(
+            body=body,
+            from_=self.from_number,
+            to=phone
+        )
+        return message.sid
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        """Client errors (bad number, unverified recipient) won't succeed on retry"""
+        if isinstance(error, TwilioRestException):
+            return error.status == 429 or error.status >= 500
+        return True
+
+    @staticmethod
+    def _outcome(error: Exception) -> str:
+        """Metrics outcome label for a failed Twilio call"""
+        if isinstance(error, TwilioRestException):
+            return response_outcome(error.status)
+        return "transport_error"
+
+    def _backoff(self, attempt: int) -> float:
+        """Exponential backoff with full jitter"""
+        ceiling = min(self.backoff_max_seconds, self.backoff_seconds * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    async def _deliver(self, phone: str, body: str, enqueued_at: float):
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                sid = await asyncio.to_thread(self._send, phone, body)
+                record_upstream("twilio", time.perf_counter() - started, "ok")
+                self.sent += 1
+                self._latencies.append(time.monotonic() - enqueued_at)
+                print(f"✅ SMS sent to {phone} (Message SID: {sid})")
+                return
+            except Exception as e:
+                record_upstream("twilio", time.perf_counter() - started, self._outcome(e))
+                if attempt >= self.max_retries or not self._is_retryable(e):
+                    self.failed += 1
+                    print(f"❌ SMS to {phone} failed after {attempt + 1} attempt(s): {e}")
+                    print(f"⚠️ DEV MODE: message not delivered: {body!r}")
+                    return
+                self.retried += 1
+                await asyncio.sleep(self._backoff(attempt))
+                attempt += 1
+
+    async def _worker(self):
+        while True:
+            phone, body, enqueued_at = await self._queue.get()
+            try:
+                await self._deliver(phone, body, enqueued_at)
+            finally:
+                self._queue.task_done()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth, delivery counters and latency percentiles"""
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 4)
+
+        return {
+            "workers": len(self._workers),
+            "queue_depth": self._queue.qsize(),
+            "reserved_slots": self._reserved,
+            "max_queue_size": self.max_queue_size,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "rejected": self.rejected,
+            "delivery_latency_p50_seconds": percentile(0.50),
+            "delivery_latency_p95_seconds": percentile(0.95),
+            "delivery_latency_max_seconds": round(latencies[-1], 4) if latencies else None,
+        }
+
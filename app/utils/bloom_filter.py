@@ -0,0 +1,89 @@
+"""
+Bloom filter for fast set-membership checks
+"""
+import hashlib
+import math
+from typing import Dict, Any
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings
+
+    might_contain() never returns False for an added item; it returns True
+    for an absent item with roughly `error_rate` probability while fewer
+    than `capacity` items have been added.
+
+    Usage:
+        bloom = BloomFilter(capacity=1_000_000, error_rate=0.01)
+        bloom.add("+919876543210")
+        if not bloom.might_contain(phone):
+            ...  # definitely absent
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        """
+        Args:
+            capacity: Number of items the filter is sized for
+            error_rate: Target false-positive rate at capacity
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+        # Optimal sizing: m = -n ln p / (ln 2)^2 bits, k = (m / n) ln 2 hashes
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Double hashing (Kirsch-Mitzenmacher): k positions from one 128-bit digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item: str):
+        """Add an item"""
+        bits = self._bits
+        for position in self._positions(item):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def might_contain(self, item: str) -> bool:
+        """False means definitely absent; True means possibly present"""
+        bits = self._bits
+        for position in self._positions(item):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    __contains__ = might_contain
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def memory_bytes(self) -> int:
+        """Size of the bit array"""
+        return len(self._bits)
+
+    def estimated_error_rate(self) -> float:
+        """False-positive rate expected at the current number of items"""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Sizing and current load"""
+        return {
+            "items": self.count,
+            "capacity": self.capacity,
+            "memory_bytes": self.memory_bytes,
+            "num_hashes": self.num_hashes,
+            "target_error_rate": self.error_rate,
+            "estimated_error_rate": round(self.estimated_error_rate(), 6),
+        }
@@ -0,0 +1,170 @@
+"""
+Circuit breaker for upstream calls
+"""
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable (circuit open), retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Closed -> open when the failure rate over a rolling window is too high;
+    open -> half-open after a cool-down, letting a few probe calls through;
+    half-open -> closed if they succeed, back to open if one fails.
+
+    Usage:
+        breaker = CircuitBreaker("storefront")
+        breaker.before_call()          # raises CircuitOpenError while open
+        try:
+            response = await send()
+        except TimeoutError:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        minimum_calls: int = 20,
+        window_seconds: float = 30,
+        open_seconds: float = 15,
+        half_open_max_calls: int = 3
+    ):
+        """
+        Args:
+            name: Label used in errors and stats
+            failure_rate_threshold: Failure share of the window that opens the circuit
+            minimum_calls: Calls needed in the window before the rate is trusted
+            window_seconds: Rolling window for the failure rate
+            open_seconds: How long the circuit stays open before probing
+            half_open_max_calls: Concurrent probe calls allowed while half-open
+        """
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        # Per-second buckets: [second, successes, failures]
+        self._window: deque = deque()
+
+        # Metrics
+        self.rejected = 0
+        self.transitions: Dict[str, int] = {}
+        self.recent_transitions: deque = deque(maxlen=20)
+
+    def _transition(self, state: str, reason: str):
+        if state == self.state:
+            return
+        key = f"{self.state}->{state}"
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        self.recent_transitions.append({
+            "from": self.state,
+            "to": state,
+            "reason": reason,
+            "at": datetime.utcnow().isoformat(),
+        })
+        print(f"🔌 Circuit {self.name}: {self.state} -> {state} ({reason})")
+        self.state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state == CLOSED:
+            self._window.clear()
+        self._probes_in_flight = 0
+
+    def _record(self, failed: bool):
+        second = int(time.monotonic())
+        if self._window and self._window[-1][0] == second:
+            bucket = self._window[-1]
+        else:
+            bucket = [second, 0, 0]
+            self._window.append(bucket)
+        bucket[2 if failed else 1] += 1
+        while self._window and self._window[0][0] <= second - self.window_seconds:
+            self._window.popleft()
+
+    def _counts(self) -> tuple[int, int]:
+        cutoff = int(time.monotonic()) - self.window_seconds
+        successes = failures = 0
+        for second, ok, failed in self._window:
+            if second > cutoff:
+                successes += ok
+                failures += failed
+        return successes, failures
+
+    def retry_after(self) -> float:
+        """Seconds until the circuit will let a probe through"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call must not be attempted"""
+        if self.state == OPEN:
+            if self.retry_after() > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self.retry_after())
+            self._transition(HALF_OPEN, "cool-down elapsed")
+
+        if self.state == HALF_OPEN:
+            if self._probes_in_flight >= self.half_open_max_calls:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, 1.0)
+            self._probes_in_flight += 1
+
+    def record_success(self):
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            self._transition(CLOSED, "probe succeeded")
+            return
+        self._record(failed=False)
+
+    def record_failure(self):
+        if self.state == HALF_OPEN:
+            self._transition(OPEN, "probe failed")
+            return
+        self._record(failed=True)
+        if self.state == CLOSED:
+            successes, failures = self._counts()
+            calls = successes + failures
+            if calls >= self.minimum_calls and failures / calls >= self.failure_rate_threshold:
+                self._transition(OPEN, f"{failures}/{calls} calls failed")
+
+    def release(self):
+        """The call ended without a verdict (e.g. cancelled)"""
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """State, window counts and transition history"""
+        successes, failures = self._counts()
+        calls = successes + failures
+        return {
+            "state": self.state,
+            "window_calls": calls,
+            "window_failure_rate": round(failures / calls, 4) if calls else None,
+            "retry_after_seconds": round(self.retry_after(), 1),
+            "rejected": self.rejected,
+            "transitions": dict(self.transitions),
+            "recent_transitions": list(self.recent_transitions),
+        }
@@ -0,0 +1,102 @@
+"""
+Read-through cache for customer profile lookups
+
+Storefront pages poll /api/customer/profile and /api/customer/check
+constantly while the underlying rows almost never change. Entries are
+CustomerData keyed by normalized phone.
+
+Only existing customers are cached. A "not found" would go stale as soon
+as the phone signs up, and the signup may be served by another worker
+that can't invalidate this one's entry. Missing phones are answered by
+the phone filter (CustomerPhoneFilter) or the database instead.
+
+Writes go through ShopifyService.find_or_create_customer, which invalidates
+the phone in this worker. Other workers see profile changes when their
+entry expires, so the TTL bounds cross-worker staleness.
+"""
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+from ..schemas import CustomerData
+
+
+class CustomerCache:
+    """
+    Bounded TTL + LRU cache of CustomerData
+
+    Usage:
+        cache = CustomerCache(max_size=50000, ttl_seconds=300)
+        customer = cache.get(phone)
+        if customer is None:
+            customer = load_from_db(phone)   # None if missing
+            if customer is not None:
+                cache.put(phone, customer)
+    """
+
+    def __init__(self, max_size: int = 50000, ttl_seconds: float = 300):
+        """
+        Args:
+            max_size: Maximum number of phones kept (least recently used are evicted)
+            ttl_seconds: Lifetime of a cached profile
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+
+        # Store: phone -> (expires at, monotonic clock; CustomerData)
+        self._entries: "OrderedDict[str, Tuple[float, CustomerData]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, phone: str) -> Optional[CustomerData]:
+        """Cached profile of a phone, or None if it isn't cached"""
+        entry = self._entries.get(phone)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, customer = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[phone]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(phone)
+        self.hits += 1
+        return customer
+
+    def put(self, phone: str, customer: CustomerData):
+        """Cache the profile of an existing customer"""
+        self._entries[phone] = (time.monotonic() + self.ttl_seconds, customer)
+        self._entries.move_to_end(phone)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, phone: str):
+        """Drop a phone after its customer row was inserted or updated"""
+        if self._entries.pop(phone, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        """Drop everything"""
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters and occupancy"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
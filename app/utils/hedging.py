@@ -0,0 +1,105 @@
+"""
+Hedged requests for idempotent upstream calls
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict
+
+
+class HedgePolicy:
+    """
+    Start the call; if it hasn't answered after the recent p95 latency,
+    start a second identical call and take whichever succeeds first.
+    Only use it for calls that are safe to send twice.
+
+    Usage:
+        hedge = HedgePolicy(percentile=0.95)
+        result = await hedge.run(lambda: mint_token(email, password))
+    """
+
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        min_delay_seconds: float = 0.05,
+        initial_delay_seconds: float = 1.0,
+        min_samples: int = 20,
+        sample_size: int = 200
+    ):
+        """
+        Args:
+            percentile: Latency percentile after which the hedge is sent
+            min_delay_seconds: Never hedge sooner than this
+            initial_delay_seconds: Hedge delay until enough latencies are known
+            min_samples: Latencies needed before the percentile is used
+            sample_size: Recent latencies kept
+        """
+        self.percentile = percentile
+        self.min_delay_seconds = min_delay_seconds
+        self.initial_delay_seconds = initial_delay_seconds
+        self.min_samples = min_samples
+        self._latencies: deque = deque(maxlen=sample_size)
+
+        # Metrics
+        self.calls = 0
+        self.hedges_sent = 0
+        self.primary_wins = 0
+        self.hedge_wins = 0
+
+    def delay(self) -> float:
+        """Current hedge delay from recent successful latencies"""
+        if len(self._latencies) < self.min_samples:
+            return self.initial_delay_seconds
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile))
+        return max(self.min_delay_seconds, ordered[index])
+
+    async def _timed(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        started = time.monotonic()
+        result = await fn()
+        self._latencies.append(time.monotonic() - started)
+        return result
+
+    async def run(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await fn(), hedged with a second fn() if the first is slow"""
+        self.calls += 1
+        primary = asyncio.ensure_future(self._timed(fn))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.delay())
+            if done:
+                return primary.result()
+
+            self.hedges_sent += 1
+            tasks.append(asyncio.ensure_future(self._timed(fn)))
+            pending = set(tasks)
+            first_error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is primary:
+                            self.primary_wins += 1
+                        else:
+                            self.hedge_wins += 1
+                        return task.result()
+                    first_error = first_error or task.exception()
+            raise first_error
+        finally:
+            # The loser (or everything, if the caller was cancelled) is abandoned
+            leftovers = [task for task in tasks if not task.done()]
+            for task in leftovers:
+                task.cancel()
+            if leftovers:
+                await asyncio.gather(*leftovers, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hedge rate, win split and current delay"""
+        return {
+            "calls": self.calls,
+            "hedges_sent": self.hedges_sent,
+            "primary_wins": self.primary_wins,
+            "hedge_wins": self.hedge_wins,
+            "hedge_win_rate": round(self.hedge_wins / self.hedges_sent, 4) if self.hedges_sent else None,
+            "delay_ms": round(self.delay() * 1000, 1),
+        }
@@ -0,0 +1,277 @@
+"""
+In-process metrics with a Prometheus text exposition
+
+Instruments are module-level singletons, like the rate limiters. Recording
+is meant for the hot path: it only runs on the event loop thread, so there
+are no locks, and each label combination gets a child object once; after
+that an observation is a dict lookup plus a few in-place integer/float
+updates. Gauges are computed at scrape time from callbacks, so keeping them
+current costs nothing.
+"""
+from bisect import bisect_left
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .tracing import add_span
+
+# Seconds; covers a cached DB hit up to a Shopify call that hits the timeout
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[Any, ...], extra: str = "") -> str:
+    parts = [
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Counter:
+    """Monotonic counter, optionally labelled"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[Any, ...], _CounterChild] = {}
+
+    def labels(self, *values: Any) -> _CounterChild:
+        """Child for one label combination (cache it where possible)"""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = _CounterChild()
+        return child
+
+    def inc(self, *values: Any, amount: float = 1):
+        self.labels(*values).value += amount
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for values, child in list(self._children.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}")
+        return lines
+
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum", "count")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram:
+    """Fixed-bucket histogram, optionally labelled"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._children: Dict[Tuple[Any, ...], _HistogramChild] = {}
+
+    def labels(self, *values: Any) -> _HistogramChild:
+        """Child for one label combination (cache it where possible)"""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = _HistogramChild(self.buckets)
+        return child
+
+    def observe(self, value: float, *values: Any):
+        self.labels(*values).observe(value)
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class GaugeCallback:
+    """Gauge whose samples are computed at scrape time"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str],
+        callback: Callable[[], Dict[Tuple[Any, ...], float]]
+    ):
+        """
+        Args:
+            callback: Returns {label values tuple: value}; () for an unlabelled gauge
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        try:
+            samples = self.callback()
+        except Exception as e:
+            print(f"⚠️ Metrics gauge {self.name} failed: {e}")
+            return lines
+        for values, value in samples.items():
+            if value is None:
+                continue
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Collection of instruments rendered together
+
+    Usage:
+        requests = registry.register(Counter("app_requests_total", "Requests", ["route"]))
+        requests.inc("/api/auth/send-otp")
+        text = registry.render()
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def register(self, metric):
+        """Add an instrument; re-registering a name replaces it (e.g. gauges on app restart)"""
+        self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name: str):
+        self._metrics.pop(name, None)
+
+    def get(self, name: str) -> Optional[Any]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Prometheus text exposition format 0.0.4"""
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"]
+))
+upstream_request_duration = registry.register(Histogram(
+    "upstream_request_duration_seconds",
+    "Latency of calls to Shopify and Twilio",
+    ["upstream", "outcome"]
+))
+upstream_errors = registry.register(Counter(
+    "upstream_errors_total",
+    "Failed upstream calls (transport errors and non-2xx responses)",
+    ["upstream", "reason"]
+))
+db_query_duration = registry.register(Histogram(
+    "db_query_duration_seconds",
+    "Database statement latency",
+    ["operation"]
+))
+db_errors = registry.register(Counter(
+    "db_errors_total",
+    "Database statements that raised",
+    ["operation"]
+))
+
+
+def response_outcome(status_code: int) -> str:
+    """Outcome label for an upstream HTTP response"""
+    if status_code < 400:
+        return "ok"
+    if status_code == 429:
+        return "throttled"
+    return "server_error" if status_code >= 500 else "client_error"
+
+
+def record_upstream(upstream: str, seconds: float, outcome: str):
+    """Record one upstream call (and its trace span); anything but "ok" also counts as an error"""
+    upstream_request_duration.labels(upstream, outcome).observe(seconds)
+    add_span(upstream, seconds, outcome != "ok")
+    if outcome != "ok":
+        upstream_errors.labels(upstream, outcome).inc()
+
+
+_DB_SPAN_NAMES = {operation: f"db_{operation}" for operation in ("select", "insert", "update", "delete")}
+
+
+def _statement_operation(context) -> str:
+    if context.isinsert:
+        return "insert"
+    if context.isupdate:
+        return "update"
+    if context.isdelete:
+        return "delete"
+    return "select"
+
+
+def instrument_engine(sync_engine):
+    """
+    Time every statement on an engine (pass `async_engine.sync_engine`)
+
+    The async drivers run the cursor calls on the event loop thread, so
+    these hooks share the no-lock assumption above.
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started_at = perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_started_at", None)
+        if started is not None:
+            operation = _statement_operation(context)
+            elapsed = perf_counter() - started
+            db_query_duration.labels(operation).observe(elapsed)
+            add_span(_DB_SPAN_NAMES[operation], elapsed)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        context = exception_context.execution_context
+        db_errors.labels(_statement_operation(context) if context is not None else "connect").inc()
@@ -1,86 +1,423 @@
 """
-Simple in-memory rate limiter
-For production, use Redis-based rate limiting
+Rate limiting with pluggable storage backends
+
+Both backends use a sliding-window counter: each identifier keeps only the
+request counts of the current and previous fixed windows, so memory per key
+is constant no matter how many requests it makes.
+
+- LocalRateLimitBackend: in-process, lock-striped, packs state into one int
+  and evicts idle keys periodically. Limits apply per worker.
+- RedisRateLimitBackend: shared across workers and pods, one atomic round
+  trip per check (server-side Lua script) on an asyncio client, so a slow
+  Redis never blocks the event loop. Falls back to a local backend while
+  Redis is unreachable.
 """
-from datetime import datetime, timedelta
-from collections import defaultdict
-from typing import Dict, Tuple
+import math
+import threading
+import time
+from typing import Dict, Tuple, Optional, Any
+
+from ..config import get_settings
+from .metrics import registry, GaugeCallback
+
+settings = get_settings()
+
+# Packed state layout: window index | previous window count | current window count
+_COUNT_BITS = 16
+_COUNT_MASK = (1 << _COUNT_BITS) - 1
+
+
+def _pack(window: int, previous: int, current: int) -> int:
+    return (window << (2 * _COUNT_BITS)) | (min(previous, _COUNT_MASK) << _COUNT_BITS) | min(current, _COUNT_MASK)
+
+
+def _unpack(state: int) -> Tuple[int, int, int]:
+    return state >> (2 * _COUNT_BITS), (state >> _COUNT_BITS) & _COUNT_MASK, state & _COUNT_MASK
+
+
+class RateLimitBackend:
+    """Storage interface for RateLimiter"""
+
+    async def hit(self, identifier: str, max_requests: int, window_seconds: int) -> Tuple[bool, float]:
+        """
+        Count a request if it fits in the window
+        Returns: (is_allowed, weighted requests used before this one)
+        """
+        raise NotImplementedError
+
+    async def used(self, identifier: str, window_seconds: int) -> float:
+        """Weighted requests used in the sliding window (read-only)"""
+        raise NotImplementedError
+
+    async def clear(self, identifier: str):
+        """Forget an identifier"""
+        raise NotImplementedError
+
+    async def shutdown(self):
+        """Release backend resources"""
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Backend-specific statistics"""
+        return {}
+
+
+class _Shard:
+    """One lock-protected slice of the key space"""
+    __slots__ = ("lock", "counters")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[str, int] = {}
+
+
+class LocalRateLimitBackend(RateLimitBackend):
+    """
+    In-process storage, striped across locks so it is also safe to share
+    between threads (each with its own event loop). The methods never
+    suspend, so a check is atomic within one event loop as well.
+    """
+
+    def __init__(self, shards: int = 16, sweep_interval_seconds: float = 60.0):
+        """
+        Args:
+            shards: Number of lock stripes the key space is split into
+            sweep_interval_seconds: How often idle keys are dropped from every shard
+        """
+        self.sweep_interval_seconds = sweep_interval_seconds
+        self._next_sweep = time.monotonic() + sweep_interval_seconds
+        self.evicted_keys = 0
+
+        # Store: identifier -> packed (window, previous count, current count), striped by hash
+        self._shards = [_Shard() for _ in range(shards)]
+
+    def _shard(self, identifier: str) -> _Shard:
+        return self._shards[hash(identifier) % len(self._shards)]
+
+    @staticmethod
+    def _clock(window_seconds: int) -> Tuple[int, float]:
+        """Current window index and how far into it we are (0..1)"""
+        window, offset = divmod(time.monotonic(), window_seconds)
+        return int(window), offset / window_seconds
+
+    @staticmethod
+    def _roll(state: int, window: int) -> Tuple[int, int]:
+        """(previous, current) counts as seen from the given window"""
+        state_window, previous, current = _unpack(state)
+        if state_window == window:
+            return previous, current
+        if state_window == window - 1:
+            return current, 0
+        return 0, 0
+
+    def _sweep_if_due(self, window: int):
+        """
+        Drop keys with no requests in the current or previous window
+
+        Runs on any check once the interval has passed and walks every
+        shard, so keys in shards that no longer see traffic are freed too.
+        Two threads may both start a sweep; each shard is swept under its
+        own lock, so that only costs a second pass.
+        """
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.sweep_interval_seconds
+
+        for shard in self._shards:
+            with shard.lock:
+                idle = [
+                    identifier for identifier, state in shard.counters.items()
+                    if (state >> (2 * _COUNT_BITS)) < window - 1
+                ]
+                for identifier in idle:
+                    del shard.counters[identifier]
+            self.evicted_keys += len(idle)
+
+    async def hit(self, identifier: str, max_requests: int, window_seconds: int) -> Tuple[bool, float]:
+        window, elapsed = self._clock(window_seconds)
+        self._sweep_if_due(window)
+        shard = self._shard(identifier)
+
+        with shard.lock:
+            state = shard.counters.get(identifier)
+            previous, current = self._roll(state, window) if state is not None else (0, 0)
+            used = previous * (1.0 - elapsed) + current
+            if used >= max_requests:
+                return False, used
+
+            shard.counters[identifier] = _pack(window, previous, current + 1)
+        return True, used
+
+    async def used(self, identifier: str, window_seconds: int) -> float:
+        window, elapsed = self._clock(window_seconds)
+        self._sweep_if_due(window)
+        shard = self._shard(identifier)
+
+        with shard.lock:
+            state = shard.counters.get(identifier)
+        if state is None:
+            return 0.0
+
+        previous, current = self._roll(state, window)
+        return previous * (1.0 - elapsed) + current
+
+    async def clear(self, identifier: str):
+        shard = self._shard(identifier)
+        with shard.lock:
+            shard.counters.pop(identifier, None)
+
+    def key_count(self) -> int:
+        """Number of identifiers currently tracked"""
+        return sum(len(shard.counters) for shard in self._shards)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "keys": self.key_count(),
+            "evicted_keys": self.evicted_keys,
+        }
+
+
+# KEYS[1] = counter hash, ARGV = window seconds, limit, cost (0 = read only)
+# Uses the Redis server clock so every worker agrees on window boundaries.
+_SLIDING_WINDOW_SCRIPT = """
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local idx = math.floor(now / window)
+local elapsed = (now - idx * window) / window
+
+local state = redis.call('HMGET', KEYS[1], 'w', 'p', 'c')
+local w = tonumber(state[1])
+local p = tonumber(state[2]) or 0
+local c = tonumber(state[3]) or 0
+if w == nil then
+    p, c = 0, 0
+elseif w == idx - 1 then
+    p, c = c, 0
+elseif w ~= idx then
+    p, c = 0, 0
+end
+
+local used = p * (1 - elapsed) + c
+if cost == 0 then
+    return {1, tostring(used)}
+end
+if used >= limit then
+    return {0, tostring(used)}
+end
+redis.call('HSET', KEYS[1], 'w', idx, 'p', p, 'c', c + cost)
+redis.call('EXPIRE', KEYS[1], window * 2)
+return {1, tostring(used)}
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Shared storage in Redis, one EVALSHA round trip per check
+
+    Usage:
+        backend = RedisRateLimitBackend(redis.asyncio.Redis.from_url(url), prefix="ratelimit:otp")
+        limiter = RateLimiter(max_requests=5, window_seconds=3600, backend=backend)
+
+    Any asyncio client exposing register_script/delete works (e.g. fakeredis in tests).
+    """
+
+    def __init__(
+        self,
+        client,
+        prefix: str = "ratelimit",
+        fallback: Optional[RateLimitBackend] = None,
+        retry_after_seconds: float = 30.0
+    ):
+        """
+        Args:
+            client: redis.asyncio client
+            prefix: Key namespace for this limiter
+            fallback: Backend used while Redis is unavailable
+            retry_after_seconds: How long to stay on the fallback after a Redis error
+        """
+        from redis.exceptions import RedisError
+
+        self.client = client
+        self.prefix = prefix
+        self.fallback = fallback or LocalRateLimitBackend()
+        self.retry_after_seconds = retry_after_seconds
+        self._redis_error = RedisError
+        self._script = client.register_script(_SLIDING_WINDOW_SCRIPT)
+        self._down_until = 0.0
+        self.fallback_checks = 0
+
+    def _key(self, identifier: str) -> str:
+        # Hash tag keeps each identifier on a single cluster slot
+        return f"{self.prefix}:{{{identifier}}}"
+
+    def _available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def _mark_down(self, error: Exception):
+        if self._available():
+            print(f"⚠️ Redis rate limit backend unavailable, using local limiter: {error}")
+        self._down_until = time.monotonic() + self.retry_after_seconds
+
+    async def _run(self, identifier: str, window_seconds: int, max_requests: int, cost: int) -> Optional[Tuple[bool, float]]:
+        if not self._available():
+            return None
+        try:
+            allowed, used = await self._script(
+                keys=[self._key(identifier)],
+                args=[window_seconds, max_requests, cost]
+            )
+        except self._redis_error as e:
+            self._mark_down(e)
+            return None
+        return bool(int(allowed)), float(used)
+
+    async def hit(self, identifier: str, max_requests: int, window_seconds: int) -> Tuple[bool, float]:
+        result = await self._run(identifier, window_seconds, max_requests, 1)
+        if result is None:
+            self.fallback_checks += 1
+            return await self.fallback.hit(identifier, max_requests, window_seconds)
+        return result
+
+    async def used(self, identifier: str, window_seconds: int) -> float:
+        result = await self._run(identifier, window_seconds, 0, 0)
+        if result is None:
+            return await self.fallback.used(identifier, window_seconds)
+        return result[1]
+
+    async def clear(self, identifier: str):
+        await self.fallback.clear(identifier)
+        if not self._available():
+            return
+        try:
+            await self.client.delete(self._key(identifier))
+        except self._redis_error as e:
+            self._mark_down(e)
+
+    async def shutdown(self):
+        await self.client.aclose()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "redis",
+            "redis_available": self._available(),
+            "fallback_checks": self.fallback_checks,
+            "fallback_keys": self.fallback.get_stats().get("keys", 0),
+        }
+
+
+def create_rate_limit_backend(name: str) -> RateLimitBackend:
+    """Build the backend selected by settings.rate_limit_backend"""
+    if settings.rate_limit_backend == "redis":
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(
+            settings.redis_url,
+            socket_timeout=settings.redis_socket_timeout_seconds,
+            socket_connect_timeout=settings.redis_socket_timeout_seconds
+        )
+        return RedisRateLimitBackend(client, prefix=f"{settings.rate_limit_redis_prefix}:{name}")
+    return LocalRateLimitBackend()
 
 
 class RateLimiter:
     """
     Simple rate limiter to prevent OTP spam
-    
+
     Usage:
         limiter = RateLimiter(max_requests=5, window_seconds=3600)
-        if limiter.is_allowed("phone_number"):
+        allowed, message = await limiter.is_allowed("phone_number")
+        if allowed:
             # Process request
         else:
             # Rate limit exceeded
     """
-    
-    def __init__(self, max_requests: int = 5, window_seconds: int = 3600):
+
+    def __init__(
+        self,
+        max_requests: int = 5,
+        window_seconds: int = 3600,
+        backend: Optional[RateLimitBackend] = None
+    ):
         """
         Initialize rate limiter
-        
+
         Args:
             max_requests: Maximum requests allowed in time window
             window_seconds: Time window in seconds (default: 1 hour)
+            backend: Counter storage (default: in-process)
         """
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-        
-        # Store: identifier -> list of request timestamps
-        self.requests: Dict[str, list[datetime]] = defaultdict(list)
-    
-    def is_allowed(self, identifier: str) -> Tuple[bool, str]:
+        self.backend = backend or LocalRateLimitBackend()
+
+    async def is_allowed(self, identifier: str) -> Tuple[bool, str]:
         """
         Check if request is allowed
-        
+
         Args:
             identifier: Unique identifier (e.g., phone number, IP address)
-        
+
         Returns:
             (is_allowed, message)
         """
-        now = datetime.utcnow()
-        window_start = now - timedelta(seconds=self.window_seconds)
-        
-        # Clean old requests
-        self.requests[identifier] = [
-            req_time for req_time in self.requests[identifier]
-            if req_time > window_start
-        ]
-        
-        # Check limit
-        if len(self.requests[identifier]) >= self.max_requests:
+        allowed, _ = await self.backend.hit(identifier, self.max_requests, self.window_seconds)
+        if not allowed:
             return False, f"Rate limit exceeded. Max {self.max_requests} requests per {self.window_seconds // 60} minutes"
-        
-        # Add current request
-        self.requests[identifier].append(now)
-        
         return True, "OK"
-    
-    def get_remaining(self, identifier: str) -> int:
+
+    async def get_remaining(self, identifier: str) -> int:
         """Get remaining requests allowed"""
-        now = datetime.utcnow()
-        window_start = now - timedelta(seconds=self.window_seconds)
-        
-        # Count recent requests
-        recent_requests = [
-            req_time for req_time in self.requests.get(identifier, [])
-            if req_time > window_start
-        ]
-        
-        return max(0, self.max_requests - len(recent_requests))
-    
-    def clear(self, identifier: str):
+        used = await self.backend.used(identifier, self.window_seconds)
+        return max(0, self.max_requests - math.ceil(used))
+
+    async def clear(self, identifier: str):
         """Clear rate limit for identifier"""
-        if identifier in self.requests:
-            del self.requests[identifier]
+        await self.backend.clear(identifier)
+
+    async def shutdown(self):
+        """Close the backend's connections"""
+        await self.backend.shutdown()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Limits and backend statistics"""
+        return {
+            "max_requests": self.max_requests,
+            "window_seconds": self.window_seconds,
+            **self.backend.get_stats(),
+        }
 
 
 # Global rate limiters
-otp_rate_limiter = RateLimiter(max_requests=5, window_seconds=3600)  # 5 OTPs per hour
-verify_rate_limiter = RateLimiter(max_requests=10, window_seconds=600)  # 10 verify attempts per 10 min
+otp_rate_limiter = RateLimiter(
+    max_requests=5, window_seconds=3600, backend=create_rate_limit_backend("otp")
+)  # 5 OTPs per hour
+verify_rate_limiter = RateLimiter(
+    max_requests=10, window_seconds=600, backend=create_rate_limit_backend("verify")
+)  # 10 verify attempts per 10 min
+batch_lookup_rate_limiter = RateLimiter(
+    max_requests=settings.customer_batch_rate_limit,
+    window_seconds=settings.customer_batch_rate_limit_window_seconds,
+    backend=create_rate_limit_backend("batch_lookup")
+)  # Batch customer lookups per client address
+
+
+def _tracked_keys() -> Dict[Tuple[str], int]:
+    samples = {}
+    limiters = (("otp", otp_rate_limiter), ("verify", verify_rate_limiter), ("batch_lookup", batch_lookup_rate_limiter))
+    for name, limiter in limiters:
+        stats = limiter.backend.get_stats()
+        # With Redis only the local fallback's keys are visible in-process
+        samples[(name,)] = stats.get("keys", stats.get("fallback_keys", 0))
+    return samples
+
 
+registry.register(GaugeCallback(
+    "rate_limiter_keys",
+    "Identifiers tracked in process by each rate limiter",
+    ["limiter"],
+    _tracked_keys
+))
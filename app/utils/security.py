@@ -2,8 +2,16 @@
 Security utilities for password encryption and phone validation
 """
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from datetime import datetime, timezone
+import base64
+import hashlib
+import hmac
+import json
+import os
 import re
-from typing import Optional
+from typing import Optional, Dict, Any
 
 
 class PasswordEncryption:
@@ -34,6 +42,38 @@ class PasswordEncryption:
         return self.fernet.decrypt(encrypted_text.encode()).decode()
 
 
+class Multipass:
+    """
+    Shopify Multipass tokens (Shopify Plus): sign a customer in by email
+    without knowing or changing their password
+    
+    Usage:
+        multipass = Multipass(settings.shopify_multipass_secret)
+        token = multipass.generate_token({"email": "asha@example.com"})
+    """
+    
+    def __init__(self, secret: str):
+        """Initialize with the store's Multipass secret"""
+        key_material = hashlib.sha256(secret.encode()).digest()
+        self.encryption_key = key_material[:16]
+        self.signature_key = key_material[16:]
+    
+    def generate_token(self, customer_data: Dict[str, Any]) -> str:
+        """Encrypted, signed token for customerAccessTokenCreateWithMultipass"""
+        data = {"created_at": datetime.now(timezone.utc).isoformat(), **customer_data}
+        ciphertext = self._encrypt(json.dumps(data))
+        signature = hmac.new(self.signature_key, ciphertext, hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(ciphertext + signature).decode()
+    
+    def _encrypt(self, plain_text: str) -> bytes:
+        """AES-128-CBC with a random IV prepended to the ciphertext"""
+        iv = os.urandom(16)
+        padder = padding.PKCS7(128).padder()
+        padded = padder.update(plain_text.encode()) + padder.finalize()
+        encryptor = Cipher(algorithms.AES(self.encryption_key), modes.CBC(iv)).encryptor()
+        return iv + encryptor.update(padded) + encryptor.finalize()
+
+
 def validate_phone_number(phone: str) -> tuple[bool, Optional[str]]:
     """
     Validate phone number format
@@ -53,6 +93,21 @@ def validate_phone_number(phone: str) -> tuple[bool, Optional[str]]:
     return False, None
 
 
+def normalize_phone(phone: str) -> str:
+    """
+    Canonical form of a phone for lookups and cache keys
+    Example: "+91 98765-43210", "9876543210" -> +919876543210
+    """
+    cleaned = phone.strip().replace(" ", "").replace("-", "").replace("(", "").replace(")", "")
+
+    # An unencoded "+" in a query string arrives as a space
+    if re.match(r'^\d{11,15}$', cleaned):
+        cleaned = f"+{cleaned}"
+
+    is_valid, formatted_phone = validate_phone_number(cleaned)
+    return formatted_phone if is_valid else cleaned
+
+
 def sanitize_phone_for_email(phone: str) -> str:
     """
     Convert phone number to email-safe string
@@ -0,0 +1,62 @@
+"""
+Single-flight coalescing of concurrent calls
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Run one call per key at a time; concurrent callers with the same key
+    share its result (or exception)
+
+    The call runs in its own task, so a caller that gets cancelled does not
+    cancel the work the other callers are waiting on. At most
+    `max_in_flight` keys are tracked; past that, calls simply run uncoalesced.
+
+    Usage:
+        flights = SingleFlight(max_in_flight=10000)
+        result = await flights.do(phone, lambda: provision(phone))
+    """
+
+    def __init__(self, max_in_flight: int = 10000):
+        self.max_in_flight = max_in_flight
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+
+        self.calls = 0
+        self.coalesced = 0
+        self.overflow = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await fn(), or the in-flight call for the same key"""
+        self.calls += 1
+        task = self._in_flight.get(key)
+
+        if task is not None:
+            self.coalesced += 1
+        elif len(self._in_flight) >= self.max_in_flight:
+            self.overflow += 1
+            return await fn()
+        else:
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Mark the exception as retrieved even if every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """In-flight keys and how many calls were coalesced"""
+        return {
+            "in_flight": len(self._in_flight),
+            "max_in_flight": self.max_in_flight,
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "overflow": self.overflow,
+        }
@@ -0,0 +1,97 @@
+"""
+In-memory cache for Shopify customer access tokens
+
+customerAccessTokenCreate issues tokens that stay valid for weeks, so a
+returning customer can reuse the last one instead of paying a Storefront
+round trip on every login. Tokens live only in process memory.
+"""
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Dict, Any, Tuple
+
+
+class CustomerTokenCache:
+    """
+    Bounded LRU cache of customer access tokens
+
+    Usage:
+        cache = CustomerTokenCache(max_size=10000, safety_margin_seconds=86400)
+        cached = cache.get(customer_id)
+        if cached is None:
+            access_token, expires_at = await mint_token()
+            cache.put(customer_id, access_token, expires_at)
+    """
+
+    def __init__(self, max_size: int = 10000, safety_margin_seconds: int = 86400):
+        """
+        Args:
+            max_size: Maximum number of customers kept (least recently used are evicted)
+            safety_margin_seconds: Stop serving a token this long before it expires
+        """
+        self.max_size = max_size
+        self.safety_margin_seconds = safety_margin_seconds
+
+        # Store: customer_id -> (access_token, expires_at, expires_at as epoch seconds)
+        self._entries: "OrderedDict[str, Tuple[str, str, float]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _parse_expiry(expires_at: str) -> Optional[float]:
+        """Parse Shopify's ISO 8601 expiresAt into epoch seconds"""
+        try:
+            return datetime.fromisoformat(expires_at.replace("Z", "+00:00")).timestamp()
+        except (AttributeError, ValueError):
+            return None
+
+    def get(self, customer_id: str) -> Optional[Tuple[str, str]]:
+        """Return (access_token, expires_at) if still comfortably valid"""
+        entry = self._entries.get(customer_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        access_token, expires_at, expires_ts = entry
+        if time.time() >= expires_ts - self.safety_margin_seconds:
+            del self._entries[customer_id]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(customer_id)
+        self.hits += 1
+        return access_token, expires_at
+
+    def put(self, customer_id: str, access_token: str, expires_at: str):
+        """Cache a freshly minted token"""
+        expires_ts = self._parse_expiry(expires_at)
+        if expires_ts is None:
+            return
+
+        self._entries[customer_id] = (access_token, expires_at, expires_ts)
+        self._entries.move_to_end(customer_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, customer_id: str):
+        """Drop the cached token for a customer"""
+        self._entries.pop(customer_id, None)
+
+    def clear(self):
+        """Drop all cached tokens"""
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and occupancy"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
@@ -0,0 +1,107 @@
+"""
+Per-request phase timing
+
+TracingMiddleware starts a RequestTrace for requests that need one (Server-
+Timing enabled, or sampled for the trace log) and keeps it in a contextvar,
+so spans anywhere below the handler - including tasks and SQLAlchemy's
+greenlets, which copy the context - attach to it without passing it around.
+Requests that aren't traced pay one contextvar lookup per span.
+"""
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Tuple
+
+_current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar("request_trace", default=None)
+
+
+class RequestTrace:
+    """Spans recorded during one request"""
+
+    __slots__ = ("started", "spans")
+
+    def __init__(self):
+        self.started = perf_counter()
+        # (name, start offset, duration, failed)
+        self.spans: List[Tuple[str, float, float, bool]] = []
+
+    def add(self, name: str, started: float, duration: float, failed: bool = False):
+        self.spans.append((name, started - self.started, duration, failed))
+
+    def totals(self) -> Dict[str, Tuple[float, int]]:
+        """Total duration and count per span name, in first-seen order"""
+        totals: Dict[str, Tuple[float, int]] = {}
+        for name, _, duration, _ in self.spans:
+            total, count = totals.get(name, (0.0, 0))
+            totals[name] = (total + duration, count + 1)
+        return totals
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, e.g. `db_select;dur=1.2, shopify_storefront;dur=180.4`"""
+        entries = [
+            f'{name};dur={total * 1000:.1f}' + (f';desc="x{count}"' if count > 1 else "")
+            for name, (total, count) in self.totals().items()
+        ]
+        entries.append(f"total;dur={(perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Spans in start order, times in milliseconds"""
+        return {
+            "duration_ms": round((perf_counter() - self.started) * 1000, 2),
+            "spans": [
+                {
+                    "name": name,
+                    "start_ms": round(offset * 1000, 2),
+                    "duration_ms": round(duration * 1000, 2),
+                    **({"error": True} if failed else {}),
+                }
+                for name, offset, duration, failed in sorted(self.spans, key=lambda span: span[1])
+            ],
+        }
+
+
+def start_trace() -> Tuple[RequestTrace, Any]:
+    """Make a new trace current; returns (trace, token for end_trace)"""
+    trace = RequestTrace()
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token: Any):
+    _current_trace.reset(token)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def add_span(name: str, duration: float, failed: bool = False):
+    """Record an already-measured phase that just ended"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, perf_counter() - duration, duration, failed)
+
+
+class span:
+    """
+    Time a block as one phase of the current request (no-op when untraced)
+
+    Usage:
+        with span("otp_verify"):
+            valid, message = await store.verify(phone, session_id, code)
+    """
+
+    __slots__ = ("name", "trace", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.trace = _current_trace.get()
+        if self.trace is not None:
+            self.started = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.trace is not None:
+            self.trace.add(self.name, self.started, perf_counter() - self.started, exc_type is not None)
+        return False
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Import existing Shopify customers into the customers table (one-time, resumable)
+
+Usage:
+    python backfill_customers.py                         # export via a Shopify bulk operation
+    python backfill_customers.py --jsonl-url URL         # import an existing JSONL export
+    python backfill_customers.py --restart               # discard the checkpoint and start over
+
+Re-running after an interruption resumes from the checkpoint file.
+To try it locally, serve a JSONL export with `python -m http.server` and
+pass its URL with --jsonl-url.
+"""
+import argparse
+import asyncio
+
+from app.database import async_engine, AsyncSessionLocal
+from app.services.customer_filter import CustomerPhoneFilter
+from app.services.shopify_service import ShopifyService
+from app.services.customer_backfill import CustomerBackfill, BackfillCheckpoint
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Import existing Shopify customers")
+    parser.add_argument("--jsonl-url", help="Read this JSONL export instead of starting a bulk operation")
+    parser.add_argument("--checkpoint", default="backfill_checkpoint.json", help="Resume state file")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per insert transaction")
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="Seconds between bulk operation polls")
+    parser.add_argument("--restart", action="store_true", help="Ignore and remove an existing checkpoint")
+    args = parser.parse_args()
+
+    checkpoint = BackfillCheckpoint(args.checkpoint)
+    if args.restart:
+        checkpoint.reset()
+
+    shopify_service = ShopifyService()
+    phone_filter = CustomerPhoneFilter()
+    backfill = CustomerBackfill(
+        shopify_service,
+        AsyncSessionLocal,
+        checkpoint,
+        batch_size=args.batch_size,
+        poll_interval_seconds=args.poll_interval,
+        phone_filter=phone_filter
+    )
+    try:
+        result = await backfill.run(jsonl_url=args.jsonl_url)
+        print(f"✅ Read {result['lines']} lines, inserted {result['inserted']} customers, "
+              f"skipped {result['skipped']} ({result['duration_seconds']}s)")
+    finally:
+        await phone_filter.shutdown()
+        await shopify_service.shutdown()
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the in-process code on every request
+
+Usage:
+    python benchmark.py                                  # run and print
+    python benchmark.py --save benchmark_baseline.json   # record a baseline
+    python benchmark.py --compare benchmark_baseline.json
+    python benchmark.py --filter rate_limiter --scale 1000,100000,1000000
+
+Timing uses timeit (GC off) over --repeat short samples in each of --runs
+rounds; the rounds go through every benchmark in turn, so a burst of
+background load lands in one round of many benchmarks rather than every
+sample of one. Each sample is paired with one of a fixed reference workload,
+and the benchmark's time is also reported relative to it. CPU frequency
+changes and background load hit both, so the ratio is far more stable
+between runs (and machines) than nanoseconds. The reported relative time
+is the median of the per-round medians. Memory uses tracemalloc in a separate pass so it doesn't skew
+the timings. Scaling runs fill a rate limiter with N keys and report memory
+per key and the cost of is_allowed at that size.
+
+--compare exits with status 1 if a benchmark allocates more than the
+baseline by more than --memory-threshold, or if its relative time is
+slower by more than --threshold and by more than its noise floor (the
+spread between rounds, in either run), with every current round slower
+than every baseline round. Run-to-run noise isn't reported as a regression.
+"""
+import argparse
+import gc
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import timeit
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Placeholders so the app settings load without a .env (nothing connects anywhere)
+BENCHMARK_ENV = {
+    "SHOPIFY_STORE_DOMAIN": "benchmark.myshopify.com",
+    "SHOPIFY_ADMIN_API_TOKEN": "shpat_benchmark",
+    "SHOPIFY_STOREFRONT_ACCESS_TOKEN": "storefront_benchmark",
+    "TWILIO_ACCOUNT_SID": "AC00000000000000000000000000000000",
+    "TWILIO_AUTH_TOKEN": "benchmark",
+    "TWILIO_PHONE_NUMBER": "+15550000000",
+    "JWT_SECRET_KEY": "benchmark",
+    "RATE_LIMIT_BACKEND": "memory",
+}
+
+DEFAULT_SCALE = "1000,100000,1000000"
+SCALING_PREFIX = "rate_limiter.is_allowed@"
+
+# Length of one timed sample; short so the paired reference sample runs under the same conditions
+SAMPLE_SECONDS = 0.02
+
+# Memory metrics compared against the baseline (higher is worse); time is compared separately
+MEMORY_METRICS = ("alloc_peak_bytes", "bytes_per_key")
+
+
+def reference_workload():
+    """Fixed pure-Python work (formatting, sorting, dict access) timings are expressed in"""
+    values = {str(i): i for i in range(64)}
+    return sorted(values, key=values.__getitem__, reverse=True)
+
+
+def loops_for(timer: timeit.Timer) -> int:
+    """Loop count that makes one sample take about SAMPLE_SECONDS"""
+    number, total = timer.autorange()
+    return max(1, round(number * SAMPLE_SECONDS / total))
+
+
+class ReferenceClock:
+    """Times the reference workload, one sample at a time"""
+
+    def __init__(self):
+        self.timer = timeit.Timer(reference_workload)
+        self.number = loops_for(self.timer)
+
+    def sample(self) -> float:
+        """Seconds per reference call, measured now"""
+        return self.timer.timeit(self.number) / self.number
+
+
+class Timing:
+    """Samples of one benchmark, collected over one or more rounds"""
+
+    def __init__(self, fn: Callable[[], Any]):
+        self.timer = timeit.Timer(fn)
+        self.number = loops_for(self.timer)
+        self.per_op: List[float] = []
+        self.relative: List[float] = []
+        self.round_medians: List[float] = []
+
+    def run_round(self, repeat: int, reference: ReferenceClock):
+        """Take `repeat` samples, each paired with a reference sample"""
+        relative = []
+        for _ in range(repeat):
+            seconds = self.timer.timeit(self.number) / self.number
+            self.per_op.append(seconds * 1e9)
+            relative.append(seconds / reference.sample())
+        self.relative.extend(relative)
+        self.round_medians.append(statistics.median(relative))
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        ns per call, plus the time relative to the reference workload:
+        median of the round medians, quartiles of all samples, and each
+        round's median (its spread is the noise floor used by --compare)
+        """
+        q1, _, q3 = statistics.quantiles(self.relative, n=4)
+        return {
+            "ns_per_op_min": round(min(self.per_op), 1),
+            "ns_per_op_median": round(statistics.median(self.per_op), 1),
+            "ops_per_second": round(1e9 / min(self.per_op)),
+            "loops": self.number,
+            "relative_median": round(statistics.median(self.round_medians), 4),
+            "relative_q1": round(q1, 4),
+            "relative_q3": round(q3, 4),
+            "relative_runs": [round(median, 4) for median in self.round_medians],
+        }
+
+
+def time_call(fn: Callable[[], Any], repeat: int, reference: ReferenceClock, runs: int = 1) -> Dict[str, Any]:
+    """Timing summary of fn over `runs` back-to-back rounds of `repeat` samples"""
+    timing = Timing(fn)
+    for _ in range(runs):
+        timing.run_round(repeat, reference)
+    return timing.summary()
+
+
+def allocation_peak(fn: Callable[[], Any], calls: int = 100) -> int:
+    """Largest tracemalloc peak of a single call, in bytes (results kept alive count)"""
+    fn()  # Warm caches (regex compilation, lazy imports) outside the measurement
+    peak = 0
+    tracemalloc.start()
+    try:
+        for _ in range(calls):
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            result = fn()
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+            del result
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def drive(coroutine) -> Any:
+    """Run a coroutine that never suspends (in-memory backends) without an event loop"""
+    try:
+        coroutine.send(None)
+    except StopIteration as done:
+        return done.value
+    coroutine.close()
+    raise RuntimeError("benchmarked coroutine suspended; it needs an event loop")
+
+
+def phone_numbers(start: int = 9000000000):
+    """Distinct Indian mobile numbers, as the API receives them"""
+    return (f"+91{number}" for number in itertools.count(start))
+
+
+def build_benchmarks() -> Dict[str, Callable[[], Any]]:
+    """name -> zero-argument callable timed per call"""
+    from pydantic import ValidationError
+
+    from app.schemas import SendOTPRequest, VerifyOTPRequest, CustomerData
+    from app.services.otp_service import OTPService
+    from app.services.shopify_service import ShopifyService
+    from app.utils.rate_limiter import RateLimiter, LocalRateLimitBackend
+    from app.utils.security import PasswordEncryption
+
+    # A pool of recently seen phones, all under the limit
+    allowed_limiter = RateLimiter(max_requests=60000, window_seconds=3600, backend=LocalRateLimitBackend())
+    pool = list(itertools.islice(phone_numbers(), 10000))
+    for phone in pool:
+        drive(allowed_limiter.is_allowed(phone))
+    rotation = itertools.cycle(pool)
+
+    denied_limiter = RateLimiter(max_requests=5, window_seconds=3600, backend=LocalRateLimitBackend())
+    for _ in range(5):
+        drive(denied_limiter.is_allowed("+919000000000"))
+
+    new_key_limiter = RateLimiter(max_requests=5, window_seconds=3600, backend=LocalRateLimitBackend())
+    new_phones = phone_numbers(7000000000)
+
+    def invalid_send_otp():
+        try:
+            SendOTPRequest(phone="12345")
+        except ValidationError:
+            pass
+
+    encryption = PasswordEncryption("benchmark-secret")
+    password = ShopifyService.generate_random_password()
+    token = encryption.encrypt(password)
+
+    customer_fields = {
+        "id": "12345",
+        "phone": "+919876543210",
+        "email": "customer.919876543210@slayfashion.internal",
+        "first_name": None,
+        "last_name": None,
+        "shopify_customer_id": "gid://shopify/Customer/7000000001",
+    }
+    customer = CustomerData(**customer_fields)
+
+    return {
+        "rate_limiter.is_allowed.allowed": lambda: drive(allowed_limiter.is_allowed(next(rotation))),
+        "rate_limiter.is_allowed.denied": lambda: drive(denied_limiter.is_allowed("+919000000000")),
+        "rate_limiter.is_allowed.new_key": lambda: drive(new_key_limiter.is_allowed(next(new_phones))),
+        "schemas.SendOTPRequest.valid": lambda: SendOTPRequest(phone="+91 98765-43210"),
+        "schemas.SendOTPRequest.invalid": invalid_send_otp,
+        "schemas.SendOTPRequest.from_json": lambda: SendOTPRequest.model_validate_json('{"phone": "+919876543210"}'),
+        "schemas.VerifyOTPRequest.valid": lambda: VerifyOTPRequest(
+            phone="+919876543210", otp="123456", session_id="aZ3kP9qL2mX8vB1nC7dF4gH6jK0sT5wY"
+        ),
+        "otp.generate_otp": OTPService.generate_otp,
+        "otp.generate_session_id": OTPService.generate_session_id,
+        "security.PasswordEncryption.init": lambda: PasswordEncryption("benchmark-secret"),
+        "security.PasswordEncryption.encrypt": lambda: encryption.encrypt(password),
+        "security.PasswordEncryption.decrypt": lambda: encryption.decrypt(token),
+        "shopify.generate_hidden_email": lambda: ShopifyService.generate_hidden_email("+919876543210"),
+        "schemas.CustomerData.construct": lambda: CustomerData(**customer_fields),
+        "schemas.CustomerData.model_dump": customer.model_dump,
+        "schemas.CustomerData.model_dump_json": customer.model_dump_json,
+    }
+
+
+def run_scaling(sizes: List[int], repeat: int, runs: int, reference: ReferenceClock) -> Dict[str, Dict[str, Any]]:
+    """Rate limiter memory and is_allowed cost with N distinct keys tracked"""
+    from app.utils.rate_limiter import RateLimiter, LocalRateLimitBackend
+
+    results = {}
+    for size in sizes:
+        gc.collect()
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        # Key strings are counted: the limiter keeps every identifier it sees alive
+        limiter = RateLimiter(max_requests=60000, window_seconds=3600, backend=LocalRateLimitBackend())
+        for phone in itertools.islice(phone_numbers(), size):
+            drive(limiter.is_allowed(phone))
+        after, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        sample = list(itertools.islice(phone_numbers(), 0, size, max(1, size // 10000)))
+        rotation = itertools.cycle(sample)
+        timing = time_call(lambda: drive(limiter.is_allowed(next(rotation))), repeat, reference, runs)
+
+        results[f"{SCALING_PREFIX}{size}_keys"] = {
+            **timing,
+            "keys": limiter.backend.key_count(),
+            "memory_bytes": after - before,
+            "bytes_per_key": round((after - before) / size, 1),
+        }
+        del limiter
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def round_spread(result: Dict[str, Any]) -> Tuple[float, float]:
+    """
+    (fastest, slowest) round median of a result; results saved before
+    rounds existed fall back to their interquartile range
+    """
+    runs = result.get("relative_runs") or []
+    if len(runs) < 2:
+        return result["relative_q1"], result["relative_q3"]
+    return min(runs), max(runs)
+
+
+def noise_floor(result: Dict[str, Any]) -> float:
+    """Spread between a result's fastest and slowest round, relative to its median"""
+    fastest, slowest = round_spread(result)
+    return (slowest - fastest) / result["relative_median"] if result["relative_median"] else 0.0
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float, memory_threshold: float) -> List[str]:
+    """
+    Print a side-by-side table; returns the regressions
+
+    Time: the median relative time must be slower by more than both
+    `threshold` and the noise floor of either run, and the current run's
+    fastest round must be slower than the baseline's slowest. Memory: more
+    than `memory_threshold` growth (allocation peaks also by at least 64 bytes).
+    """
+    regressions = []
+    print(f"\nbaseline {baseline.get('git_commit')} ({baseline.get('python')}) vs current {current.get('git_commit')}")
+    print(f"{'benchmark':<48}{'metric':<18}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<48}{'(new)':<18}")
+            continue
+
+        if "relative_median" in before and "relative_median" in result:
+            old, new = before["relative_median"], result["relative_median"]
+            change = (new - old) / old if old else 0.0
+            allowed = max(threshold, noise_floor(before), noise_floor(result))
+            flag = ""
+            if change > allowed and round_spread(result)[0] > round_spread(before)[1]:
+                flag = "  ⚠️ REGRESSION"
+                regressions.append(f"{name} relative time: {old} -> {new} ({change:+.1%})")
+            print(f"{name:<48}{'relative_median':<18}{old:>12}{new:>12}{change:>+10.1%}{flag}")
+
+        for metric in MEMORY_METRICS:
+            old, new = before.get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else 0.0
+            flag = ""
+            # Ignore tiny absolute allocation changes (interpreter noise)
+            if change > memory_threshold and not (metric == "alloc_peak_bytes" and new - old < 64):
+                flag = "  ⚠️ REGRESSION"
+                regressions.append(f"{name} {metric}: {old} -> {new} ({change:+.1%})")
+            print(f"{name:<48}{metric:<18}{old:>12}{new:>12}{change:>+10.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for per-request code")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed samples per benchmark in each round")
+    parser.add_argument("--runs", type=int, default=5, help="Rounds over all benchmarks; times are the median of the rounds")
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--scale", default=DEFAULT_SCALE, help="Comma-separated rate limiter sizes for scaling runs ('' to skip)")
+    parser.add_argument("--save", help="Write results JSON to this file (e.g. the baseline)")
+    parser.add_argument("--compare", help="Baseline JSON to compare against; exits 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed slowdown of the median relative time (0.15 = 15%%)")
+    parser.add_argument("--memory-threshold", type=float, default=0.10, help="Allowed memory growth")
+    args = parser.parse_args()
+
+    for key, value in BENCHMARK_ENV.items():
+        os.environ.setdefault(key, value)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    reference = ReferenceClock()
+    benchmarks = {
+        name: fn for name, fn in build_benchmarks().items()
+        if not args.filter or args.filter in name
+    }
+    timings = {name: Timing(fn) for name, fn in benchmarks.items()}
+    names = list(timings)
+    for round_index in range(args.runs):
+        # Start each round at a different benchmark so none always runs first
+        shift = round_index % len(names) if names else 0
+        for name in names[shift:] + names[:shift]:
+            timings[name].run_round(args.repeat, reference)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for name, fn in benchmarks.items():
+        results[name] = {**timings[name].summary(), "alloc_peak_bytes": allocation_peak(fn)}
+        print(f"{name:<48}{results[name]['ns_per_op_median']:>12,.0f} ns/op"
+              f"{results[name]['relative_median']:>10.3f} ref"
+              f"{results[name]['alloc_peak_bytes']:>10,} B peak")
+
+    sizes = [int(size) for size in args.scale.split(",") if size.strip()]
+    if sizes and (not args.filter or args.filter in SCALING_PREFIX or args.filter.startswith(SCALING_PREFIX)):
+        for name, result in run_scaling(sizes, args.repeat, args.runs, reference).items():
+            results[name] = result
+            print(f"{name:<48}{result['ns_per_op_median']:>12,.0f} ns/op"
+                  f"{result['relative_median']:>10.3f} ref"
+                  f"{result['bytes_per_key']:>10,.1f} B/key")
+
+    report = {
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "runs": args.runs,
+        "reference_ns": round(reference.sample() * 1e9, 1),
+        "results": results,
+    }
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results written to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold, args.memory_threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s):")
+            for regression in regressions:
+                print(f"   {regression}")
+            sys.exit(1)
+        print("\n✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
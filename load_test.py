@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Offline load test of the login funnel: send-otp -> verify-otp -> profile
+
+Usage:
+    python load_test.py --concurrency 50 --duration 30
+    python load_test.py --rate 100 --funnels 5000 --output results.json
+    python load_test.py --compare baseline.json results.json
+
+By default the app runs in-process (no sockets, no server to start) on a
+throwaway SQLite database. Shopify and Twilio are the standins.py
+stand-ins, mounted through httpx.ASGITransport (Shopify) and a Twilio SDK
+HTTP client (Twilio), so nothing leaves the machine. The stand-ins answer
+after a configurable latency and are unthrottled by default. The OTP of
+each funnel is read straight from the OTP store.
+
+--base-url drives a running server instead; it must share this
+process's DATABASE_URL / OTP store settings so OTPs can be read back, and
+should itself point at stand-ins rather than the real Shopify and Twilio.
+
+Results (JSON) hold per-endpoint throughput, p50/p95/p99 latency and a
+breakdown of statuses and errors, plus the git commit, so runs of two
+builds can be compared.
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from twilio.http import HttpClient
+from twilio.http.response import Response as TwilioResponse
+
+ENDPOINTS = ("send_otp", "verify_otp_wrong", "verify_otp", "profile")
+
+# The send-otp rate limit is 5 per phone per hour; returning users stay under it
+MAX_LOGINS_PER_PHONE = 4
+
+# Placeholders so the in-process app starts without a .env (stand-ins ignore them)
+STAND_IN_ENV = {
+    "SHOPIFY_STORE_DOMAIN": "load-test.myshopify.com",
+    "SHOPIFY_ADMIN_API_TOKEN": "shpat_load_test",
+    "SHOPIFY_STOREFRONT_ACCESS_TOKEN": "storefront_load_test",
+    "TWILIO_ACCOUNT_SID": "AC00000000000000000000000000000000",
+    "TWILIO_AUTH_TOKEN": "load_test",
+    "TWILIO_PHONE_NUMBER": "+15550000000",
+    "JWT_SECRET_KEY": "load_test",
+}
+
+
+def uniform_latency(mean_ms: float):
+    """Stand-in latency spread +-50% around the mean"""
+    from standins import LatencyDistribution
+
+    return LatencyDistribution("uniform", mean_ms * 0.5, mean_ms * 1.5)
+
+
+class TwilioASGIClient(HttpClient):
+    """
+    Twilio SDK HTTP client that sends requests to an in-process ASGI app
+    (the standins.py Twilio stand-in), so the real SDK builds and parses
+    them. The SDK calls it from SMS worker threads; requests run on the
+    event loop.
+    """
+
+    def __init__(self, app, loop: asyncio.AbstractEventLoop, timeout: Optional[float] = None):
+        import httpx
+
+        super().__init__(logger=logging.getLogger("twilio.http_client"), is_async=False, timeout=timeout)
+        self.loop = loop
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+
+    def request(self, method, url, params=None, data=None, headers=None, auth=None, timeout=None, allow_redirects=False):
+        response = asyncio.run_coroutine_threadsafe(
+            self.client.request(method, url, params=params, data=data, headers=headers, auth=auth,
+                                timeout=timeout or self.timeout),
+            self.loop
+        ).result()
+        return TwilioResponse(response.status_code, response.text, response.headers)
+
+
+class EndpointStats:
+    """Latencies and outcomes of one endpoint"""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+
+    def record(self, seconds: float, status: Optional[int], error: Optional[str] = None):
+        self.latencies.append(seconds)
+        self.statuses[str(status) if status is not None else "exception"] += 1
+        if error:
+            self.errors[error] += 1
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2)
+
+        return {
+            "requests": len(latencies),
+            "errors": sum(self.errors.values()),
+            "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+            "latency_ms": {
+                "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": round(latencies[-1] * 1000, 2) if latencies else None,
+            },
+            "statuses": dict(self.statuses),
+            "error_breakdown": dict(self.errors.most_common(20)),
+        }
+
+
+class Pacer:
+    """Hands out funnel start times `1/rate` apart across all workers (open-loop arrivals)"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next = time.monotonic()
+
+    async def wait(self):
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class LoadTest:
+    """Runs login funnels from `concurrency` virtual users until the funnel or time budget is spent"""
+
+    def __init__(self, client, otp_store, args):
+        self.client = client
+        self.otp_store = otp_store
+        self.args = args
+        self.pacer = Pacer(args.rate) if args.rate else None
+        self.stats = {name: EndpointStats() for name in ENDPOINTS}
+        self.funnels_started = 0
+        self.funnels_completed = 0
+        self.funnel_failures: Counter = Counter()
+        self.funnel_latencies: List[float] = []
+        # Unique numbers per run; returning users re-use numbers that already logged in
+        self._phones = itertools.count(random.randrange(10 ** 8, 9 * 10 ** 8) * 10)
+        self._logins: Counter = Counter()
+        self.returning_phones: List[str] = []
+
+    def _next_phone(self) -> str:
+        if self.returning_phones and random.random() < self.args.returning_ratio:
+            # Swap-remove; the phone goes back into the pool after its login
+            index = random.randrange(len(self.returning_phones))
+            self.returning_phones[index], self.returning_phones[-1] = self.returning_phones[-1], self.returning_phones[index]
+            return self.returning_phones.pop()
+        return f"+91{next(self._phones) % 10 ** 10:010d}"
+
+    async def _call(self, endpoint: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except Exception as e:
+            self.stats[endpoint].record(time.perf_counter() - started, None, type(e).__name__)
+            return None
+        elapsed = time.perf_counter() - started
+        error = None
+        if response.status_code >= 400 and not (endpoint == "verify_otp_wrong" and response.status_code == 400):
+            try:
+                detail = response.json().get("detail")
+            except ValueError:
+                detail = None
+            # Numbers in messages (attempts left, retry seconds) would split identical errors
+            error = f"{response.status_code} {re.sub(r'[0-9]+', 'N', str(detail))[:120]}"
+        self.stats[endpoint].record(elapsed, response.status_code, error)
+        return response
+
+    async def funnel(self):
+        started = time.perf_counter()
+        phone = self._next_phone()
+
+        response = await self._call("send_otp", "POST", "/api/auth/send-otp", json={"phone": phone})
+        if response is None or response.status_code != 200:
+            self.funnel_failures["send_otp"] += 1
+            return
+        session_id = response.json()["session_id"]
+
+        code = await self.otp_store.peek(session_id)
+        if code is None:
+            self.funnel_failures["otp_not_found"] += 1
+            return
+
+        if random.random() < self.args.wrong_otp_ratio:
+            wrong = f"{(int(code) + 1) % 10 ** len(code):0{len(code)}d}"
+            await self._call("verify_otp_wrong", "POST", "/api/auth/verify-otp",
+                             json={"phone": phone, "otp": wrong, "session_id": session_id})
+
+        response = await self._call("verify_otp", "POST", "/api/auth/verify-otp",
+                                    json={"phone": phone, "otp": code, "session_id": session_id})
+        if response is None or response.status_code != 200:
+            self.funnel_failures["verify_otp"] += 1
+            return
+        self._logins[phone] += 1
+        if self._logins[phone] < MAX_LOGINS_PER_PHONE and len(self.returning_phones) < 10000:
+            self.returning_phones.append(phone)
+
+        response = await self._call("profile", "GET", "/api/customer/profile", params={"phone": phone})
+        if response is None or response.status_code != 200:
+            self.funnel_failures["profile"] += 1
+            return
+
+        self.funnels_completed += 1
+        self.funnel_latencies.append(time.perf_counter() - started)
+
+    async def _user(self, deadline: float):
+        while time.monotonic() < deadline:
+            if self.args.funnels and self.funnels_started >= self.args.funnels:
+                return
+            self.funnels_started += 1
+            if self.pacer is not None:
+                await self.pacer.wait()
+            await self.funnel()
+
+    async def run(self) -> Dict[str, Any]:
+        deadline = time.monotonic() + (self.args.duration or float("inf"))
+        started = time.perf_counter()
+        await asyncio.gather(*(self._user(deadline) for _ in range(self.args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+        funnel = EndpointStats()
+        funnel.latencies = self.funnel_latencies
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "funnels": {
+                "started": self.funnels_started,
+                "completed": self.funnels_completed,
+                "failed": dict(self.funnel_failures),
+                "throughput_per_second": round(self.funnels_completed / elapsed, 2) if elapsed else None,
+                "latency_ms": funnel.summary(elapsed)["latency_ms"],
+            },
+            "endpoints": {
+                name: stats.summary(elapsed) for name, stats in self.stats.items() if stats.latencies
+            },
+        }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+async def run_in_process(args) -> Dict[str, Any]:
+    import httpx
+    import app.services.sms_dispatcher as sms_dispatcher
+    from app.database import init_db
+    from app.main import app
+    from standins import Behaviour, ShopifyStandIn, TwilioStandIn
+
+    shopify = ShopifyStandIn(Behaviour(
+        uniform_latency(args.shopify_latency_ms),
+        error_rate=args.shopify_error_rate,
+        error_status=503
+    ))
+    twilio = TwilioStandIn(Behaviour(uniform_latency(args.twilio_latency_ms)))
+    twilio_http = TwilioASGIClient(twilio.create_app(), asyncio.get_running_loop())
+    sms_dispatcher.TwilioHttpClient = lambda timeout=None: twilio_http
+    init_db()
+
+    # App logging is per request; keep it off the terminal (it is still paid for)
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with output:
+        async with app.router.lifespan_context(app):
+            services = app.state.services
+            await services.shopify_service.shutdown()
+            services.shopify_service.http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=shopify.create_app()))
+
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=args.timeout) as client:
+                results = await LoadTest(client, services.otp_service.store, args).run()
+                results["server_stats"] = (await client.get("/stats")).json()
+
+    await twilio_http.client.aclose()
+    results["stand_ins"] = {"shopify": shopify.get_stats(), "twilio": twilio.get_stats()}
+    return results
+
+
+async def run_against_server(args) -> Dict[str, Any]:
+    import httpx
+    from app.services.otp_store import create_otp_store
+
+    otp_store = create_otp_store()
+    await otp_store.startup()
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    try:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+            results = await LoadTest(client, otp_store, args).run()
+            results["server_stats"] = (await client.get("/stats")).json()
+    finally:
+        await otp_store.shutdown()
+    return results
+
+
+def print_report(results: Dict[str, Any]):
+    funnels = results["funnels"]
+    print(f"\n📊 {funnels['completed']}/{funnels['started']} funnels in {results['elapsed_seconds']}s "
+          f"({funnels['throughput_per_second']}/s), failures: {funnels['failed'] or 'none'}")
+    print(f"{'endpoint':<18}{'reqs':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, stats in results["endpoints"].items():
+        latency = stats["latency_ms"]
+        print(f"{name:<18}{stats['requests']:>8}{stats['throughput_rps']:>10}"
+              f"{latency['p50']:>10}{latency['p95']:>10}{latency['p99']:>10}{stats['errors']:>8}")
+        for error, count in stats["error_breakdown"].items():
+            print(f"    {count:>6} x {error}")
+
+
+def compare(baseline_path: str, candidate_path: str):
+    """Print p50/p95/p99 and throughput changes between two result files"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+
+    def change(old, new) -> str:
+        if old in (None, 0) or new is None:
+            return "n/a"
+        return f"{(new - old) / old * 100:+.1f}%"
+
+    print(f"baseline {baseline.get('git_commit')} vs candidate {candidate.get('git_commit')}")
+    old, new = baseline["funnels"]["throughput_per_second"], candidate["funnels"]["throughput_per_second"]
+    print(f"{'funnels/s':<28}{old!s:>10}{new!s:>10}{change(old, new):>10}")
+    for name, stats in candidate["endpoints"].items():
+        before = baseline["endpoints"].get(name)
+        if before is None:
+            continue
+        for key in ("p50", "p95", "p99"):
+            old, new = before["latency_ms"][key], stats["latency_ms"][key]
+            print(f"{name + ' ' + key + ' ms':<28}{old!s:>10}{new!s:>10}{change(old, new):>10}")
+        old, new = before["errors"], stats["errors"]
+        print(f"{name + ' errors':<28}{old!s:>10}{new!s:>10}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load test the send-otp -> verify-otp -> profile funnel")
+    parser.add_argument("--concurrency", type=int, default=20, help="Virtual users running funnels in parallel")
+    parser.add_argument("--rate", type=float, default=0, help="Funnels started per second across all users (0 = as fast as possible)")
+    parser.add_argument("--funnels", type=int, default=0, help="Stop after this many funnels (0 = no limit)")
+    parser.add_argument("--duration", type=float, default=0, help="Stop after this many seconds (0 = no limit)")
+    parser.add_argument("--returning-ratio", type=float, default=0.3, help="Share of funnels reusing a phone that already logged in")
+    parser.add_argument("--wrong-otp-ratio", type=float, default=0.05, help="Share of funnels that first submit a wrong code")
+    parser.add_argument("--shopify-latency-ms", type=float, default=80, help="Mean stand-in Shopify latency")
+    parser.add_argument("--shopify-error-rate", type=float, default=0.0, help="Share of stand-in Shopify calls answered with a 503")
+    parser.add_argument("--twilio-latency-ms", type=float, default=150, help="Mean stand-in Twilio latency")
+    parser.add_argument("--timeout", type=float, default=30, help="Client request timeout in seconds")
+    parser.add_argument("--base-url", help="Drive a running server instead of the in-process app")
+    parser.add_argument("--database-url", help="Database for the in-process app (default: a throwaway SQLite file)")
+    parser.add_argument("--otp-store", choices=["sql", "memory", "redis"], help="Override OTP_STORE_BACKEND")
+    parser.add_argument("--output", help="Write the results JSON to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's own log output")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"), help="Compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if not args.funnels and not args.duration:
+        args.duration = 30
+
+    # Settings are read on first import of the app, so configure the environment first
+    if not args.base_url:
+        for key, value in STAND_IN_ENV.items():
+            os.environ.setdefault(key, value)
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='load_test_')}/load_test.db"
+        os.environ.setdefault("TRACE_SAMPLE_RATE", "0")
+    if args.otp_store:
+        os.environ["OTP_STORE_BACKEND"] = args.otp_store
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    run = run_against_server if args.base_url else run_in_process
+    results = {
+        "git_commit": git_commit(),
+        "target": args.base_url or "in-process",
+        "config": {key: value for key, value in vars(args).items() if key not in ("compare", "verbose", "output")},
+        **(await run(args)),
+    }
+
+    print_report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+"""Initial schema: customers and otp_verifications
+
+Databases created by the old create_all-at-startup already have these
+tables; existing tables and indexes are left alone so they can adopt
+migrations with a plain `alembic upgrade head`.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _existing_tables() -> set:
+    if context.is_offline_mode():
+        return set()
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def _existing_indexes(table: str) -> set:
+    if context.is_offline_mode() or table not in _existing_tables():
+        return set()
+    return {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade() -> None:
+    tables = _existing_tables()
+
+    if "customers" not in tables:
+        op.create_table(
+            "customers",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("phone", sa.String(), nullable=False),
+            sa.Column("shopify_customer_id", sa.String(), nullable=False),
+            sa.Column("shopify_email", sa.String(), nullable=False),
+            sa.Column("shopify_password", sa.String(), nullable=False),
+            sa.Column("first_name", sa.String(), nullable=True),
+            sa.Column("last_name", sa.String(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(), nullable=True),
+            sa.Column("is_active", sa.Boolean(), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("shopify_email"),
+        )
+        op.create_index("ix_customers_id", "customers", ["id"])
+        op.create_index("ix_customers_phone", "customers", ["phone"], unique=True)
+        op.create_index("ix_customers_shopify_customer_id", "customers", ["shopify_customer_id"], unique=True)
+
+    if "otp_verifications" not in tables:
+        op.create_table(
+            "otp_verifications",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("phone", sa.String(), nullable=False),
+            sa.Column("otp_code", sa.String(), nullable=False),
+            sa.Column("session_id", sa.String(), nullable=False),
+            sa.Column("is_verified", sa.Boolean(), nullable=True),
+            sa.Column("attempts", sa.Integer(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("expires_at", sa.DateTime(), nullable=False),
+            sa.Column("verified_at", sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_otp_verifications_id", "otp_verifications", ["id"])
+        op.create_index("ix_otp_verifications_phone", "otp_verifications", ["phone"])
+        op.create_index("ix_otp_verifications_session_id", "otp_verifications", ["session_id"], unique=True)
+
+    # Added for the retention purge after some databases were already created
+    if "ix_otp_verifications_created_at" not in _existing_indexes("otp_verifications"):
+        op.create_index("ix_otp_verifications_created_at", "otp_verifications", ["created_at"])
+
+
+def downgrade() -> None:
+    op.drop_table("otp_verifications")
+    op.drop_table("customers")
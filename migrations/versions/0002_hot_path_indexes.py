@@ -0,0 +1,93 @@
+"""Indexes shaped for the hot-path queries
+
+- verify-otp looks up otp_verifications by (phone, session_id)
+- send-otp invalidates a phone's unverified OTPs (phone, is_verified = false)
+- the customer routes load the customer profile by phone (Postgres only:
+  the profile columns are INCLUDEd, not part of the key; the hidden
+  password is not copied into the index)
+
+On Postgres every index is built CONCURRENTLY (outside a transaction) so
+the tables stay writable while the migration runs. The plain phone index
+on otp_verifications is dropped: the composite and partial indexes both
+lead with phone.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from contextlib import contextmanager
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+CUSTOMER_PROFILE_COLUMNS = [
+    "id", "shopify_customer_id", "shopify_email",
+    "first_name", "last_name", "created_at", "updated_at", "is_active",
+]
+
+
+def _is_postgres() -> bool:
+    return op.get_bind().dialect.name == "postgresql"
+
+
+@contextmanager
+def _online_ddl():
+    """CREATE/DROP INDEX CONCURRENTLY can't run inside a transaction on Postgres"""
+    if _is_postgres():
+        with op.get_context().autocommit_block():
+            yield
+    else:
+        yield
+
+
+def upgrade() -> None:
+    concurrently = {"postgresql_concurrently": True}
+
+    with _online_ddl():
+        op.create_index(
+            "ix_otp_verifications_phone_session_id",
+            "otp_verifications",
+            ["phone", "session_id"],
+            if_not_exists=True,
+            **concurrently,
+        )
+        op.create_index(
+            "ix_otp_verifications_phone_unverified",
+            "otp_verifications",
+            ["phone"],
+            postgresql_where=sa.text("is_verified = false"),
+            sqlite_where=sa.text("is_verified = 0"),
+            if_not_exists=True,
+            **concurrently,
+        )
+
+        # Index-only scans for profile lookups. Without INCLUDE the columns
+        # would have to be key columns, so other databases just use the
+        # unique phone index.
+        if _is_postgres():
+            op.create_index(
+                "ix_customers_phone_covering",
+                "customers",
+                ["phone"],
+                postgresql_include=CUSTOMER_PROFILE_COLUMNS,
+                if_not_exists=True,
+                **concurrently,
+            )
+
+        op.drop_index("ix_otp_verifications_phone", "otp_verifications", if_exists=True, **concurrently)
+
+
+def downgrade() -> None:
+    concurrently = {"postgresql_concurrently": True}
+
+    with _online_ddl():
+        op.create_index("ix_otp_verifications_phone", "otp_verifications", ["phone"], if_not_exists=True, **concurrently)
+        op.drop_index("ix_customers_phone_covering", "customers", if_exists=True, **concurrently)
+        op.drop_index("ix_otp_verifications_phone_unverified", "otp_verifications", if_exists=True, **concurrently)
+        op.drop_index("ix_otp_verifications_phone_session_id", "otp_verifications", if_exists=True, **concurrently)
@@ -0,0 +1,31 @@
+"""Allow customers without hidden credentials
+
+Customers imported from Shopify by backfill_customers.py only have their
+Shopify id, phone and (maybe) email; the hidden password is set on their
+first OTP login.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("customers") as batch_op:
+        batch_op.alter_column("shopify_email", existing_type=sa.String(), nullable=True)
+        batch_op.alter_column("shopify_password", existing_type=sa.String(), nullable=True)
+
+
+def downgrade() -> None:
+    # Fails while backfilled customers that never logged in are still present
+    with op.batch_alter_table("customers") as batch_op:
+        batch_op.alter_column("shopify_password", existing_type=sa.String(), nullable=False)
+        batch_op.alter_column("shopify_email", existing_type=sa.String(), nullable=False)
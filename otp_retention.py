@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+OTP retention maintenance
+
+Usage:
+    python otp_retention.py purge       # run one retention pass now
+    python otp_retention.py status      # show partitioning state (Postgres)
+    python otp_retention.py partition   # convert otp_verifications to daily partitions (Postgres, one-off)
+"""
+import argparse
+import asyncio
+
+from app.database import async_engine
+from app.services.retention import OTPRetentionService
+
+
+async def purge(retention: OTPRetentionService):
+    result = await retention.purge_once()
+    if result["skipped"]:
+        print("⏭️  Another worker is already purging, skipped")
+        return
+    print(f"✅ Purged {result['rows_purged']} rows in {result['batches']} batches, "
+          f"dropped {result['partitions_dropped']} partitions ({result['duration_seconds']}s)")
+
+
+async def status(retention: OTPRetentionService):
+    if retention.partitions is None:
+        print("ℹ️  Partitioning is only available on PostgreSQL")
+        return
+    if not await retention.partitions.is_partitioned():
+        print("ℹ️  otp_verifications is a plain table (batched deletes)")
+        return
+    partitions = await retention.partitions.list_partitions()
+    print(f"✅ otp_verifications is partitioned ({len(partitions)} partitions)")
+    for name in partitions:
+        print(f"   - {name}")
+
+
+async def partition(retention: OTPRetentionService):
+    if retention.partitions is None:
+        print("❌ Partitioning is only available on PostgreSQL")
+        return
+    copied = await retention.partitions.convert_to_partitioned()
+    print(f"✅ otp_verifications is now partitioned by day ({copied} unexpired OTPs carried over)")
+    print("   Set OTP_PARTITIONING_ENABLED=true; otp_verifications_legacy can be dropped")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="OTP retention maintenance")
+    parser.add_argument("command", choices=["purge", "status", "partition"])
+    args = parser.parse_args()
+
+    retention = OTPRetentionService()
+    try:
+        await {"purge": purge, "status": status, "partition": partition}[args.command](retention)
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,27 +1,88 @@
 #!/usr/bin/env python3
 """
 Run the FastAPI application
+
+ENVIRONMENT=development: single process with auto-reload
+ENVIRONMENT=production: multiple workers on uvloop + httptools, no reload
 """
+import os
 import uvicorn
 from app.config import get_settings
 
+
+def run_development(settings):
+    """Single process, optional file-watcher reload"""
+    uvicorn.run(
+        "app.main:app",
+        host=settings.host,
+        port=settings.port,
+        reload=settings.reload,  # Enable auto-reload during development
+        log_level="info"
+    )
+
+
+def run_production(settings, workers: int):
+    """Multi-process server with graceful shutdown"""
+    if settings.preload_app:
+        run_preloaded(settings, workers)
+        return
+
+    uvicorn.run(
+        "app.main:app",
+        host=settings.host,
+        port=settings.port,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        backlog=settings.backlog,
+        timeout_keep_alive=settings.keepalive_timeout_seconds,
+        timeout_graceful_shutdown=settings.graceful_shutdown_timeout_seconds,
+        proxy_headers=True,
+        log_level="info"
+    )
+
+
+def run_preloaded(settings, workers: int):
+    """Import the app once in a gunicorn master, then fork uvicorn workers"""
+    from gunicorn.app.base import BaseApplication
+
+    class PreloadedApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{settings.host}:{settings.port}")
+            self.cfg.set("workers", workers)
+            # UvicornWorker picks uvloop + httptools when they are installed
+            self.cfg.set("worker_class", "uvicorn.workers.UvicornWorker")
+            self.cfg.set("preload_app", True)
+            self.cfg.set("backlog", settings.backlog)
+            self.cfg.set("keepalive", settings.keepalive_timeout_seconds)
+            self.cfg.set("graceful_timeout", settings.graceful_shutdown_timeout_seconds)
+            self.cfg.set("loglevel", "info")
+
+        def load(self):
+            from app.main import app
+            return app
+
+    PreloadedApplication().run()
+
+
 if __name__ == "__main__":
     settings = get_settings()
-    
+    production = settings.environment == "production"
+    workers = settings.workers or os.cpu_count() or 1
+
     print("=" * 60)
     print("🚀 SlayFashion Backend API")
     print("=" * 60)
     print(f"📍 Host: {settings.host}")
     print(f"🔌 Port: {settings.port}")
+    print(f"🌍 Environment: {settings.environment}")
+    if production:
+        print(f"👷 Workers: {workers}{' (preloaded)' if settings.preload_app else ''}")
     print(f"📦 Shopify Store: {settings.shopify_store_domain}")
     print(f"📚 API Docs: http://{settings.host}:{settings.port}/docs")
     print("=" * 60)
-    
-    uvicorn.run(
-        "app.main:app",
-        host=settings.host,
-        port=settings.port,
-        reload=True,  # Enable auto-reload during development
-        log_level="info"
-    )
 
+    if production:
+        run_production(settings, workers)
+    else:
+        run_development(settings)
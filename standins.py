@@ -0,0 +1,612 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for Shopify and Twilio with latency and fault injection
+
+Usage:
+    python standins.py                                    # Shopify on :9001, Twilio on :9002
+    python standins.py --storefront-latency lognormal:400:0.8 --error-rate 0.05
+    python standins.py --slow-drip-rate 0.1 --drip-seconds 20 --only shopify
+
+Point the app at them with:
+    SHOPIFY_API_BASE_URL=http://127.0.0.1:9001
+    TWILIO_API_BASE_URL=http://127.0.0.1:9002
+
+Only the API subset the app uses is implemented: Admin GraphQL `customers`
+search (with cost extensions), REST customers.json create / update
+(including 422 taken and phone-rejected responses), Storefront
+customerAccessTokenCreate and Twilio Messages. Admin GraphQL and REST are
+throttled with leaky buckets like Shopify's.
+
+Latencies are distributions: fixed:MS, uniform:MIN_MS:MAX_MS,
+normal:MEAN_MS:STDDEV_MS, exponential:MEAN_MS, lognormal:MEDIAN_MS:SIGMA.
+
+Faults can be changed while running, e.g.:
+    curl -X POST localhost:9001/_standin/config -d '{"storefront": {"error_rate": 0.5}}'
+Counters are at GET /_standin/stats.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import re
+import secrets
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+# Shopify's standard-plan limits (Plus: GraphQL 2000/100, REST 400/20)
+DEFAULT_GRAPHQL_BUCKET = "1000:50"
+DEFAULT_REST_BUCKET = "40:2"
+CUSTOMER_SEARCH_COST = 3  # requestedQueryCost of the app's customers(first: 1) query
+
+E164 = re.compile(r"^\+\d{10,15}$")
+
+
+class LatencyDistribution:
+    """
+    Response delay drawn from a named distribution
+
+    Usage:
+        latency = LatencyDistribution.parse("lognormal:120:0.5")
+        await asyncio.sleep(latency.sample())
+    """
+
+    KINDS = {"fixed": 1, "uniform": 2, "normal": 2, "exponential": 1, "lognormal": 2}
+
+    def __init__(self, kind: str, *params: float):
+        if kind not in self.KINDS or len(params) != self.KINDS[kind]:
+            raise ValueError(f"Latency must be one of fixed:MS, uniform:MIN:MAX, normal:MEAN:SD, "
+                             f"exponential:MEAN, lognormal:MEDIAN:SIGMA (got {kind}:{params})")
+        self.kind = kind
+        self.params = params
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyDistribution":
+        kind, *params = spec.split(":")
+        return cls(kind, *(float(param) for param in params))
+
+    def sample(self) -> float:
+        """Seconds"""
+        if self.kind == "fixed":
+            ms = self.params[0]
+        elif self.kind == "uniform":
+            ms = random.uniform(*self.params)
+        elif self.kind == "normal":
+            ms = random.gauss(*self.params)
+        elif self.kind == "exponential":
+            ms = random.expovariate(1 / self.params[0]) if self.params[0] > 0 else 0.0
+        else:
+            ms = random.lognormvariate(math.log(max(self.params[0], 0.001)), self.params[1])
+        return max(0.0, ms) / 1000
+
+    def __str__(self) -> str:
+        return ":".join([self.kind, *(f"{param:g}" for param in self.params)])
+
+
+class Behaviour:
+    """Latency and injected faults of one API"""
+
+    FIELDS = ("latency", "error_rate", "error_status", "slow_drip_rate", "drip_seconds")
+
+    def __init__(
+        self,
+        latency: LatencyDistribution,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        slow_drip_rate: float = 0.0,
+        drip_seconds: float = 10.0
+    ):
+        """
+        Args:
+            latency: Delay before the response starts
+            error_rate: Share of calls answered with error_status
+            slow_drip_rate: Share of responses whose body is trickled out over drip_seconds
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.slow_drip_rate = slow_drip_rate
+        self.drip_seconds = drip_seconds
+
+    def update(self, changes: Dict[str, Any]):
+        for key, value in changes.items():
+            if key not in self.FIELDS:
+                raise ValueError(f"Unknown setting {key!r}")
+            setattr(self, key, LatencyDistribution.parse(value) if key == "latency" else type(getattr(self, key))(value))
+
+    def failed(self) -> bool:
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+    def respond(self, payload: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+        """JSON response, trickled out byte by byte for a share of calls"""
+        if not (self.slow_drip_rate and random.random() < self.slow_drip_rate):
+            return JSONResponse(payload, status_code=status_code, headers=headers)
+
+        body = json.dumps(payload).encode()
+        chunks = max(1, min(len(body), 20))
+        size = math.ceil(len(body) / chunks)
+
+        async def drip():
+            for start in range(0, len(body), size):
+                await asyncio.sleep(self.drip_seconds / chunks)
+                yield body[start:start + size]
+
+        return StreamingResponse(drip(), status_code=status_code, headers=headers, media_type="application/json")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: str(getattr(self, key)) if key == "latency" else getattr(self, key) for key in self.FIELDS}
+
+
+class LeakyBucket:
+    """Shopify-style leaky bucket: `maximum` units, refilled at `restore_rate` per second"""
+
+    def __init__(self, maximum: float, restore_rate: float):
+        self.maximum = maximum
+        self.restore_rate = restore_rate
+        self._available = maximum
+        self._updated_at = time.monotonic()
+
+    @classmethod
+    def parse(cls, spec: str) -> "LeakyBucket":
+        maximum, restore_rate = spec.split(":")
+        return cls(float(maximum), float(restore_rate))
+
+    def available(self) -> float:
+        now = time.monotonic()
+        self._available = min(self.maximum, self._available + (now - self._updated_at) * self.restore_rate)
+        self._updated_at = now
+        return self._available
+
+    def take(self, cost: float) -> bool:
+        """Consume `cost` units if available"""
+        if self.available() < cost:
+            return False
+        self._available -= cost
+        return True
+
+    def seconds_until(self, cost: float) -> float:
+        return max(0.0, (cost - self.available()) / self.restore_rate)
+
+
+class ShopifyStandIn:
+    """
+    In-memory Shopify store behind the Admin (GraphQL + REST) and Storefront APIs
+
+    Usage:
+        shopify = ShopifyStandIn(default_behaviour)
+        uvicorn.run(shopify.create_app(), port=9001)
+    """
+
+    def __init__(
+        self,
+        behaviour: Behaviour,
+        admin_graphql: Optional[Behaviour] = None,
+        admin_rest: Optional[Behaviour] = None,
+        storefront: Optional[Behaviour] = None,
+        graphql_bucket: Optional[LeakyBucket] = None,
+        rest_bucket: Optional[LeakyBucket] = None,
+        phone_reject_rate: float = 0.0
+    ):
+        """
+        Args:
+            behaviour: Used for any API without its own behaviour
+            graphql_bucket / rest_bucket: Throttling (None = unlimited)
+            phone_reject_rate: Share of REST creates whose phone is rejected as invalid
+        """
+        self.behaviours = {
+            "admin_graphql": admin_graphql or behaviour,
+            "admin_rest": admin_rest or behaviour,
+            "storefront": storefront or behaviour,
+        }
+        self.graphql_bucket = graphql_bucket
+        self.rest_bucket = rest_bucket
+        self.phone_reject_rate = phone_reject_rate
+
+        self._ids = itertools.count(7000000000)
+        self.customers: Dict[int, Dict[str, Any]] = {}
+        self.ids_by_email: Dict[str, int] = {}
+        self.ids_by_phone: Dict[str, int] = {}
+        self.calls: Counter = Counter()
+
+    # Customers
+
+    def _node(self, customer: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": f"gid://shopify/Customer/{customer['id']}",
+            "email": customer["email"],
+            "phone": customer.get("phone"),
+            "firstName": customer.get("first_name"),
+            "lastName": customer.get("last_name"),
+            "createdAt": customer["created_at"],
+            "updatedAt": customer["updated_at"],
+        }
+
+    def _search(self, search: str) -> Optional[Dict[str, Any]]:
+        """Supports the two searches the app makes: `phone:+91...` and `email:"..."`"""
+        field, _, value = search.partition(":")
+        value = value.strip().strip('"')
+        customer_id = self.ids_by_phone.get(value) if field == "phone" else self.ids_by_email.get(value)
+        return self.customers.get(customer_id)
+
+    # Throttling
+
+    def _call_limit_header(self) -> Dict[str, str]:
+        if self.rest_bucket is None:
+            return {"X-Shopify-Shop-Api-Call-Limit": "1/400"}
+        used = math.ceil(self.rest_bucket.maximum - self.rest_bucket.available())
+        return {"X-Shopify-Shop-Api-Call-Limit": f"{used}/{self.rest_bucket.maximum:g}"}
+
+    def _cost_extensions(self, requested: float, actual: float) -> Dict[str, Any]:
+        bucket = self.graphql_bucket
+        status = {
+            "maximumAvailable": bucket.maximum if bucket else 20000.0,
+            "currentlyAvailable": round(bucket.available()) if bucket else 20000,
+            "restoreRate": bucket.restore_rate if bucket else 1000.0,
+        }
+        return {"cost": {"requestedQueryCost": requested, "actualQueryCost": actual, "throttleStatus": status}}
+
+    # Handlers
+
+    async def _admin_graphql(self, request: Request) -> Response:
+        behaviour = self.behaviours["admin_graphql"]
+        if not request.headers.get("X-Shopify-Access-Token"):
+            return behaviour.respond({"errors": "[API] Invalid API key or access token"}, 401)
+        body = await request.json()
+        query, variables = body.get("query", ""), body.get("variables") or {}
+
+        if self.graphql_bucket is not None and not self.graphql_bucket.take(CUSTOMER_SEARCH_COST):
+            self.calls["admin_graphql.throttled"] += 1
+            return behaviour.respond({
+                "errors": [{"message": "Throttled", "extensions": {"code": "THROTTLED"}}],
+                "extensions": self._cost_extensions(CUSTOMER_SEARCH_COST, None),
+            })
+
+        if "customers(" not in query:
+            self.calls["admin_graphql.unsupported"] += 1
+            return behaviour.respond({"errors": [{"message": "Query not supported by the stand-in"}]})
+
+        self.calls["admin_graphql.ok"] += 1
+        customer = self._search(variables.get("query", ""))
+        return behaviour.respond({
+            "data": {"customers": {"edges": [{"node": self._node(customer)}] if customer else []}},
+            "extensions": self._cost_extensions(CUSTOMER_SEARCH_COST, CUSTOMER_SEARCH_COST - 1),
+        })
+
+    def _rest_throttled(self) -> Optional[Response]:
+        if self.rest_bucket is None or self.rest_bucket.take(1):
+            return None
+        self.calls["admin_rest.throttled"] += 1
+        return self.behaviours["admin_rest"].respond(
+            {"errors": "Exceeded 2 calls per second for api client. Reduce request rates to resume uninterrupted service."},
+            429,
+            {"Retry-After": f"{max(self.rest_bucket.seconds_until(1), 0.1):.1f}", **self._call_limit_header()}
+        )
+
+    async def _create_customer(self, request: Request) -> Response:
+        behaviour = self.behaviours["admin_rest"]
+        if not request.headers.get("X-Shopify-Access-Token"):
+            return behaviour.respond({"errors": "[API] Invalid API key or access token"}, 401)
+        throttled = self._rest_throttled()
+        if throttled is not None:
+            return throttled
+
+        fields = (await request.json()).get("customer", {})
+        email, phone = fields.get("email"), fields.get("phone")
+        errors = {}
+        if email in self.ids_by_email:
+            errors["email"] = ["has already been taken"]
+        if phone:
+            if phone in self.ids_by_phone:
+                errors["phone"] = ["has already been taken"]
+            elif not E164.match(phone) or (self.phone_reject_rate and random.random() < self.phone_reject_rate):
+                errors["phone"] = ["is invalid"]
+        if errors:
+            self.calls["admin_rest.create_rejected"] += 1
+            return behaviour.respond({"errors": errors}, 422, self._call_limit_header())
+
+        now = datetime.now(timezone.utc).isoformat()
+        customer = {
+            "id": next(self._ids),
+            "email": email,
+            "phone": phone,
+            "password": fields.get("password"),
+            "first_name": fields.get("first_name"),
+            "last_name": fields.get("last_name"),
+            "created_at": now,
+            "updated_at": now,
+        }
+        self.customers[customer["id"]] = customer
+        self.ids_by_email[email] = customer["id"]
+        if phone:
+            self.ids_by_phone[phone] = customer["id"]
+
+        self.calls["admin_rest.created"] += 1
+        return behaviour.respond({"customer": self._rest_customer(customer)}, 201, self._call_limit_header())
+
+    async def _update_customer(self, customer_id: int, request: Request) -> Response:
+        behaviour = self.behaviours["admin_rest"]
+        if not request.headers.get("X-Shopify-Access-Token"):
+            return behaviour.respond({"errors": "[API] Invalid API key or access token"}, 401)
+        throttled = self._rest_throttled()
+        if throttled is not None:
+            return throttled
+
+        customer = self.customers.get(customer_id)
+        if customer is None:
+            self.calls["admin_rest.not_found"] += 1
+            return behaviour.respond({"errors": "Not Found"}, 404, self._call_limit_header())
+
+        fields = (await request.json()).get("customer", {})
+        email = fields.get("email", customer["email"])
+        if email != customer["email"]:
+            if email in self.ids_by_email:
+                return behaviour.respond({"errors": {"email": ["has already been taken"]}}, 422, self._call_limit_header())
+            self.ids_by_email.pop(customer["email"], None)
+            self.ids_by_email[email] = customer_id
+        customer.update(email=email, updated_at=datetime.now(timezone.utc).isoformat())
+        if "password" in fields:
+            customer["password"] = fields["password"]
+
+        self.calls["admin_rest.updated"] += 1
+        return behaviour.respond({"customer": self._rest_customer(customer)}, 200, self._call_limit_header())
+
+    @staticmethod
+    def _rest_customer(customer: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": customer["id"],
+            "email": customer["email"],
+            "phone": customer["phone"],
+            "first_name": customer["first_name"],
+            "last_name": customer["last_name"],
+            "created_at": customer["created_at"],
+            "updated_at": customer["updated_at"],
+            "admin_graphql_api_id": f"gid://shopify/Customer/{customer['id']}",
+        }
+
+    async def _storefront(self, request: Request) -> Response:
+        behaviour = self.behaviours["storefront"]
+        if not request.headers.get("X-Shopify-Storefront-Access-Token"):
+            return behaviour.respond({"errors": [{"message": "Invalid Storefront access token"}]}, 401)
+        body = await request.json()
+        if "customerAccessTokenCreate" not in body.get("query", ""):
+            self.calls["storefront.unsupported"] += 1
+            return behaviour.respond({"errors": [{"message": "Query not supported by the stand-in"}]})
+
+        credentials = (body.get("variables") or {}).get("input", {})
+        customer = self.customers.get(self.ids_by_email.get(credentials.get("email")))
+        if customer is None or customer.get("password") != credentials.get("password"):
+            self.calls["storefront.unidentified"] += 1
+            payload = {"customerAccessToken": None, "customerUserErrors": [
+                {"code": "UNIDENTIFIED_CUSTOMER", "field": ["input", "password"], "message": "Unidentified customer"}
+            ]}
+        else:
+            self.calls["storefront.ok"] += 1
+            payload = {"customerAccessToken": {
+                "accessToken": secrets.token_hex(16),
+                "expiresAt": (datetime.now(timezone.utc) + timedelta(days=30)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            }, "customerUserErrors": []}
+        return behaviour.respond({"data": {"customerAccessTokenCreate": payload}})
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "customers": len(self.customers),
+            "calls": dict(self.calls),
+            "behaviours": {name: behaviour.to_dict() for name, behaviour in self.behaviours.items()},
+            "graphql_bucket_available": round(self.graphql_bucket.available(), 1) if self.graphql_bucket else None,
+            "rest_bucket_available": round(self.rest_bucket.available(), 1) if self.rest_bucket else None,
+        }
+
+    def create_app(self) -> FastAPI:
+        app = FastAPI(title="Shopify stand-in", docs_url=None, redoc_url=None)
+
+        async def guarded(api: str, handler, *args) -> Response:
+            behaviour = self.behaviours[api]
+            await asyncio.sleep(behaviour.latency.sample())
+            if behaviour.failed():
+                self.calls[f"{api}.injected_error"] += 1
+                return behaviour.respond({"errors": "Internal Server Error"}, behaviour.error_status)
+            return await handler(*args)
+
+        @app.post("/admin/api/{version}/graphql.json")
+        async def admin_graphql(version: str, request: Request):
+            return await guarded("admin_graphql", self._admin_graphql, request)
+
+        @app.post("/admin/api/{version}/customers.json")
+        async def create_customer(version: str, request: Request):
+            return await guarded("admin_rest", self._create_customer, request)
+
+        @app.put("/admin/api/{version}/customers/{customer_id}.json")
+        async def update_customer(version: str, customer_id: int, request: Request):
+            return await guarded("admin_rest", self._update_customer, customer_id, request)
+
+        @app.post("/api/{version}/graphql.json")
+        async def storefront(version: str, request: Request):
+            return await guarded("storefront", self._storefront, request)
+
+        add_control_routes(app, self.behaviours, self.get_stats)
+        return app
+
+
+class TwilioStandIn:
+    """
+    Twilio Messages API (`POST /2010-04-01/Accounts/{sid}/Messages.json`)
+
+    Usage:
+        twilio = TwilioStandIn(behaviour, max_rps=100)
+        uvicorn.run(twilio.create_app(), port=9002)
+    """
+
+    def __init__(self, behaviour: Behaviour, max_rps: float = 0):
+        """
+        Args:
+            max_rps: Messages accepted per second before 429s (0 = unlimited)
+        """
+        self.behaviours = {"messages": behaviour}
+        self.bucket = LeakyBucket(max_rps, max_rps) if max_rps else None
+        self.calls: Counter = Counter()
+        self.last_messages: Dict[str, str] = {}  # to -> latest body, for manual testing
+
+    @staticmethod
+    def _error(behaviour: Behaviour, status_code: int, code: int, message: str) -> Response:
+        return behaviour.respond({
+            "code": code,
+            "message": message,
+            "more_info": f"https://www.twilio.com/docs/errors/{code}",
+            "status": status_code,
+        }, status_code)
+
+    async def _create_message(self, account_sid: str, request: Request) -> Response:
+        behaviour = self.behaviours["messages"]
+        if self.bucket is not None and not self.bucket.take(1):
+            self.calls["messages.throttled"] += 1
+            return self._error(behaviour, 429, 20429, "Too Many Requests")
+
+        form = await request.form()
+        to, from_, body = form.get("To"), form.get("From"), form.get("Body")
+        if not to or not E164.match(to):
+            self.calls["messages.invalid_to"] += 1
+            return self._error(behaviour, 400, 21211, f"The 'To' number {to} is not a valid phone number.")
+        if not body:
+            return self._error(behaviour, 400, 21602, "Message body is required.")
+
+        self.calls["messages.ok"] += 1
+        self.last_messages[to] = body
+        if len(self.last_messages) > 10000:
+            self.last_messages.pop(next(iter(self.last_messages)))
+        now = datetime.now(timezone.utc).strftime("%a, %d %b %Y %H:%M:%S +0000")
+        return behaviour.respond({
+            "sid": f"SM{secrets.token_hex(16)}",
+            "account_sid": account_sid,
+            "to": to,
+            "from": from_,
+            "body": body,
+            "status": "queued",
+            "num_segments": "1",
+            "direction": "outbound-api",
+            "api_version": "2010-04-01",
+            "date_created": now,
+            "date_updated": now,
+            "price": None,
+            "error_code": None,
+            "error_message": None,
+            "uri": f"/2010-04-01/Accounts/{account_sid}/Messages.json",
+        }, 201)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "calls": dict(self.calls),
+            "behaviours": {name: behaviour.to_dict() for name, behaviour in self.behaviours.items()},
+        }
+
+    def create_app(self) -> FastAPI:
+        app = FastAPI(title="Twilio stand-in", docs_url=None, redoc_url=None)
+
+        @app.post("/2010-04-01/Accounts/{account_sid}/Messages.json")
+        async def create_message(account_sid: str, request: Request):
+            behaviour = self.behaviours["messages"]
+            await asyncio.sleep(behaviour.latency.sample())
+            if behaviour.failed():
+                self.calls["messages.injected_error"] += 1
+                return self._error(behaviour, behaviour.error_status, 20500, "Internal Server Error")
+            return await self._create_message(account_sid, request)
+
+        @app.get("/_standin/messages/{phone}")
+        async def last_message(phone: str):
+            """Latest SMS body sent to a number (read the OTP when testing by hand)"""
+            return {"to": phone, "body": self.last_messages.get(phone)}
+
+        add_control_routes(app, self.behaviours, self.get_stats)
+        return app
+
+
+def add_control_routes(app: FastAPI, behaviours: Dict[str, Behaviour], get_stats):
+    """GET /_standin/stats and POST /_standin/config ({"api": {"error_rate": 0.5, ...}})"""
+
+    @app.get("/_standin/stats")
+    async def stats():
+        return get_stats()
+
+    @app.post("/_standin/config")
+    async def config(request: Request):
+        changes = await request.json()
+        try:
+            for name, fields in changes.items():
+                if name not in behaviours:
+                    raise ValueError(f"Unknown API {name!r} (one of {', '.join(behaviours)})")
+                behaviours[name].update(fields)
+        except (ValueError, TypeError) as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        return {name: behaviour.to_dict() for name, behaviour in behaviours.items()}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Local Shopify and Twilio stand-ins")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--shopify-port", type=int, default=9001)
+    parser.add_argument("--twilio-port", type=int, default=9002)
+    parser.add_argument("--only", choices=["shopify", "twilio"], help="Run just one stand-in")
+    parser.add_argument("--admin-latency", default="lognormal:120:0.5", help="Admin GraphQL latency")
+    parser.add_argument("--rest-latency", default="lognormal:150:0.5", help="Admin REST latency")
+    parser.add_argument("--storefront-latency", default="lognormal:200:0.6", help="Storefront latency")
+    parser.add_argument("--twilio-latency", default="lognormal:300:0.5", help="Twilio Messages latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of calls answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--slow-drip-rate", type=float, default=0.0, help="Share of responses trickled out slowly")
+    parser.add_argument("--drip-seconds", type=float, default=10.0, help="How long a slow-drip body takes")
+    parser.add_argument("--phone-reject-rate", type=float, default=0.0, help="Share of REST creates with the phone rejected")
+    parser.add_argument("--graphql-bucket", default=DEFAULT_GRAPHQL_BUCKET, help="Admin GraphQL cost bucket MAX:RESTORE_PER_SECOND")
+    parser.add_argument("--rest-bucket", default=DEFAULT_REST_BUCKET, help="Admin REST bucket MAX:RESTORE_PER_SECOND")
+    parser.add_argument("--no-throttle", action="store_true", help="Disable Shopify throttling")
+    parser.add_argument("--twilio-max-rps", type=float, default=0, help="Twilio messages per second before 429s (0 = unlimited)")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible fault sequences")
+    return parser.parse_args(argv)
+
+
+def build_standins(args) -> Tuple[ShopifyStandIn, TwilioStandIn]:
+    def behaviour(latency: str) -> Behaviour:
+        return Behaviour(
+            LatencyDistribution.parse(latency),
+            error_rate=args.error_rate,
+            error_status=args.error_status,
+            slow_drip_rate=args.slow_drip_rate,
+            drip_seconds=args.drip_seconds
+        )
+
+    shopify = ShopifyStandIn(
+        behaviour(args.admin_latency),
+        admin_rest=behaviour(args.rest_latency),
+        storefront=behaviour(args.storefront_latency),
+        graphql_bucket=None if args.no_throttle else LeakyBucket.parse(args.graphql_bucket),
+        rest_bucket=None if args.no_throttle else LeakyBucket.parse(args.rest_bucket),
+        phone_reject_rate=args.phone_reject_rate
+    )
+    twilio = TwilioStandIn(behaviour(args.twilio_latency), max_rps=args.twilio_max_rps)
+    return shopify, twilio
+
+
+async def main():
+    import uvicorn
+
+    args = parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+    shopify, twilio = build_standins(args)
+
+    servers = []
+    if args.only != "twilio":
+        servers.append(uvicorn.Server(uvicorn.Config(shopify.create_app(), host=args.host, port=args.shopify_port, log_level="warning")))
+        print(f"🛍️ Shopify stand-in: SHOPIFY_API_BASE_URL=http://{args.host}:{args.shopify_port}")
+    if args.only != "shopify":
+        servers.append(uvicorn.Server(uvicorn.Config(twilio.create_app(), host=args.host, port=args.twilio_port, log_level="warning")))
+        print(f"📱 Twilio stand-in: TWILIO_API_BASE_URL=http://{args.host}:{args.twilio_port}")
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -111,18 +111,15 @@ async def test_bridge_method():
     shopify_service = ShopifyService()
     
     try:
-        customer_record, access_token, expires_at = await shopify_service.find_or_create_customer(
-            test_phone, db
-        )
+        customer, access_token, expires_at = await shopify_service.find_or_create_customer(test_phone)
         
         print("✅ Bridge Method Successful!")
         print()
         print("📋 Customer Record in Our Database:")
-        print(f"   ID: {customer_record.id}")
-        print(f"   Phone: {customer_record.phone}")
-        print(f"   Shopify Customer ID: {customer_record.shopify_customer_id}")
-        print(f"   Hidden Email: {customer_record.shopify_email}")
-        print(f"   Hidden Password: {customer_record.shopify_password}")
+        print(f"   ID: {customer.id}")
+        print(f"   Phone: {customer.phone}")
+        print(f"   Shopify Customer ID: {customer.shopify_customer_id}")
+        print(f"   Hidden Email: {customer.email}")
         print()
         print("🎫 Shopify Customer Access Token:")
         print(f"   Token: {access_token[:50]}...")
@@ -0,0 +1,45 @@
+"""
+Shared test setup
+
+Settings are read at import time, so placeholders are set before any app
+module is imported. Nothing here talks to Shopify, Twilio or a real Redis.
+"""
+import os
+import tempfile
+
+import pytest
+
+TEST_ENV = {
+    "SHOPIFY_STORE_DOMAIN": "test-store.myshopify.com",
+    "SHOPIFY_ADMIN_API_TOKEN": "shpat_test",
+    "SHOPIFY_STOREFRONT_ACCESS_TOKEN": "storefront_test",
+    "TWILIO_ACCOUNT_SID": "AC00000000000000000000000000000000",
+    "TWILIO_AUTH_TOKEN": "test",
+    "TWILIO_PHONE_NUMBER": "+15550000000",
+    "JWT_SECRET_KEY": "test",
+    "DATABASE_URL": f"sqlite:///{os.path.join(tempfile.gettempdir(), 'slayfashion_pytest.db')}",
+    "RATE_LIMIT_BACKEND": "memory",
+    "OTP_STORE_BACKEND": "sql",
+}
+for key, value in TEST_ENV.items():
+    os.environ.setdefault(key, value)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def session_factory(tmp_path):
+    """Async sessions on a fresh SQLite database with the current schema"""
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+    from app.database import Base
+    import app.models  # noqa: F401 - registers the tables
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    await engine.dispose()
@@ -0,0 +1,58 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app import dependencies
+from app.database import init_db
+from app.dependencies import get_customer_filter
+from app.routers import customer
+from app.utils.rate_limiter import RateLimiter
+
+pytestmark = pytest.mark.anyio
+
+API_KEY = "internal-test-key"
+BODY = {"phones": ["+919876543210"], "include_profile": True}
+
+
+@pytest.fixture
+async def client(monkeypatch):
+    init_db()
+    monkeypatch.setattr(dependencies.settings, "internal_api_key", API_KEY)
+    monkeypatch.setattr(customer, "batch_lookup_rate_limiter", RateLimiter(max_requests=2, window_seconds=600))
+
+    app = FastAPI()
+    app.include_router(customer.router)
+    app.dependency_overrides[get_customer_filter] = lambda: None
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def test_requires_api_key(client):
+    missing = await client.post("/api/customer/batch-lookup", json=BODY)
+    wrong = await client.post("/api/customer/batch-lookup", json=BODY, headers={"X-API-Key": "guess"})
+
+    assert missing.status_code == 401
+    assert wrong.status_code == 401
+
+
+async def test_disabled_without_configured_key(client, monkeypatch):
+    monkeypatch.setattr(dependencies.settings, "internal_api_key", None)
+
+    response = await client.post("/api/customer/batch-lookup", json=BODY, headers={"X-API-Key": API_KEY})
+
+    assert response.status_code == 403
+
+
+async def test_rate_limited_per_client(client):
+    headers = {"X-API-Key": API_KEY}
+    statuses = [(await client.post("/api/customer/batch-lookup", json=BODY, headers=headers)).status_code for _ in range(3)]
+
+    assert statuses == [200, 200, 429]
+
+
+async def test_rejects_batches_over_the_cap(client):
+    phones = [f"+9198765{i:05d}" for i in range(customer.settings.customer_batch_max_phones + 1)]
+
+    response = await client.post("/api/customer/batch-lookup", json={"phones": phones}, headers={"X-API-Key": API_KEY})
+
+    assert response.status_code == 422
@@ -0,0 +1,106 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.utils import circuit_breaker
+from app.utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(circuit_breaker, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def make_breaker() -> CircuitBreaker:
+    return CircuitBreaker(
+        "storefront", failure_rate_threshold=0.5, minimum_calls=4, window_seconds=30, open_seconds=15, half_open_max_calls=2
+    )
+
+
+def call(breaker: CircuitBreaker, ok: bool):
+    breaker.before_call()
+    breaker.record_success() if ok else breaker.record_failure()
+
+
+def trip(breaker: CircuitBreaker):
+    for ok in (True, True, False, False):
+        call(breaker, ok)
+
+
+def test_opens_once_failure_rate_reaches_threshold(clock):
+    breaker = make_breaker()
+
+    for ok in (True, True, False):
+        call(breaker, ok)
+    # Too few calls to trust the rate yet
+    assert breaker.state == CLOSED
+
+    call(breaker, False)
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert error.value.retry_after == 15
+    assert breaker.get_stats()["rejected"] == 1
+
+
+def test_failures_outside_the_window_are_forgotten(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        call(breaker, False)
+
+    clock.now += 31
+    call(breaker, True)
+    call(breaker, False)
+
+    assert breaker.state == CLOSED
+    assert breaker.get_stats()["window_calls"] == 2
+
+
+def test_full_cycle_closed_open_half_open_closed(clock):
+    breaker = make_breaker()
+    trip(breaker)
+
+    clock.now += 14
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock.now += 1
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    breaker.before_call()
+    # Only half_open_max_calls probes at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.get_stats()["window_calls"] == 0
+    assert breaker.get_stats()["transitions"] == {"closed->open": 1, "open->half_open": 1, "half_open->closed": 1}
+
+
+def test_failed_probe_reopens_for_another_cool_down(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 15
+
+    call(breaker, False)
+
+    assert breaker.state == OPEN
+    assert breaker.retry_after() == 15
+
+
+def test_released_probe_frees_its_slot(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 15
+    breaker.before_call()
+    breaker.before_call()
+
+    # e.g. a hedged call that lost the race and was cancelled
+    breaker.release()
+    breaker.before_call()
+
+    assert breaker.state == HALF_OPEN
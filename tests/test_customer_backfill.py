@@ -0,0 +1,148 @@
+import json
+
+import httpx
+import pytest
+from sqlalchemy import select
+
+from app.models import Customer
+from app.services.customer_backfill import BackfillCheckpoint, CustomerBackfill
+
+pytestmark = pytest.mark.anyio
+
+JSONL_URL = "https://storage.example.com/export.jsonl"
+
+
+def export_line(i: int) -> dict:
+    return {
+        "id": f"gid://shopify/Customer/{i}",
+        "phone": f"+9198765{i:05d}",
+        "email": f"customer{i}@example.com",
+        "firstName": f"Customer {i}",
+    }
+
+
+def export(count: int) -> bytes:
+    """A bulk export with one nested object and one customer without a phone mixed in"""
+    lines = [export_line(i) for i in range(count)]
+    lines.insert(1, {"id": "gid://shopify/MailingAddress/1", "__parentId": "gid://shopify/Customer/0"})
+    lines.insert(3, {"id": "gid://shopify/Customer/999", "phone": None})
+    # Bulk exports end without a trailing newline
+    return "\n".join(json.dumps(line) for line in lines).encode()
+
+
+class ExportServer:
+    """Serves a JSONL file in small chunks, honouring Range unless told not to"""
+
+    def __init__(self, body: bytes, chunk_size: int = 7, supports_range: bool = True):
+        self.body = body
+        self.chunk_size = chunk_size
+        self.supports_range = supports_range
+        self.range_headers = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.range_headers.append(request.headers.get("Range"))
+        body, status = self.body, 200
+        if self.supports_range and request.headers.get("Range"):
+            offset = int(request.headers["Range"][len("bytes="):-1])
+            body, status = self.body[offset:], 206
+
+        async def chunks():
+            for start in range(0, len(body), self.chunk_size):
+                yield body[start:start + self.chunk_size]
+
+        return httpx.Response(status, content=chunks())
+
+    @property
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handler)
+
+
+def make_backfill(session_factory, tmp_path, server: ExportServer, batch_size: int = 2) -> CustomerBackfill:
+    checkpoint = BackfillCheckpoint(str(tmp_path / "checkpoint.json"))
+    return CustomerBackfill(None, session_factory, checkpoint, batch_size=batch_size, transport=server.transport)
+
+
+async def stored_customers(session_factory) -> dict:
+    async with session_factory() as db:
+        rows = (await db.execute(select(Customer.phone, Customer.shopify_customer_id))).all()
+    return dict(rows)
+
+
+async def test_lines_split_across_chunks_are_parsed_whole(session_factory, tmp_path):
+    body = export(5)
+    server = ExportServer(body, chunk_size=7)
+    backfill = make_backfill(session_factory, tmp_path, server)
+
+    streamed = [(position, line) async for position, line in backfill.stream_jsonl(JSONL_URL)]
+
+    assert [line for _, line in streamed] == body.split(b"\n")
+    assert streamed[-1][0] == len(body)
+
+    result = await backfill.run(jsonl_url=JSONL_URL)
+
+    assert result["lines"] == 7
+    assert result["inserted"] == 5
+    assert result["skipped"] == 2
+    assert await stored_customers(session_factory) == {
+        line["phone"]: line["id"] for line in map(export_line, range(5))
+    }
+
+
+@pytest.mark.parametrize("supports_range", [True, False])
+async def test_interrupted_run_resumes_at_checkpointed_offset(session_factory, tmp_path, supports_range):
+    body = export(6)
+    server = ExportServer(body, supports_range=supports_range)
+    backfill = make_backfill(session_factory, tmp_path, server)
+
+    inserts = 0
+    insert_batch = backfill.insert_batch
+
+    async def fail_on_second_batch(rows):
+        nonlocal inserts
+        inserts += 1
+        if inserts == 2:
+            raise ConnectionError("database went away")
+        return await insert_batch(rows)
+
+    backfill.insert_batch = fail_on_second_batch
+    with pytest.raises(ConnectionError):
+        await backfill.run(jsonl_url=JSONL_URL)
+
+    # The first batch (two customers, plus the skipped lines read with them) is committed and checkpointed
+    offset = backfill.checkpoint.state["offset"]
+    lines_done = body[:offset].count(b"\n")
+    assert body[offset - 1:offset] == b"\n"
+    assert len(await stored_customers(session_factory)) == 2
+
+    resumed = make_backfill(session_factory, tmp_path, server)
+    result = await resumed.run(jsonl_url=JSONL_URL)
+
+    assert server.range_headers[-1] == f"bytes={offset}-"
+    assert result["lines"] == 8 - lines_done
+    assert result["inserted"] == 4
+    assert len(await stored_customers(session_factory)) == 6
+    assert resumed.checkpoint.state["completed"] is True
+
+
+async def test_existing_customers_are_left_alone_and_reruns_insert_nothing(session_factory, tmp_path):
+    existing = export_line(2)
+    async with session_factory() as db:
+        db.add(Customer(phone=existing["phone"], shopify_customer_id=existing["id"], shopify_password="known"))
+        await db.commit()
+
+    server = ExportServer(export(4))
+    first = await make_backfill(session_factory, tmp_path, server).run(jsonl_url=JSONL_URL)
+
+    assert first["inserted"] == 3
+    assert first["skipped"] == 3
+
+    # A fresh checkpoint replays every batch
+    (tmp_path / "checkpoint.json").unlink()
+    again = await make_backfill(session_factory, tmp_path, server).run(jsonl_url=JSONL_URL)
+
+    assert again["inserted"] == 0
+    assert again["skipped"] == 6
+    assert len(await stored_customers(session_factory)) == 4
+    async with session_factory() as db:
+        kept = (await db.execute(select(Customer).where(Customer.phone == existing["phone"]))).scalar_one()
+    assert kept.shopify_password == "known"
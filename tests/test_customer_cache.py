@@ -0,0 +1,57 @@
+import pytest
+
+from app.models import Customer
+from app.routers.customer import load_customer
+from app.schemas import CustomerData
+from app.utils.customer_cache import CustomerCache
+
+pytestmark = pytest.mark.anyio
+
+PHONE = "+919876543210"
+
+
+def profile(phone: str = PHONE) -> CustomerData:
+    return CustomerData(id="1", phone=phone, shopify_customer_id="gid://shopify/Customer/1")
+
+
+async def test_signup_on_another_worker_is_seen_immediately(session_factory):
+    cache = CustomerCache()
+
+    async with session_factory() as db:
+        assert await load_customer(PHONE, db, cache) is None
+
+    # Another worker stores the customer; this worker's cache is never told
+    async with session_factory() as db:
+        db.add(Customer(phone=PHONE, shopify_customer_id="gid://shopify/Customer/1"))
+        await db.commit()
+
+    async with session_factory() as db:
+        customer = await load_customer(PHONE, db, cache)
+
+    assert customer is not None and customer.shopify_customer_id == "gid://shopify/Customer/1"
+    assert cache.get(PHONE) == customer
+
+
+def test_expired_entries_are_misses(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.utils.customer_cache.time.monotonic", lambda: now[0])
+    cache = CustomerCache(ttl_seconds=300)
+    cache.put(PHONE, profile())
+
+    now[0] += 299
+    assert cache.get(PHONE) is not None
+    now[0] += 2
+    assert cache.get(PHONE) is None
+    assert cache.get_stats()["expirations"] == 1
+
+
+def test_least_recently_used_is_evicted():
+    cache = CustomerCache(max_size=2)
+    cache.put("+911", profile("+911"))
+    cache.put("+912", profile("+912"))
+    cache.get("+911")
+    cache.put("+913", profile("+913"))
+
+    assert cache.get("+912") is None
+    assert cache.get("+911") is not None
+    assert cache.get_stats()["evictions"] == 1
@@ -0,0 +1,126 @@
+import fakeredis
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from app.models import Customer
+from app.services.customer_filter import CustomerPhoneFilter
+from app.utils.bloom_filter import BloomFilter
+
+pytestmark = pytest.mark.anyio
+
+EXISTING = "+919876543210"
+UNKNOWN = "+919000000000"
+
+
+@pytest.fixture
+async def redis_client():
+    client = fakeredis.FakeAsyncRedis()
+    yield client
+    await client.aclose()
+
+
+async def insert_customer(session_factory, phone: str):
+    async with session_factory() as db:
+        db.add(Customer(phone=phone, shopify_customer_id=f"gid://shopify/Customer/{phone}"))
+        await db.commit()
+
+
+async def make_filter(session_factory, redis_client) -> CustomerPhoneFilter:
+    phone_filter = CustomerPhoneFilter(engine=session_factory.kw["bind"], redis_client=redis_client)
+    await phone_filter.rebuild()
+    return phone_filter
+
+
+def test_bloom_filter_has_no_false_negatives_and_bounded_false_positives():
+    bloom = BloomFilter(capacity=10000, error_rate=0.01)
+    added = [f"+9198{i:08d}" for i in range(10000)]
+    for phone in added:
+        bloom.add(phone)
+
+    assert all(bloom.might_contain(phone) for phone in added)
+    false_positives = sum(bloom.might_contain(f"+9197{i:08d}") for i in range(10000))
+    assert false_positives < 300
+
+
+async def test_miss_is_definite_while_filter_is_current(session_factory, redis_client):
+    await insert_customer(session_factory, EXISTING)
+    phone_filter = await make_filter(session_factory, redis_client)
+
+    assert await phone_filter.might_contain(EXISTING)
+    assert not await phone_filter.might_contain(UNKNOWN)
+    assert phone_filter.get_stats()["definite_negatives"] == 1
+
+
+async def test_insert_on_another_worker_is_never_a_definite_negative(session_factory, redis_client):
+    worker_a = await make_filter(session_factory, redis_client)
+    worker_b = await make_filter(session_factory, redis_client)
+
+    # Worker B stores a customer; worker A has not scanned it yet
+    await insert_customer(session_factory, EXISTING)
+    await worker_b.add(EXISTING)
+
+    assert await worker_a.might_contain(EXISTING)
+    assert worker_a.get_stats()["unconfirmed_negatives"] == 1
+    assert worker_a._refresh_requested.is_set()
+
+    # The catch-up scan makes A current again, so misses are definite once more
+    await worker_a.refresh()
+    assert worker_a.bloom.might_contain(EXISTING)
+    assert not await worker_a.might_contain(UNKNOWN)
+
+
+async def test_own_insert_keeps_filter_current(session_factory, redis_client):
+    phone_filter = await make_filter(session_factory, redis_client)
+
+    await insert_customer(session_factory, EXISTING)
+    await phone_filter.add(EXISTING)
+
+    assert await phone_filter.might_contain(EXISTING)
+    assert not await phone_filter.might_contain(UNKNOWN)
+
+
+async def test_out_of_band_inserts_are_announced(session_factory, redis_client):
+    phone_filter = await make_filter(session_factory, redis_client)
+
+    # e.g. the backfill inserting a batch from another process
+    await insert_customer(session_factory, EXISTING)
+    await CustomerPhoneFilter(engine=session_factory.kw["bind"], redis_client=redis_client).record_inserts()
+
+    assert await phone_filter.might_contain(EXISTING)
+
+
+async def test_batch_misses_fall_through_together(session_factory, redis_client):
+    worker_a = await make_filter(session_factory, redis_client)
+    await insert_customer(session_factory, EXISTING)
+    await CustomerPhoneFilter(engine=session_factory.kw["bind"], redis_client=redis_client).record_inserts()
+
+    assert await worker_a.might_contain_many([EXISTING, UNKNOWN]) == {EXISTING, UNKNOWN}
+    await worker_a.refresh()
+    assert await worker_a.might_contain_many([EXISTING, UNKNOWN]) == {EXISTING}
+
+
+class _UnreachableRedis:
+    async def get(self, key):
+        raise RedisConnectionError("connection refused")
+
+    async def incr(self, key):
+        raise RedisConnectionError("connection refused")
+
+
+async def test_misses_fall_through_when_redis_is_unavailable(session_factory):
+    phone_filter = await make_filter(session_factory, _UnreachableRedis())
+
+    assert await phone_filter.might_contain(UNKNOWN)
+    assert phone_filter.get_stats()["redis_errors"] >= 1
+
+
+async def test_misses_fall_through_without_redis(session_factory):
+    phone_filter = await make_filter(session_factory, None)
+
+    assert await phone_filter.might_contain(UNKNOWN)
+
+
+async def test_every_phone_is_possible_before_first_build(session_factory, redis_client):
+    phone_filter = CustomerPhoneFilter(engine=session_factory.kw["bind"], redis_client=redis_client)
+
+    assert await phone_filter.might_contain(UNKNOWN)
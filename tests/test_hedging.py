@@ -0,0 +1,122 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.services import shopify_service
+from app.services.shopify_service import ShopifyService
+from app.utils.circuit_breaker import CLOSED
+from app.utils.hedging import HedgePolicy
+
+pytestmark = pytest.mark.anyio
+
+HEDGE_DELAY = 0.02
+
+
+class SlowThenFast:
+    """fn() for HedgePolicy: the first call hangs until cancelled, later calls answer at once"""
+
+    def __init__(self):
+        self.calls = 0
+        self.cancelled = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.calls > 1:
+            return f"answer {self.calls}"
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return "answer 1"
+
+
+async def test_fast_call_is_not_hedged():
+    hedge = HedgePolicy(initial_delay_seconds=1.0)
+
+    async def fast():
+        return "ok"
+
+    assert await hedge.run(fast) == "ok"
+    assert hedge.get_stats()["hedges_sent"] == 0
+
+
+async def test_slow_call_is_hedged_and_loser_cancelled():
+    hedge = HedgePolicy(initial_delay_seconds=HEDGE_DELAY)
+    fn = SlowThenFast()
+
+    assert await hedge.run(fn) == "answer 2"
+
+    assert fn.calls == 2 and fn.cancelled == 1
+    stats = hedge.get_stats()
+    assert stats["hedges_sent"] == 1 and stats["hedge_wins"] == 1
+
+
+async def test_cancelled_caller_cancels_every_attempt():
+    hedge = HedgePolicy(initial_delay_seconds=HEDGE_DELAY)
+    cancelled = []
+
+    async def hang():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    task = asyncio.ensure_future(hedge.run(hang))
+    await asyncio.sleep(HEDGE_DELAY * 3)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert len(cancelled) == 2
+
+
+async def test_error_from_one_attempt_waits_for_the_other():
+    hedge = HedgePolicy(initial_delay_seconds=HEDGE_DELAY)
+    calls = []
+
+    async def fn():
+        calls.append(True)
+        if len(calls) == 1:
+            await asyncio.sleep(HEDGE_DELAY * 2)
+            raise httpx.ConnectTimeout("slow primary")
+        await asyncio.sleep(HEDGE_DELAY * 4)
+        return "hedge"
+
+    assert await hedge.run(fn) == "hedge"
+
+
+async def test_hedged_multipass_mint_cancels_the_slow_attempt(monkeypatch):
+    monkeypatch.setattr(shopify_service.settings, "shopify_token_hedging_enabled", True)
+    monkeypatch.setattr(shopify_service.settings, "shopify_multipass_secret", "multipass-secret")
+    service = ShopifyService()
+    service.token_hedge = HedgePolicy(initial_delay_seconds=HEDGE_DELAY)
+    tokens = []
+    cancelled = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        tokens.append(json.loads(request.content)["variables"]["multipassToken"])
+        if len(tokens) == 1:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+        payload = {"customerAccessToken": {"accessToken": "token", "expiresAt": "2030-01-01T00:00:00Z"}, "customerUserErrors": []}
+        return httpx.Response(200, json={"data": {"customerAccessTokenCreateWithMultipass": payload}})
+
+    service.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    assert await service.create_customer_access_token_with_multipass("customer@example.com") == (
+        "token", "2030-01-01T00:00:00Z"
+    )
+
+    # Multipass tokens are single use, so the hedge signed its own
+    assert len(tokens) == 2 and tokens[0] != tokens[1]
+    assert cancelled == [True]
+    # The cancelled attempt is neither a success nor a failure for the breaker
+    assert service.storefront_breaker.state == CLOSED
+    assert service.storefront_breaker.get_stats()["window_calls"] == 1
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from app.services.otp_service import OTPService
+from app.services.otp_store import MemoryOTPStore
+from app.services.sms_dispatcher import SMSDispatcher, SMSQueueFullError
+
+pytestmark = pytest.mark.anyio
+
+PHONE = "+919876543210"
+
+
+class RecordingStore(MemoryOTPStore):
+    """Memory store that lets a test act while create() is in progress"""
+
+    def __init__(self, during_create=None):
+        super().__init__()
+        self.during_create = during_create
+        self.created = []
+
+    async def create(self, phone, otp_code, session_id, ttl_seconds):
+        if self.during_create is not None:
+            await self.during_create()
+        self.created.append(session_id)
+        await super().create(phone, otp_code, session_id, ttl_seconds)
+
+
+async def test_full_queue_rejects_before_storing():
+    dispatcher = SMSDispatcher(max_queue_size=1)
+    dispatcher.enqueue("+919000000000", "earlier message")
+    store = RecordingStore()
+    service = OTPService(dispatcher=dispatcher, store=store)
+
+    with pytest.raises(SMSQueueFullError):
+        await service.send_otp(PHONE)
+
+    assert store.created == []
+
+
+async def test_queue_filling_during_store_write_does_not_fail_the_request():
+    dispatcher = SMSDispatcher(max_queue_size=1)
+
+    async def another_request_tries_to_queue():
+        with pytest.raises(SMSQueueFullError):
+            dispatcher.enqueue("+919000000000", "competing message")
+        await asyncio.sleep(0)
+
+    store = RecordingStore(during_create=another_request_tries_to_queue)
+    service = OTPService(dispatcher=dispatcher, store=store)
+
+    success, _, session_id = await service.send_otp(PHONE)
+
+    assert success
+    assert store.created == [session_id]
+    assert dispatcher.get_stats()["queue_depth"] == 1
+    assert dispatcher.get_stats()["reserved_slots"] == 0
+
+
+async def test_failed_store_write_releases_the_slot():
+    async def store_unavailable():
+        raise RuntimeError("database unavailable")
+
+    dispatcher = SMSDispatcher(max_queue_size=1)
+    service = OTPService(dispatcher=dispatcher, store=RecordingStore(during_create=store_unavailable))
+
+    success, message, _ = await service.send_otp(PHONE)
+
+    assert not success and "database unavailable" in message
+    assert dispatcher.get_stats()["reserved_slots"] == 0
+    dispatcher.enqueue(PHONE, "slot is free again")
@@ -0,0 +1,89 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from app.services.otp_store import MAX_ATTEMPTS, MemoryOTPStore, RedisOTPStore, SQLOTPStore
+
+pytestmark = pytest.mark.anyio
+
+PHONE = "+919876543210"
+SESSION = "session-1"
+CODE = "123456"
+TTL = 300
+
+
+@pytest.fixture(params=["sql", "memory", "redis"])
+async def store(request, session_factory):
+    if request.param == "sql":
+        store = SQLOTPStore(session_factory)
+    elif request.param == "memory":
+        store = MemoryOTPStore()
+    else:
+        store = RedisOTPStore(fakeredis.FakeAsyncRedis())
+    await store.startup()
+    yield store
+    await store.shutdown()
+
+
+async def test_correct_code_verifies_once(store):
+    await store.create(PHONE, CODE, SESSION, TTL)
+
+    assert await store.verify(PHONE, SESSION, CODE) == (True, "OTP verified successfully")
+    assert await store.verify(PHONE, SESSION, CODE) == (False, "OTP already used")
+
+
+async def test_concurrent_verifies_succeed_exactly_once(store):
+    await store.create(PHONE, CODE, SESSION, TTL)
+
+    results = await asyncio.gather(*(store.verify(PHONE, SESSION, CODE) for _ in range(20)))
+
+    assert sum(success for success, _ in results) == 1
+    assert {message for success, message in results if not success} == {"OTP already used"}
+
+
+async def test_wrong_codes_count_attempts(store):
+    await store.create(PHONE, CODE, SESSION, TTL)
+
+    messages = [(await store.verify(PHONE, SESSION, "000000"))[1] for _ in range(MAX_ATTEMPTS + 1)]
+
+    assert messages[:MAX_ATTEMPTS] == [
+        f"Invalid OTP code. {MAX_ATTEMPTS - attempt} attempts remaining" for attempt in range(1, MAX_ATTEMPTS + 1)
+    ]
+    assert messages[-1] == "Too many attempts. Please request a new OTP"
+    # The limit also locks out the right code
+    assert await store.verify(PHONE, SESSION, CODE) == (False, "Too many attempts. Please request a new OTP")
+
+
+async def test_concurrent_wrong_codes_never_exceed_limit(store):
+    await store.create(PHONE, CODE, SESSION, TTL)
+
+    results = await asyncio.gather(*(store.verify(PHONE, SESSION, "000000") for _ in range(3 * MAX_ATTEMPTS)))
+
+    counted = [message for _, message in results if message.startswith("Invalid OTP code")]
+    assert len(counted) == MAX_ATTEMPTS
+    assert sorted(counted) == sorted(
+        f"Invalid OTP code. {MAX_ATTEMPTS - attempt} attempts remaining" for attempt in range(1, MAX_ATTEMPTS + 1)
+    )
+    assert await store.verify(PHONE, SESSION, CODE) == (False, "Too many attempts. Please request a new OTP")
+
+
+async def test_new_otp_invalidates_previous(store):
+    await store.create(PHONE, CODE, SESSION, TTL)
+    await store.create(PHONE, "654321", "session-2", TTL)
+
+    assert await store.verify(PHONE, SESSION, CODE) == (False, "OTP already used")
+    assert await store.verify(PHONE, "session-2", "654321") == (True, "OTP verified successfully")
+
+
+async def test_unknown_session_or_phone(store):
+    await store.create(PHONE, CODE, SESSION, TTL)
+
+    assert await store.verify(PHONE, "missing", CODE) == (False, "Invalid session or phone number")
+    assert await store.verify("+919000000000", SESSION, CODE) == (False, "Invalid session or phone number")
+
+
+async def test_expired_otp_is_rejected(store):
+    await store.create(PHONE, CODE, SESSION, -1)
+
+    assert await store.verify(PHONE, SESSION, CODE) == (False, "OTP has expired")
@@ -0,0 +1,176 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from app.utils import rate_limiter
+from app.utils.rate_limiter import RateLimiter, LocalRateLimitBackend, RedisRateLimitBackend
+
+pytestmark = pytest.mark.anyio
+
+WINDOW = 3600
+
+
+@pytest.fixture
+async def redis_client():
+    client = fakeredis.FakeAsyncRedis()
+    yield client
+    await client.aclose()
+
+
+@pytest.fixture
+def redis_backend(redis_client):
+    return RedisRateLimitBackend(redis_client, prefix="test")
+
+
+async def test_redis_allows_up_to_limit(redis_backend):
+    limiter = RateLimiter(max_requests=3, window_seconds=WINDOW, backend=redis_backend)
+
+    results = [await limiter.is_allowed("+919876543210") for _ in range(5)]
+
+    assert [allowed for allowed, _ in results] == [True, True, True, False, False]
+    assert results[-1][1].startswith("Rate limit exceeded")
+    assert await limiter.get_remaining("+919876543210") == 0
+
+
+async def test_redis_denied_requests_are_not_counted(redis_backend, redis_client):
+    limiter = RateLimiter(max_requests=2, window_seconds=WINDOW, backend=redis_backend)
+    for _ in range(4):
+        await limiter.is_allowed("+919876543210")
+
+    assert int(await redis_client.hget("test:{+919876543210}", "c")) == 2
+
+
+async def test_redis_get_remaining_is_read_only(redis_backend):
+    limiter = RateLimiter(max_requests=5, window_seconds=WINDOW, backend=redis_backend)
+    await limiter.is_allowed("+919876543210")
+
+    assert await limiter.get_remaining("+919876543210") == 4
+    assert await limiter.get_remaining("+919876543210") == 4
+    assert await limiter.get_remaining("+919000000000") == 5
+
+
+async def test_redis_keys_are_independent_and_expire(redis_backend, redis_client):
+    limiter = RateLimiter(max_requests=1, window_seconds=WINDOW, backend=redis_backend)
+
+    assert (await limiter.is_allowed("+919876543210"))[0]
+    assert (await limiter.is_allowed("+919000000000"))[0]
+    assert not (await limiter.is_allowed("+919876543210"))[0]
+    assert 0 < await redis_client.ttl("test:{+919876543210}") <= 2 * WINDOW
+
+
+async def test_redis_previous_window_is_weighted(redis_backend, redis_client):
+    window = int(time.time() // WINDOW)
+    await redis_client.hset("test:{+919876543210}", mapping={"w": window - 1, "p": 0, "c": 10})
+
+    used = await redis_backend.used("+919876543210", WINDOW)
+
+    elapsed = (time.time() % WINDOW) / WINDOW
+    assert used == pytest.approx(10 * (1 - elapsed), abs=0.05)
+
+
+async def test_redis_stale_state_resets(redis_backend, redis_client):
+    window = int(time.time() // WINDOW)
+    await redis_client.hset("test:{+919876543210}", mapping={"w": window - 2, "p": 5, "c": 5})
+    limiter = RateLimiter(max_requests=5, window_seconds=WINDOW, backend=redis_backend)
+
+    assert (await limiter.is_allowed("+919876543210"))[0]
+    assert await limiter.get_remaining("+919876543210") == 4
+
+
+async def test_redis_clear(redis_backend, redis_client):
+    limiter = RateLimiter(max_requests=1, window_seconds=WINDOW, backend=redis_backend)
+    await limiter.is_allowed("+919876543210")
+
+    await limiter.clear("+919876543210")
+
+    assert not await redis_client.exists("test:{+919876543210}")
+    assert (await limiter.is_allowed("+919876543210"))[0]
+
+
+async def test_redis_concurrent_checks_never_exceed_limit(redis_backend):
+    limiter = RateLimiter(max_requests=10, window_seconds=WINDOW, backend=redis_backend)
+
+    results = await asyncio.gather(*(limiter.is_allowed("+919876543210") for _ in range(50)))
+
+    assert sum(allowed for allowed, _ in results) == 10
+
+
+class _UnreachableScript:
+    async def __call__(self, keys, args):
+        raise RedisConnectionError("connection refused")
+
+
+async def test_redis_falls_back_to_local_when_unavailable(redis_client):
+    backend = RedisRateLimitBackend(redis_client, prefix="test", fallback=LocalRateLimitBackend())
+    backend._script = _UnreachableScript()
+    limiter = RateLimiter(max_requests=2, window_seconds=WINDOW, backend=backend)
+
+    results = [(await limiter.is_allowed("+919876543210"))[0] for _ in range(3)]
+
+    assert results == [True, True, False]
+    stats = limiter.get_stats()
+    assert stats["redis_available"] is False
+    assert stats["fallback_checks"] == 3
+    assert stats["fallback_keys"] == 1
+
+
+async def test_local_concurrent_checks_never_exceed_limit():
+    limiter = RateLimiter(max_requests=10, window_seconds=WINDOW, backend=LocalRateLimitBackend())
+
+    results = await asyncio.gather(*(limiter.is_allowed("+919876543210") for _ in range(50)))
+
+    assert sum(allowed for allowed, _ in results) == 10
+    assert await limiter.get_remaining("+919876543210") == 0
+
+
+def test_local_checks_from_many_threads_never_exceed_limit():
+    limiter = RateLimiter(max_requests=100, window_seconds=WINDOW, backend=LocalRateLimitBackend(shards=4))
+    threads = 8
+    barrier = threading.Barrier(threads)
+    allowed = []
+
+    async def worker():
+        return [(await limiter.is_allowed("+919876543210"))[0] for _ in range(50)]
+
+    def run():
+        # Each thread drives its own event loop, like separate server threads sharing the limiter
+        barrier.wait()
+        allowed.extend(asyncio.run(worker()))
+
+    pool = [threading.Thread(target=run) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+    assert len(allowed) == threads * 50
+    assert sum(allowed) == 100
+
+
+async def test_local_idle_keys_are_evicted_from_every_shard(monkeypatch):
+    now = [10 * WINDOW]
+    # Only the limiter's clock moves; the event loop keeps the real one
+    monkeypatch.setattr(rate_limiter, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    backend = LocalRateLimitBackend(shards=4, sweep_interval_seconds=60)
+    limiter = RateLimiter(max_requests=5, window_seconds=WINDOW, backend=backend)
+    idle = [f"+91987654{i:04d}" for i in range(20)]
+    for phone in idle:
+        await limiter.is_allowed(phone)
+
+    now[0] += WINDOW
+    await limiter.is_allowed("+919000000000")
+    # Requests in the previous window still count, so nothing is dropped yet
+    assert backend.key_count() == 21
+
+    now[0] += WINDOW
+    await limiter.get_remaining("+919000000000")
+
+    # One check swept all four shards, not just the one it landed in
+    assert backend.key_count() == 1
+    assert backend.get_stats()["evicted_keys"] == 20
+    assert await limiter.get_remaining(idle[0]) == 5
@@ -0,0 +1,187 @@
+import re
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import retention
+from app.services.retention import OTPPartitionManager, OTPRetentionService
+
+pytestmark = pytest.mark.anyio
+
+CREATE_PARTITION = re.compile(r"CREATE TABLE IF NOT EXISTS (\w+) PARTITION OF")
+DETACH_PARTITION = re.compile(r"DETACH PARTITION (\w+)")
+
+
+class FakeResult:
+    def __init__(self, rows=(), rowcount=0):
+        self.rows = list(rows)
+        self.rowcount = rowcount
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+    def scalar(self):
+        return self.rows[0][0] if self.rows else None
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class FakePostgres:
+    """Records the SQL it is sent and answers the catalog queries retention.py makes"""
+
+    dialect = SimpleNamespace(name="postgresql")
+
+    def __init__(self, partitioned=True, partitions=(), lock_available=True, oldest_live_otp=None, live_otps=0):
+        self.partitioned = partitioned
+        self.partitions = set(partitions)
+        self.lock_available = lock_available
+        self.oldest_live_otp = oldest_live_otp
+        self.live_otps = live_otps
+        self.fail_on = None
+        self.statements = []
+
+    async def execute(self, statement, params=None):
+        sql = str(statement)
+        self.statements.append(sql)
+        if self.fail_on and self.fail_on in sql:
+            raise RuntimeError(f"failed: {sql}")
+        if "pg_partitioned_table" in sql:
+            return FakeResult([(1,)] if self.partitioned else [])
+        if "pg_inherits" in sql:
+            return FakeResult([(name,) for name in sorted(self.partitions)])
+        if "pg_try_advisory_lock" in sql:
+            return FakeResult([(self.lock_available,)])
+        if "SELECT MIN" in sql:
+            return FakeResult([(self.oldest_live_otp,)])
+        if sql.startswith("INSERT INTO"):
+            return FakeResult(rowcount=self.live_otps)
+        if match := CREATE_PARTITION.search(sql):
+            self.partitions.add(match.group(1))
+        elif match := DETACH_PARTITION.search(sql):
+            self.partitions.discard(match.group(1))
+        elif "PARTITION BY RANGE" in sql:
+            self.partitioned = True
+        return FakeResult()
+
+    async def commit(self):
+        pass
+
+    @asynccontextmanager
+    async def connect(self):
+        yield self
+
+    begin = connect
+
+    def ran(self, fragment: str) -> bool:
+        return any(fragment in sql for sql in self.statements)
+
+
+def days_from_today(first: int, last: int):
+    today = datetime.utcnow().date()
+    return {OTPPartitionManager.partition_name(today + timedelta(days=offset)) for offset in range(first, last + 1)}
+
+
+@pytest.fixture
+def partitioning(monkeypatch):
+    monkeypatch.setattr(retention.settings, "otp_partitioning_enabled", True)
+    monkeypatch.setattr(retention.settings, "otp_partition_days_ahead", 3)
+    monkeypatch.setattr(retention.settings, "otp_store_backend", "sql")
+
+
+async def test_convert_carries_live_otps_into_new_partitions(partitioning):
+    engine = FakePostgres(
+        partitioned=False, oldest_live_otp=datetime.utcnow() - timedelta(days=1), live_otps=42
+    )
+
+    copied = await OTPPartitionManager(engine).convert_to_partitioned()
+
+    assert copied == 42
+    assert engine.partitions == days_from_today(-1, 3)
+    assert engine.statements[1].startswith("ALTER TABLE otp_verifications RENAME TO otp_verifications_legacy")
+    # Partitions exist before the copy, and new ids continue after the legacy ones
+    last_partition = max(i for i, sql in enumerate(engine.statements) if CREATE_PARTITION.search(sql))
+    copy = next(i for i, sql in enumerate(engine.statements) if sql.startswith("INSERT INTO"))
+    assert last_partition < copy
+    assert "setval" in engine.statements[-1]
+
+
+async def test_convert_is_a_no_op_on_a_partitioned_table(partitioning):
+    engine = FakePostgres(partitioned=True)
+
+    assert await OTPPartitionManager(engine).convert_to_partitioned() == 0
+    assert not engine.ran("ALTER TABLE")
+
+
+async def test_ensure_partitions_creates_only_missing_days(partitioning):
+    engine = FakePostgres(partitions=days_from_today(0, 1))
+
+    created = await OTPPartitionManager(engine).ensure_partitions()
+
+    assert created == 2
+    assert engine.partitions == days_from_today(0, 3)
+
+
+async def test_startup_creates_partitions_with_retention_disabled(partitioning, monkeypatch):
+    monkeypatch.setattr(retention.settings, "otp_retention_enabled", False)
+    engine = FakePostgres()
+    service = OTPRetentionService(engine=engine, session_factory=object())
+
+    await service.startup()
+    try:
+        assert engine.partitions == days_from_today(0, 3)
+        assert service._task is None
+        assert service._partition_task is not None
+        assert service.get_stats()["total_partitions_created"] == 4
+    finally:
+        await service.shutdown()
+
+
+async def test_startup_survives_a_failed_partition_check(partitioning, monkeypatch):
+    monkeypatch.setattr(retention.settings, "otp_retention_enabled", False)
+    engine = FakePostgres()
+    engine.fail_on = "CREATE TABLE"
+    service = OTPRetentionService(engine=engine, session_factory=object())
+
+    await service.startup()
+    try:
+        assert service._partition_task is not None  # Retried on the next interval
+        assert engine.ran("pg_advisory_unlock")
+    finally:
+        await service.shutdown()
+
+
+async def test_purge_drops_partitions_older_than_retention(partitioning, monkeypatch):
+    monkeypatch.setattr(retention.settings, "otp_retention_hours", 24)
+    engine = FakePostgres(partitions=days_from_today(-3, 3))
+    service = OTPRetentionService(engine=engine, session_factory=object())
+
+    result = await service.purge_once()
+
+    assert result["partitions_dropped"] == 2
+    assert engine.partitions == days_from_today(-1, 3)
+
+
+async def test_purge_is_skipped_while_another_worker_holds_the_lock(partitioning):
+    engine = FakePostgres(partitions=days_from_today(-3, 3), lock_available=False)
+    service = OTPRetentionService(engine=engine, session_factory=object())
+
+    result = await service.purge_once()
+    check = await service.maintain_partitions()
+
+    assert result["skipped"] and check["skipped"]
+    assert not engine.ran("pg_inherits")
+    assert not engine.ran("pg_advisory_unlock")
+
+
+async def test_lock_is_released_when_a_purge_fails(partitioning):
+    engine = FakePostgres(partitions=days_from_today(-3, 3))
+    engine.fail_on = "DETACH PARTITION"
+    service = OTPRetentionService(engine=engine, session_factory=object())
+
+    with pytest.raises(RuntimeError):
+        await service.purge_once()
+
+    assert "pg_advisory_unlock" in engine.statements[-1]
@@ -0,0 +1,284 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+
+import httpx
+import pytest
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from sqlalchemy import select
+
+from app.models import Customer
+from app.schemas import CustomerData
+from app.services import shopify_service
+from app.services.shopify_service import ShopifyService, ShopifyCustomerConflict, ShopifyCustomerNotAdoptable
+from app.utils.customer_cache import CustomerCache
+
+pytestmark = pytest.mark.anyio
+
+PHONE = "+919876543210"
+
+
+class RecordingFilter:
+    def __init__(self):
+        self.added = []
+
+    async def add(self, phone):
+        self.added.append(phone)
+
+
+def make_service(session_factory, create_delay: float = 0.0, on_create=None, **kwargs) -> ShopifyService:
+    """ShopifyService with the Shopify calls replaced by local fakes"""
+    service = ShopifyService(session_factory=session_factory, **kwargs)
+    service.create_calls = 0
+
+    async def create_or_reconcile_customer(phone):
+        service.create_calls += 1
+        await asyncio.sleep(create_delay)
+        if on_create is not None:
+            await on_create(phone)
+        shopify_customer = {"id": f"gid://shopify/Customer/{service.create_calls}", "firstName": "Asha", "lastName": None}
+        return shopify_customer, service.generate_hidden_email(phone), "hidden-password"
+
+    async def create_customer_access_token(email, password):
+        return f"token-for-{email}", "2030-01-01T00:00:00Z"
+
+    service.create_or_reconcile_customer = create_or_reconcile_customer
+    service.create_customer_access_token = create_customer_access_token
+    return service
+
+
+async def test_provisioning_returns_plain_data(session_factory):
+    service = make_service(session_factory)
+
+    customer, token, expires_at = await service.find_or_create_customer(PHONE)
+
+    assert isinstance(customer, CustomerData)
+    assert customer.phone == PHONE
+    assert customer.shopify_customer_id == "gid://shopify/Customer/1"
+    assert token == f"token-for-{customer.email}"
+
+    # A second login finds the stored customer instead of creating another
+    again, _, _ = await service.find_or_create_customer(PHONE)
+    assert again.id == customer.id
+    assert service.create_calls == 1
+
+
+async def test_cancelled_leader_does_not_break_followers(session_factory):
+    service = make_service(session_factory, create_delay=0.05)
+
+    leader = asyncio.create_task(service.find_or_create_customer(PHONE))
+    await asyncio.sleep(0.01)
+    follower = asyncio.create_task(service.find_or_create_customer(PHONE))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    customer, token, _ = await follower
+
+    assert leader.cancelled()
+    assert service.create_calls == 1
+    assert service.provisioning.get_stats()["coalesced"] == 1
+    async with session_factory() as db:
+        stored = (await db.execute(select(Customer).where(Customer.phone == PHONE))).scalars().one()
+    assert stored.shopify_customer_id == customer.shopify_customer_id
+    assert token == f"token-for-{stored.shopify_email}"
+
+
+async def test_concurrent_insert_invalidates_cache_and_updates_filter(session_factory):
+    cache = CustomerCache()
+    # A profile check cached the row the other worker is about to replace
+    cache.put(PHONE, CustomerData(id="1", phone=PHONE, shopify_customer_id="gid://shopify/Customer/1"))
+    phone_filter = RecordingFilter()
+
+    async def other_worker_stores_customer(phone):
+        async with session_factory() as db:
+            db.add(Customer(
+                phone=phone,
+                shopify_customer_id="gid://shopify/Customer/1",
+                shopify_email="other@slayfashion.internal",
+                shopify_password="other-password"
+            ))
+            await db.commit()
+
+    service = make_service(
+        session_factory,
+        on_create=other_worker_stores_customer,
+        customer_cache=cache,
+        customer_filter=phone_filter
+    )
+
+    customer, _, _ = await service.find_or_create_customer(PHONE)
+
+    # Same Shopify customer adopted after the other worker: our password is the live one
+    assert customer.email == service.generate_hidden_email(PHONE)
+    assert cache.get(PHONE) is None
+    assert phone_filter.added == [PHONE]
+
+
+def make_adopting_service(session_factory):
+    """ShopifyService whose Shopify search finds an existing customer for every phone"""
+    service = make_service(session_factory)
+    service.shopify_customer = {"id": "gid://shopify/Customer/42", "email": "asha@example.com", "firstName": "Asha"}
+    service.password_updates = []
+
+    async def find_customer_by_phone(phone):
+        return service.shopify_customer
+
+    async def update_customer_credentials(shopify_customer_id, email, password):
+        service.password_updates.append((shopify_customer_id, email))
+        return {}
+
+    service.find_customer_by_phone = find_customer_by_phone
+    service.update_customer_credentials = update_customer_credentials
+    return service
+
+
+@pytest.fixture
+def search_first(monkeypatch):
+    monkeypatch.setattr(shopify_service.settings, "shopify_optimistic_create", False)
+
+
+async def test_existing_account_with_real_email_is_not_taken_over(session_factory, search_first):
+    service = make_adopting_service(session_factory)
+
+    with pytest.raises(ShopifyCustomerNotAdoptable):
+        await service.find_or_create_customer(PHONE)
+
+    assert service.password_updates == []
+
+
+async def test_existing_account_adopted_when_enabled(session_factory, search_first, monkeypatch):
+    monkeypatch.setattr(shopify_service.settings, "shopify_adopt_existing_customers", True)
+    service = make_adopting_service(session_factory)
+
+    customer, _, _ = await service.find_or_create_customer(PHONE)
+
+    assert customer.shopify_customer_id == "gid://shopify/Customer/42"
+    assert service.password_updates == [("gid://shopify/Customer/42", "asha@example.com")]
+
+
+async def test_existing_customer_without_email_is_adopted(session_factory, search_first):
+    service = make_adopting_service(session_factory)
+    service.shopify_customer = {"id": "gid://shopify/Customer/42", "email": None}
+
+    customer, _, _ = await service.find_or_create_customer(PHONE)
+
+    assert customer.email == service.generate_hidden_email(PHONE)
+    assert service.password_updates == [("gid://shopify/Customer/42", customer.email)]
+
+
+async def store_imported_customer(session_factory, email="asha@example.com"):
+    async with session_factory() as db:
+        db.add(Customer(phone=PHONE, shopify_customer_id="gid://shopify/Customer/42", shopify_email=email))
+        await db.commit()
+
+
+async def test_imported_customer_logs_in_with_default_settings(session_factory):
+    await store_imported_customer(session_factory)
+    service = make_adopting_service(session_factory)
+
+    customer, token, _ = await service.find_or_create_customer(PHONE)
+
+    assert customer.shopify_customer_id == "gid://shopify/Customer/42"
+    assert customer.email == "asha@example.com"
+    assert token == "token-for-asha@example.com"
+    assert service.password_updates == [("gid://shopify/Customer/42", "asha@example.com")]
+    async with session_factory() as db:
+        stored = (await db.execute(select(Customer).where(Customer.phone == PHONE))).scalars().one()
+    assert stored.shopify_password is not None
+
+
+def decode_multipass(secret, token):
+    key_material = hashlib.sha256(secret.encode()).digest()
+    raw = base64.urlsafe_b64decode(token)
+    ciphertext, signature = raw[:-32], raw[-32:]
+    assert hmac.compare_digest(signature, hmac.new(key_material[16:], ciphertext, hashlib.sha256).digest())
+    decryptor = Cipher(algorithms.AES(key_material[:16]), modes.CBC(ciphertext[:16])).decryptor()
+    padded = decryptor.update(ciphertext[16:]) + decryptor.finalize()
+    unpadder = padding.PKCS7(128).unpadder()
+    return json.loads(unpadder.update(padded) + unpadder.finalize())
+
+
+@pytest.fixture
+def multipass_secret(monkeypatch):
+    monkeypatch.setattr(shopify_service.settings, "shopify_multipass_secret", "multipass-test-secret")
+    return "multipass-test-secret"
+
+
+def with_multipass_storefront(service):
+    service.multipass_tokens = []
+
+    async def storefront_api_request(query, variables=None):
+        service.multipass_tokens.append(variables["multipassToken"])
+        return {"data": {"customerAccessTokenCreateWithMultipass": {
+            "customerAccessToken": {"accessToken": "multipass-token", "expiresAt": "2030-01-01T00:00:00Z"},
+            "customerUserErrors": []
+        }}}
+
+    service.storefront_api_request = storefront_api_request
+    return service
+
+
+async def test_imported_customer_logs_in_through_multipass(session_factory, multipass_secret):
+    await store_imported_customer(session_factory)
+    service = with_multipass_storefront(make_adopting_service(session_factory))
+
+    customer, token, _ = await service.find_or_create_customer(PHONE)
+
+    assert token == "multipass-token"
+    assert service.password_updates == []
+    assert decode_multipass(multipass_secret, service.multipass_tokens[0])["email"] == "asha@example.com"
+    async with session_factory() as db:
+        stored = (await db.execute(select(Customer).where(Customer.phone == PHONE))).scalars().one()
+    assert stored.shopify_password is None
+
+
+async def test_existing_account_linked_through_multipass(session_factory, search_first, multipass_secret):
+    service = with_multipass_storefront(make_adopting_service(session_factory))
+
+    customer, token, _ = await service.find_or_create_customer(PHONE)
+
+    assert customer.shopify_customer_id == "gid://shopify/Customer/42"
+    assert token == "multipass-token"
+    assert service.password_updates == []
+
+def rest_create_service(responses):
+    """ShopifyService whose REST customer creates get the given (status, body) answers in turn"""
+    service = ShopifyService()
+    service.create_requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        service.create_requests.append(json.loads(request.content)["customer"])
+        status, body = responses[len(service.create_requests) - 1]
+        return httpx.Response(status, json=body)
+
+    service.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return service
+
+
+async def test_taken_phone_is_retried_without_phone():
+    service = rest_create_service([
+        (422, {"errors": {"phone": ["has already been taken"]}}),
+        (201, {"customer": {"id": 7, "email": "hidden@slayfashion.internal", "phone": None}}),
+    ])
+
+    customer = await service.create_customer_in_shopify(PHONE, "hidden@slayfashion.internal", "secret")
+
+    assert customer["id"] == "gid://shopify/Customer/7"
+    assert service.create_requests[0]["phone"] == PHONE
+    assert "phone" not in service.create_requests[1]
+    await service.http_client.aclose()
+
+
+async def test_taken_email_raises_conflict_without_retry():
+    service = rest_create_service([
+        (422, {"errors": {"email": ["has already been taken"], "phone": ["has already been taken"]}}),
+    ])
+
+    with pytest.raises(ShopifyCustomerConflict):
+        await service.create_customer_in_shopify(PHONE, "hidden@slayfashion.internal", "secret")
+
+    assert len(service.create_requests) == 1
+    await service.http_client.aclose()
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.services import shopify_service, shopify_throttle
+from app.services.shopify_service import ShopifyService
+from app.services.shopify_throttle import CostBucket, ShopifyThrottledError
+
+pytestmark = pytest.mark.anyio
+
+QUERY = "query { shop { name } }"
+OK = {"data": {"shop": {"name": "Slay Fashion"}}}
+
+
+class FakeClock:
+    """Monotonic clock that only moves when code under test sleeps"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, delay: float):
+        self.sleeps.append(delay)
+        self.now += delay
+        await asyncio.sleep(0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    fake_time = SimpleNamespace(monotonic=clock.monotonic, perf_counter=time.perf_counter)
+    for module in (shopify_throttle, shopify_service):
+        monkeypatch.setattr(module, "time", fake_time)
+        monkeypatch.setattr(module, "asyncio", SimpleNamespace(sleep=clock.sleep))
+    return clock
+
+
+def cost(requested: float, available: float, maximum: float = 1000, restore_rate: float = 50) -> dict:
+    return {
+        "requestedQueryCost": requested,
+        "actualQueryCost": requested,
+        "throttleStatus": {"maximumAvailable": maximum, "currentlyAvailable": available, "restoreRate": restore_rate},
+    }
+
+
+def scripted_service(responses) -> ShopifyService:
+    """ShopifyService whose HTTP calls get the given httpx.Responses in turn"""
+    service = ShopifyService()
+    service.sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        service.sent.append(json.loads(request.content) if request.content else None)
+        return responses[len(service.sent) - 1]
+
+    service.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return service
+
+
+async def test_bucket_follows_reported_cost_and_refills(clock):
+    bucket = CostBucket("admin_graphql", maximum_available=1000, restore_rate=50, default_cost=10)
+
+    bucket.record(QUERY, cost(requested=120, available=500, maximum=2000, restore_rate=100))
+
+    assert bucket.expected_cost(QUERY) == 120
+    assert bucket.expected_cost("another query") == 10
+    assert bucket.maximum_available == 2000 and bucket.restore_rate == 100
+    assert bucket.available() == 500
+    clock.now += 3
+    assert bucket.available() == 800
+    clock.now += 60
+    assert bucket.available() == 2000
+
+
+async def test_acquire_waits_for_the_shortfall_and_queues_callers(clock):
+    bucket = CostBucket("admin_graphql", maximum_available=100, restore_rate=10)
+    bucket.record(QUERY, cost(requested=50, available=30, maximum=100, restore_rate=10))
+
+    started = clock.now
+    await asyncio.gather(bucket.acquire(QUERY, deadline=started + 30), bucket.acquire(QUERY, deadline=started + 30))
+
+    # The first caller waits for 20 units; the second also waits for the 50 the first reserved
+    assert clock.sleeps[0] == pytest.approx(2.0)
+    assert clock.now - started == pytest.approx(7.0)
+    assert bucket.get_stats()["throttle_waits"] == 2
+
+
+async def test_acquire_gives_up_rather_than_wait_past_the_deadline(clock):
+    bucket = CostBucket("admin_graphql", maximum_available=100, restore_rate=10)
+    bucket.record(QUERY, cost(requested=50, available=0, maximum=100, restore_rate=10))
+
+    with pytest.raises(ShopifyThrottledError) as error:
+        await bucket.acquire(QUERY, deadline=clock.now + 1)
+
+    assert error.value.retry_after == pytest.approx(5.0)
+    assert clock.sleeps == []
+    # The reservation is returned
+    assert bucket.available() == 0
+
+
+async def test_429_is_retried_after_retry_after(clock):
+    service = scripted_service([
+        httpx.Response(429, headers={"Retry-After": "1.5"}),
+        httpx.Response(200, json=OK),
+    ])
+
+    assert await service.admin_api_request(QUERY) == OK
+
+    assert clock.sleeps == [1.5]
+    assert len(service.sent) == 2
+    stats = service.get_stats()["shopify_throttle"]
+    assert stats["throttled_responses"] == 1 and stats["retries"] == 1
+
+
+async def test_rest_429_is_retried_after_retry_after(clock):
+    service = scripted_service([
+        httpx.Response(429, headers={"Retry-After": "2.0", "X-Shopify-Shop-Api-Call-Limit": "40/40"}),
+        httpx.Response(200, json={"customer": {"id": 1}}, headers={"X-Shopify-Shop-Api-Call-Limit": "1/40"}),
+    ])
+
+    response = await service._rest_request("GET", "https://test-store.myshopify.com/admin/api/customers/1.json")
+
+    assert response.status_code == 200
+    # The bucket refills during the Retry-After wait, then follows the call limit header
+    assert clock.sleeps == [2.0]
+    assert service.rest_bucket.available() == 39
+
+
+async def test_throttled_error_waits_until_the_bucket_can_cover_the_query(clock):
+    throttled = {
+        "errors": [{"message": "Throttled", "extensions": {"code": "THROTTLED"}}],
+        "extensions": {"cost": cost(requested=100, available=0)},
+    }
+    service = scripted_service([httpx.Response(200, json=throttled), httpx.Response(200, json=OK)])
+
+    assert await service.admin_api_request(QUERY) == OK
+
+    # 100 units at 50/s, jittered by up to 20%
+    assert 2.0 <= clock.sleeps[0] <= 2.4
+    assert service.admin_bucket.expected_cost(QUERY) == 100
+
+
+async def test_gives_up_when_retry_after_passes_the_deadline(clock):
+    service = scripted_service([httpx.Response(429, headers={"Retry-After": "60"})])
+
+    with pytest.raises(ShopifyThrottledError) as error:
+        await service.admin_api_request(QUERY)
+
+    assert error.value.retry_after == 60
+    assert clock.sleeps == []
+    assert service.get_stats()["shopify_throttle"]["gave_up"] == 1